@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
@@ -7,14 +8,35 @@ import uvicorn
 # Load environment variables from .env file FIRST
 load_dotenv()
 
+# Queue-based logging before any module logs at import time
+from services.log_pipeline import setup_logging
+setup_logging()
+
 # Import routers AFTER environment is loaded
-from routers import ai_router, voice_router, health_router
+from routers import ai_router, voice_router, health_router, admin_router
+from middleware.compression import CompressionMiddleware
+from middleware.admission import AdmissionMiddleware
+from services.loop_monitor import loop_monitor
+from services.memory_monitor import memory_monitor
+from services.provider_router import close_provider_clients
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Process-wide background monitors (loop lag, RSS guard) run on the serving loop
+    loop_monitor.start()
+    memory_monitor.start()
+    yield
+    # Provider connection pools belong to this loop; close them before it goes away
+    await close_provider_clients()
+
 
 # Create FastAPI application
 app = FastAPI(
     title="TalkAI Backend",
     description="AI processing backend for TalkAI platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS (Cross-Origin Resource Sharing)
@@ -31,10 +53,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/zstd request bodies (decompressed while streaming) and negotiated response compression
+app.add_middleware(CompressionMiddleware)
+
+# Load shedding by priority (added last = outermost, so shed requests never reach the routers)
+app.add_middleware(AdmissionMiddleware)
+
 # Include routers
 app.include_router(health_router.router)
 app.include_router(ai_router.router)
 app.include_router(voice_router.router, prefix="/voice")
+app.include_router(admin_router.router)
 
 # Run the server
 if __name__ == "__main__":
@@ -0,0 +1,105 @@
+"""
+Per-call session memory benchmark
+
+Simulates many concurrent calls, each taking several turns (stage advance +
+remembered exchange), once with the previous representation (a stage dict and
+a list of exchange dicts per call, re-sliced past 5 exchanges) and once with
+ConversationStateManager / ConversationMemory on CallSession. Reports traced
+bytes per call and time per turn. Message strings are shared by all runs so
+only the per-call bookkeeping is measured.
+
+The legacy state dropped exchanges past the fifth, so the "session" run is
+compared with the rolling summary off; the "summary" run adds it (evicted
+exchanges waiting for their batch plus folded notes) to show its cost.
+
+Usage:
+    cd ai-backend
+    python benchmarks/call_session_benchmark.py --calls 5000 --turns 8
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ai_engine import ConversationStateManager, ConversationMemory
+from services.call_session import CallSessionStore
+from services.conversation_summary import conversation_summarizer
+
+
+class LegacyState:
+    """The per-call bookkeeping this module replaced"""
+
+    def __init__(self):
+        self.call_stages = {}
+        self.conversations = {}
+
+    def advance_stage(self, call_sid: str):
+        if call_sid not in self.call_stages:
+            self.call_stages[call_sid] = {'stage': 'greeting', 'turn_count': 0}
+        current = self.call_stages[call_sid]
+        current['turn_count'] += 1
+        stage_config = ConversationStateManager.STAGES[current['stage']]
+        if current['turn_count'] >= stage_config['max_turns'] and stage_config['next']:
+            current['stage'] = stage_config['next']
+            current['turn_count'] = 0
+
+    def add_message(self, call_sid: str, user_message: str, ai_response: str, language: str):
+        if call_sid not in self.conversations:
+            self.conversations[call_sid] = []
+        self.conversations[call_sid].append({'user': user_message, 'ai': ai_response, 'language': language})
+        if len(self.conversations[call_sid]) > 5:
+            self.conversations[call_sid] = self.conversations[call_sid][-5:]
+
+
+def run(name: str, advance, add, call_sids, turns, messages):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    for turn in range(turns):
+        user_message, ai_response = messages[turn % len(messages)]
+        for call_sid in call_sids:
+            advance(call_sid)
+            add(call_sid, user_message, ai_response, 'english')
+    elapsed = time.perf_counter() - start
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    per_turn_us = elapsed * 1e6 / (len(call_sids) * turns)
+    print(f"{name:8s} {used / len(call_sids):8.0f} bytes/call  {per_turn_us:6.2f} us/turn")
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--calls', type=int, default=5000)
+    parser.add_argument('--turns', type=int, default=8)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    call_sids = [f"CA{i:032x}" for i in range(args.calls)]
+    messages = [(f"user message {i} about pricing", f"assistant reply {i} with details") for i in range(16)]
+
+    legacy = LegacyState()
+    legacy_bytes = run("legacy", legacy.advance_stage, legacy.add_message, call_sids, args.turns, messages)
+
+    summary_tokens = conversation_summarizer.max_tokens
+    conversation_summarizer.max_tokens = 0
+    sessions = CallSessionStore()
+    state_manager = ConversationStateManager(sessions)
+    memory = ConversationMemory(sessions)
+    session_bytes = run("session", state_manager.advance_stage, memory.add_message, call_sids, args.turns, messages)
+    conversation_summarizer.max_tokens = summary_tokens
+
+    sessions = CallSessionStore()
+    state_manager = ConversationStateManager(sessions)
+    memory = ConversationMemory(sessions)
+    run("summary", state_manager.advance_stage, memory.add_message, call_sids, args.turns, messages)
+
+    print(f"{args.calls} calls x {args.turns} turns: {legacy_bytes / session_bytes:.1f}x less memory per call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Conversation context benchmark: full history vs last-5 ring vs rolling summary
+
+Plays a scripted long call (facts given early, then many ordinary turns)
+through ConversationMemory and reports, at several turn counts, the
+estimated prompt tokens of the conversation context in each strategy and
+whether the early facts are still in it:
+
+- full:    every exchange so far verbatim (grows with the call)
+- ring:    the last CONVERSATION_MEMORY_EXCHANGES exchanges (previous behavior)
+- summary: rolling summary of older exchanges + recent exchanges within
+           CONVERSATION_CONTEXT_TOKENS
+
+Usage:
+    cd ai-backend
+    python benchmarks/conversation_summary_benchmark.py --turns 60
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ai_engine import ConversationMemory
+from services.call_session import CallSessionStore
+from services.conversation_summary import conversation_summarizer
+from services.prompt_builder import estimate_tokens
+
+FACTS = {"account": "4471", "city": "Jaipur", "plan": "Pro plan"}
+OPENING = [
+    ("Hi, my account number is 4471 and I am calling about my internet bill.",
+     "Thank you, I have found account 4471. How can I help with your bill today?"),
+    ("I moved to Jaipur last month and the connection keeps dropping in the evening.",
+     "I am sorry to hear that. Evening drops in Jaipur are often caused by congestion on the local node."),
+    ("I am on the Pro plan and pay 999 rupees, so I expect a stable connection.",
+     "You are right, the Pro plan at 999 rupees per month includes a 99.9 percent uptime commitment."),
+]
+FILLER_USER = [
+    "Can you check whether there is an outage in my area right now?",
+    "Yesterday it dropped three times between 8 and 10 PM.",
+    "I already restarted the router twice, it did not help.",
+    "Is there a technician visit available this week?",
+    "What about a refund for the days it did not work?",
+    "Could you also send me the details by SMS?",
+    "How long does a router replacement usually take?",
+    "Okay, and will my speed change after the replacement?",
+]
+FILLER_AI = [
+    "Let me check that for you. There is no reported outage right now, but I can see intermittent errors on your line.",
+    "Thanks for the details. I have logged the disconnections and raised a ticket with the network team.",
+    "Understood. Since restarting did not help, the next step is a line test and possibly a router replacement.",
+    "Yes, a technician can visit on Thursday between 10 AM and 1 PM. Shall I book that slot for you?",
+    "You are eligible for a pro-rated credit for the affected days, which will appear on your next bill.",
+    "Sure, I will send a summary of the ticket and the appointment to your registered mobile number.",
+    "A replacement usually takes about 30 minutes once the technician arrives.",
+    "No, your speed stays the same, the replacement only fixes the hardware fault.",
+]
+
+
+def conversation(turns):
+    for turn in range(turns):
+        if turn < len(OPENING):
+            yield OPENING[turn]
+        else:
+            index = (turn - len(OPENING)) % len(FILLER_USER)
+            yield FILLER_USER[index], FILLER_AI[index]
+
+
+def context_tokens(summary, exchanges):
+    tokens = estimate_tokens(summary) if summary else 0
+    return tokens + sum(estimate_tokens(e['user']) + estimate_tokens(e['ai']) + 8 for e in exchanges)
+
+
+def facts_kept(summary, exchanges):
+    text = (summary or "") + ' '.join(e['user'] + ' ' + e['ai'] for e in exchanges)
+    return sum(1 for value in FACTS.values() if value in text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=60)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    memory = ConversationMemory(CallSessionStore())
+    full = []
+    checkpoints = {5, 10, 20, 40, args.turns}
+    context_seconds = 0.0
+    print(f"{'turn':>5} {'full':>14} {'ring':>14} {'summary':>14}   (context tokens / facts kept of {len(FACTS)})")
+    for turn, (user, ai) in enumerate(conversation(args.turns), 1):
+        memory.add_message("CA1", user, ai, "english")
+        full.append({'user': user, 'ai': ai})
+        started = time.perf_counter()
+        summary, recent = memory.get_prompt_context("CA1")
+        context_seconds += time.perf_counter() - started
+        if turn in checkpoints:
+            ring = memory.get_context("CA1")
+            row = [(context_tokens(None, full), facts_kept(None, full)),
+                   (context_tokens(None, ring), facts_kept(None, ring)),
+                   (context_tokens(summary, recent), facts_kept(summary, recent))]
+            print(f"{turn:5d} " + ' '.join(f"{tokens:8d} / {kept}  " for tokens, kept in row))
+
+    stats = conversation_summarizer.get_stats()
+    print(f"fold {stats['avg_fold_us']} us per evicted exchange (after the turn), "
+          f"context build {context_seconds * 1e6 / args.turns:.1f} us per turn")
+    print("summary at the end of the call:")
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
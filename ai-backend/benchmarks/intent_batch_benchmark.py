@@ -0,0 +1,73 @@
+"""
+Batch intent classification benchmark
+
+Generates synthetic call transcripts, classifies them with the scalar
+DynamicIntentClassifier and with the vectorized NumPy backend, verifies the
+results are identical and reports throughput.
+
+Usage:
+    cd ai-backend
+    python benchmarks/intent_batch_benchmark.py --calls 2000 --turns 8
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ai_engine import DynamicIntentClassifier
+from services.intent_batch import VectorizedIntentClassifier
+
+FILLER = "hello sir the i am calling about my account today please ok so".split()
+
+
+def build_transcripts(calls: int, turns: int, patterns):
+    random.seed(11)
+    vocabulary = [term for p in patterns.values()
+                  for term in p['keywords'] + p.get('phrases', []) + p.get('negative_context', [])]
+    transcripts = []
+    for _ in range(calls):
+        conversation = []
+        for _ in range(turns):
+            words = random.sample(FILLER, 3) + random.sample(vocabulary, random.randint(0, 4))
+            random.shuffle(words)
+            conversation.append(" ".join(words).capitalize() + random.choice(["?", ".", ""]))
+        transcripts.append(conversation)
+    return transcripts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=8)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    patterns = DynamicIntentClassifier().intent_patterns
+    transcripts = build_transcripts(args.calls, args.turns, patterns)
+    utterances = args.calls * args.turns
+
+    start = time.perf_counter()
+    scalar = []
+    for conversation in transcripts:
+        classifier = DynamicIntentClassifier()
+        scalar.append([classifier.classify_intent(message)[:2] for message in conversation])
+    scalar_s = time.perf_counter() - start
+
+    vectorized_classifier = VectorizedIntentClassifier(patterns)
+    start = time.perf_counter()
+    vectorized = vectorized_classifier.classify_conversations(transcripts)
+    vector_s = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(scalar, vectorized) for x, y in zip(a, b) if x != y)
+    print(f"{utterances} utterances in {args.calls} calls")
+    print(f"scalar:     {scalar_s:8.3f} s  ({utterances / scalar_s:,.0f} utterances/s)")
+    print(f"vectorized: {vector_s:8.3f} s  ({utterances / vector_s:,.0f} utterances/s)")
+    print(f"speedup: {scalar_s / vector_s:.1f}x, mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Voice request/response codec benchmark
+
+Compares per-request CPU spent outside the AI engine for a KB-heavy
+/voice/voice-response payload:
+
+- before: body -> str -> json.loads -> deep Pydantic validation of every KB
+  chunk -> VoiceResponse model -> response_model re-validation -> json.dumps
+- after:  bytes -> json_codec.loads -> validation of the fields the engine uses
+  (KB passed through opaquely) -> dict -> json_codec.dumps
+
+Usage:
+    cd ai-backend
+    python benchmarks/json_codec_benchmark.py --chunks 300 --iterations 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import BaseModel, Field
+
+from routers.voice_router import VoiceResponse, _validate_voice_request
+from services import json_codec
+
+
+class DeepVoiceRequest(BaseModel):
+    """The previous request model (deep-validates every KB chunk)"""
+    user_message: str = Field(..., min_length=1, max_length=1000)
+    call_data: Optional[Dict[str, Any]] = None
+    voice_settings: Optional[Dict[str, Any]] = None
+    call_sid: Optional[str] = None
+    knowledge_base: Optional[List[Dict[str, Any]]] = []
+
+
+def build_body(chunks: int) -> bytes:
+    knowledge_base = [{
+        "title": f"Product Guide {i // 20}",
+        "content": ("Our enterprise cloud plan includes managed backups, monitoring and 24/7 support. " * 18)[:1500],
+        "category": "products",
+        "chunk_id": i % 20 + 1
+    } for i in range(chunks)]
+    return json.dumps({
+        "user_message": "What does the enterprise plan include?",
+        "call_data": {"companyName": "TechCorp", "companyId": "65f0c0ffee", "knowledgeBase": knowledge_base},
+        "voice_settings": {"personality": "priyanshu", "language": "auto"},
+        "call_sid": "CA123",
+        "knowledge_base": knowledge_base
+    }).encode("utf-8")
+
+
+RESULT = {
+    "ai_response": "Absolutely! Our enterprise cloud plan includes managed backups. Any other questions?",
+    "detected_language": "english", "language_confidence": 0.9,
+    "sentiment": {"label": "neutral", "score": 0.5}, "personality": "priyanshu", "context_used": True,
+    "conversation_stage": "needs_assessment", "should_escalate": False, "abusive_detected": False,
+    "intent": "question", "intent_confidence": 0.5, "goodbye_detected": False, "kb_used": True
+}
+
+
+def before(body: bytes) -> bytes:
+    request = DeepVoiceRequest(**json.loads(body.decode("utf-8")))
+    response = VoiceResponse(**RESULT, timestamp=datetime.now().isoformat())
+    revalidated = VoiceResponse.model_validate(response.model_dump())
+    return json.dumps(revalidated.model_dump()).encode("utf-8")
+
+
+def after(body: bytes) -> bytes:
+    _validate_voice_request(json_codec.loads(body))
+    return json_codec.dumps({**RESULT, "timestamp": datetime.now().isoformat()})
+
+
+def cpu_per_call(fn, body: bytes, iterations: int) -> float:
+    fn(body)
+    start = time.process_time()
+    for _ in range(iterations):
+        fn(body)
+    return (time.process_time() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=300)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    body = build_body(args.chunks)
+    before_ms = cpu_per_call(before, body, args.iterations)
+    after_ms = cpu_per_call(after, body, args.iterations)
+
+    print(f"payload: {len(body) / 1024:.0f} KiB ({args.chunks} KB chunks, sent twice), orjson: {json_codec.ORJSON_AVAILABLE}")
+    print(f"before: {before_ms:8.2f} ms CPU/request")
+    print(f"after:  {after_ms:8.2f} ms CPU/request")
+    print(f"saved:  {before_ms - after_ms:8.2f} ms CPU/request ({before_ms / after_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+KB retrieval latency benchmark
+
+Builds a synthetic PDF-style knowledge base and measures index build time and
+per-query latency for lexical, semantic and hybrid retrieval.
+
+Usage:
+    cd ai-backend
+    python benchmarks/kb_retrieval_benchmark.py --chunks 500 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import kb_semantic
+import services.ai_engine as ai_engine_module
+from services.ai_engine import LightweightAIEngine
+from services.kb_cache import kb_fingerprint
+
+VOCABULARY = (
+    "cloud hosting backup security monitoring storage network server database migration "
+    "support onboarding training analytics dashboard reporting integration api mobile "
+    "payment invoice subscription premium basic enterprise customer account delivery "
+    "installation maintenance warranty upgrade performance uptime compliance audit"
+).split()
+
+TOPIC_SENTENCES = [
+    "Our pricing starts at 499 rupees per month for the basic plan.",
+    "The office is located in Bengaluru and open Monday to Saturday.",
+    "You can contact our helpline by phone or email at any time.",
+    "Refunds are processed within seven working days of cancellation.",
+    "Delivery and installation are included for enterprise customers."
+]
+
+QUERIES = [
+    "what is the price", "how much does it cost", "kitna lagega", "what services do you offer",
+    "where is your office", "how can I contact you", "refund policy kya hai",
+    "tell me about cloud backup", "do you provide installation", "enterprise plan details"
+]
+
+
+def build_knowledge_base(chunks: int, chunk_chars: int = 1500):
+    random.seed(7)
+    knowledge_base = []
+    for i in range(chunks):
+        words = []
+        while sum(len(w) + 1 for w in words) < chunk_chars:
+            if random.random() < 0.02:
+                words.extend(random.choice(TOPIC_SENTENCES).split())
+            else:
+                words.append(random.choice(VOCABULARY))
+        knowledge_base.append({
+            "title": f"Document {i // 10}",
+            "content": " ".join(words),
+            "category": "general",
+            "chunk_id": i % 10 + 1
+        })
+    return knowledge_base
+
+
+def measure(fn, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "p50_ms": statistics.median(timings),
+        "p95_ms": timings[int(len(timings) * 0.95) - 1],
+        "max_ms": timings[-1]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="Per-turn retrieval budget")
+    args = parser.parse_args()
+
+    if not kb_semantic.NUMPY_AVAILABLE:
+        print("numpy is not installed - semantic retrieval unavailable")
+        return
+
+    knowledge_base = build_knowledge_base(args.chunks)
+    queries = [QUERIES[i % len(QUERIES)] for i in range(args.queries)]
+    kb_version = kb_fingerprint(knowledge_base)
+    engine = LightweightAIEngine()
+
+    retriever = kb_semantic.SemanticKBRetriever()
+    start = time.perf_counter()
+    retriever.get_index(kb_version, knowledge_base)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    results = {}
+    ai_engine_module.kb_semantic_retriever = retriever
+    for mode in ('lexical', 'semantic', 'hybrid'):
+        retriever.mode = mode
+        results[mode] = measure(lambda q: engine._search_knowledge_base(q, knowledge_base, kb_version), queries)
+
+    batch_start = time.perf_counter()
+    retriever.get_index(kb_version, knowledge_base).scores_batch(queries)
+    batch_ms = (time.perf_counter() - batch_start) * 1000
+
+    print(f"KB: {args.chunks} chunks, index build {build_ms:.1f} ms (once per KB version)")
+    print(f"{'mode':<10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}  within {args.budget_ms:.0f} ms budget")
+    for mode, stats in results.items():
+        within = "yes" if stats["p95_ms"] <= args.budget_ms else "NO"
+        print(f"{mode:<10}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['max_ms']:>10.2f}  {within}")
+    print(f"batched semantic scoring of {len(queries)} queries: {batch_ms:.1f} ms total")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Streaming LLM response benchmark against the local OpenAI-compatible stub
+
+Starts tools/fake_openai.py in-process and runs voice turns through the
+engine in LLM mode:
+
+- streamed: time until the first sentence is available (what TTS waits for
+            when it starts on the first sentence) versus until the whole
+            response is complete (what it waits for without streaming)
+- deadline: turns whose deadline is shorter than the stub's time to first
+            token - they must fall back to the template response in time
+
+Usage:
+    cd ai-backend
+    python benchmarks/llm_streaming_benchmark.py --turns 50 --first-token-ms 300 --token-ms 25
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+KNOWLEDGE_BASE = [
+    {"title": "Pricing", "content": "The Pro plan costs 999 rupees per month and includes unlimited calls. "
+                                    "Annual billing gets two months free."},
+    {"title": "Support", "content": "Support is available from 9 AM to 6 PM on weekdays by phone and chat."},
+]
+QUESTIONS = ["What does the Pro plan cost?", "How much is the monthly price?", "When is support available?"]
+
+
+async def run_turns(count: int, deadline_ms: float):
+    from services.ai_engine import ai_engine
+    from services.deadline import Deadline
+
+    first_sentence, complete, sources = [], [], Counter()
+    for i in range(count):
+        started = time.perf_counter()
+        first = []
+
+        async def on_sentence(text: str):
+            if not first:
+                first.append(time.perf_counter() - started)
+
+        result = await ai_engine.generate_response(
+            QUESTIONS[i % len(QUESTIONS)],
+            call_data={"companyName": "Acme"},
+            call_sid=f"BENCH{deadline_ms:.0f}_{i}",
+            knowledge_base=KNOWLEDGE_BASE,
+            deadline=Deadline(deadline_ms),
+            on_sentence=on_sentence
+        )
+        elapsed = time.perf_counter() - started
+        complete.append(elapsed * 1000)
+        first_sentence.append((first[0] if first else elapsed) * 1000)
+        sources[result.get('response_source')] += 1
+    return first_sentence, complete, sources, result
+
+
+async def main_async(args):
+    from benchmarks.provider_router_benchmark import serve
+    from tools.fake_openai import create_app
+
+    server = await serve(create_app(args.first_token_ms, args.token_ms, jitter_ms=args.token_ms / 5, seed=1), args.port)
+
+    first_sentence, complete, sources, sample = await run_turns(args.turns, 8000)
+    print(f"streamed  first sentence p50 {percentile(first_sentence, 0.5):7.1f} ms  p95 {percentile(first_sentence, 0.95):7.1f} ms")
+    print(f"          full response  p50 {percentile(complete, 0.5):7.1f} ms  p95 {percentile(complete, 0.95):7.1f} ms  "
+          f"sources {dict(sources)}")
+    print(f"          sample: {sample['ai_response']}")
+
+    tight = args.first_token_ms * 0.6
+    first_sentence, complete, sources, sample = await run_turns(args.turns, tight)
+    print(f"deadline  {tight:.0f} ms budget: turn p50 {percentile(complete, 0.5):7.1f} ms  "
+          f"max {max(complete):7.1f} ms  sources {dict(sources)}")
+    print(f"          sample: {sample['ai_response']}")
+
+    server.should_exit = True
+    await asyncio.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=25)
+    parser.add_argument("--port", type=int, default=9110)
+    args = parser.parse_args()
+    # The engine reads the OpenAI settings at import time
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    logging.disable(logging.CRITICAL)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
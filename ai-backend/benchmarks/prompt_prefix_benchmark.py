@@ -0,0 +1,165 @@
+"""
+Prompt assembly benchmark: per-turn rebuild versus compiled, cache-friendly prefixes
+
+- build:    microseconds to assemble one turn's chat messages - the previous
+            layout (system prompt re-rendered with the retrieved passages and
+            reply language inside it) versus PromptBuilder (compiled company +
+            KB prefix, per-turn parts last)
+- provider: turns of several calls against tools/fake_openai.py, which caches
+            prompt prefixes and charges --prefill-ms-per-1k for uncached
+            tokens; reports the cached share of prompt tokens and the time to
+            the first sentence for both layouts
+
+Usage:
+    cd ai-backend
+    python benchmarks/prompt_prefix_benchmark.py --turns 60 --prefill-ms-per-1k 80
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.prompt_builder import prompt_builder
+
+COMPANY = {"name": "Acme Telecom", "business_hours": "9 AM - 6 PM IST"}
+KNOWLEDGE_BASE = [
+    {"title": f"Topic {i}", "content": f"Article {i} explains plan option {i}: it costs {100 + i * 50} rupees per month, "
+                                       f"includes {i + 1} GB of data per day, free calls to any network and "
+                                       f"{i % 3 + 1} months of streaming access. Activation takes {i % 4 + 1} hours "
+                                       f"and the plan can be cancelled any time from the app or by calling support."}
+    for i in range(20)
+]
+QUESTIONS = [f"Tell me about plan option {i}" for i in range(20)]
+
+
+def legacy_system_prompt(company_context):
+    """The system prompt as it was rendered on every call before compilation"""
+    base_prompt = """You are a professional AI customer service assistant. Your personality traits:
+
+        PROFESSIONAL BEHAVIOR:
+        - Always use polite, respectful language
+        - Address customers with courtesy ("Thank you", "Please", "I'd be happy to help")
+        - Maintain a calm, patient tone even with difficult customers
+        - Use proper grammar and complete sentences
+
+        UNBIASED & INCLUSIVE:
+        - Treat all customers equally regardless of background
+        - Never make assumptions about gender, race, age, or personal circumstances
+        - Use inclusive language ("they/them" when gender unknown)
+        - Avoid cultural or regional stereotypes
+
+        HELPFUL & SOLUTION-FOCUSED:
+        - Listen carefully to customer concerns
+        - Ask clarifying questions when needed
+        - Provide specific, actionable solutions
+        - If you cannot help, politely escalate to human support
+
+        COMPANY REPRESENTATION:
+        - You represent the company professionally
+        - Acknowledge company responsibility when appropriate
+        - Follow company policies and procedures
+        - Protect customer privacy and confidentiality"""
+    if company_context:
+        company_name = company_context.get("name", "the company")
+        base_prompt += f"\n\nCOMPANY CONTEXT:\n- You work for {company_name}\n- Answer as a {company_name} representative, not as TalkAI\n- Use company-specific knowledge to provide accurate information"
+        if company_context.get("business_hours"):
+            base_prompt += f"\n- Business hours: {company_context.get('business_hours')}"
+    base_prompt += "\n\nRemember: Be helpful, professional, respectful, and unbiased in all interactions."
+    return base_prompt
+
+
+def legacy_messages(user_message, articles, history, language):
+    """Previous layout: retrieved passages and reply language inside the system prompt"""
+    system_prompt = legacy_system_prompt(COMPANY)
+    context = ""
+    for i, article in enumerate(articles[:3], 1):
+        context += f"{i}. {article.get('title', 'Untitled')}: {article.get('content', '')[:300]}...\n\n"
+    system_prompt += "\n\nKNOWLEDGE BASE (answer from it when it covers the question):\n" + context
+    system_prompt += (f"\n\nYou are speaking on a phone call: reply in {language}, in two or three short,"
+                      " conversational sentences without lists or formatting.")
+    messages = [{"role": "system", "content": system_prompt}]
+    for exchange in history:
+        messages.append({"role": "user", "content": exchange['user']})
+        messages.append({"role": "assistant", "content": exchange['ai']})
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+
+def retrieved(turn):
+    return [KNOWLEDGE_BASE[(turn + offset) % len(KNOWLEDGE_BASE)] for offset in range(3)]
+
+
+def compiled_messages(user_message, articles, history, language):
+    return prompt_builder.build_messages(user_message, COMPANY, articles, history, language,
+                                         knowledge_base=KNOWLEDGE_BASE, kb_version="bench-kb-v1")
+
+
+def bench_build(iterations: int):
+    history = [{"user": QUESTIONS[i], "ai": "Sure, here are the details."} for i in range(3)]
+    for name, build in (("legacy", legacy_messages), ("compiled", compiled_messages)):
+        build(QUESTIONS[0], retrieved(0), history, "english")
+        runs = []
+        for _ in range(5):
+            started = time.perf_counter()
+            for i in range(iterations):
+                build(QUESTIONS[i % len(QUESTIONS)], retrieved(i), history, "english")
+            runs.append((time.perf_counter() - started) * 1e6 / iterations)
+        print(f"build     {name:8s} {min(runs):7.2f} us/turn (best of 5)")
+
+
+async def bench_provider(args):
+    from benchmarks.provider_router_benchmark import serve
+    from services.llm_service import LLMService
+    from tools.fake_openai import create_app
+
+    results = {}
+    for offset, (name, build) in enumerate((("legacy", legacy_messages), ("compiled", compiled_messages))):
+        port = args.port + offset
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+        server = await serve(create_app(args.first_token_ms, args.token_ms, seed=1,
+                                        prefill_ms_per_1k=args.prefill_ms_per_1k), port)
+        service = LLMService()
+        before = (prompt_builder.provider_prompt_tokens, prompt_builder.provider_cached_tokens)
+        first_sentence = []
+        histories = {}
+        for turn in range(args.turns):
+            call = turn % args.calls
+            history = histories.setdefault(call, [])
+            question = QUESTIONS[turn % len(QUESTIONS)]
+            result = await service.generate_streaming(build(question, retrieved(turn), history[-5:], "english"))
+            first_sentence.append(result["first_sentence_ms"])
+            history.append({"user": question, "ai": result["response"]})
+        prompt_tokens = prompt_builder.provider_prompt_tokens - before[0]
+        cached_tokens = prompt_builder.provider_cached_tokens - before[1]
+        results[name] = statistics.median(first_sentence)
+        print(f"provider  {name:8s} prompt tokens/turn {prompt_tokens / args.turns:6.0f}  "
+              f"cached {cached_tokens * 100 / prompt_tokens:5.1f}%  "
+              f"first sentence p50 {results[name]:6.1f} ms")
+        server.should_exit = True
+        await asyncio.sleep(0.2)
+    print(f"first sentence {results['legacy'] - results['compiled']:.1f} ms sooner with compiled prefixes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--calls", type=int, default=6)
+    parser.add_argument("--first-token-ms", type=float, default=150)
+    parser.add_argument("--token-ms", type=float, default=5)
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=80)
+    parser.add_argument("--port", type=int, default=9130)
+    args = parser.parse_args()
+    os.environ["OPENAI_API_KEY"] = "stub"
+    logging.disable(logging.CRITICAL)
+    bench_build(args.iterations)
+    asyncio.run(bench_provider(args))
+
+
+if __name__ == "__main__":
+    main()
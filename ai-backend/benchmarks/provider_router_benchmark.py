@@ -0,0 +1,95 @@
+"""
+Provider routing benchmark against local fake endpoints
+
+Starts fake inference servers in-process (tools/fake_provider.py) and sends
+sequential TTS-style requests through a ProviderRouter:
+
+- single:  one endpoint that stalls on --slow-rate of requests
+- routed:  that endpoint, an identical mirror and a third replica that is
+           cold (503 "loading") for its first seconds - hedging hides the
+           stalls and the circuit breaker ejects the cold replica until it
+           is ready
+
+Usage:
+    cd ai-backend
+    python benchmarks/provider_router_benchmark.py --requests 300
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn
+
+from services.provider_router import ProviderError, ProviderRouter
+from tools.fake_provider import create_app
+
+
+async def serve(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error"))
+    asyncio.ensure_future(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(router: ProviderRouter, count: int):
+    latencies, failures = [], 0
+    for i in range(count):
+        started = time.perf_counter()
+        try:
+            await router.request({"json": {"inputs": f"Namaste, turn {i}"}}, lambda response: response.content)
+        except ProviderError:
+            failures += 1
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, failures
+
+
+async def main_async(args):
+    base = args.port
+    url = "http://127.0.0.1:{}/models/tts"
+    servers = [
+        await serve(create_app(latency_ms=60, slow_rate=args.slow_rate, slow_ms=2500, seed=1), base),
+        await serve(create_app(latency_ms=60, slow_rate=args.slow_rate, slow_ms=2500, seed=2), base + 1),
+    ]
+
+    single = ProviderRouter("single", [url.format(base)])
+    routed = ProviderRouter("routed", [url.format(port) for port in (base, base + 1, base + 2)])
+
+    for name, router in (("single", single), ("routed", routed)):
+        if router is routed:
+            # The cold replica comes up just before the routed run
+            servers.append(await serve(create_app(latency_ms=60, cold_start_s=args.cold_start, seed=3), base + 2))
+        latencies, failures = await run(router, args.requests)
+        print(f"{name:7s} p50 {percentile(latencies, 0.5):7.1f} ms  p95 {percentile(latencies, 0.95):7.1f} ms  "
+              f"p99 {percentile(latencies, 0.99):7.1f} ms  max {max(latencies):7.1f} ms  "
+              f"mean {statistics.mean(latencies):6.1f} ms  failures {failures}")
+    print(routed.get_stats())
+
+    for server in servers:
+        server.should_exit = True
+    await asyncio.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--cold-start", type=float, default=3.0)
+    parser.add_argument("--port", type=int, default=9101)
+    args = parser.parse_args()
+    os.environ.setdefault("PROVIDER_CIRCUIT_OPEN_SECONDS", "2")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Text-chat response cache benchmark against the local OpenAI-compatible stub
+
+Sends a Zipf-distributed stream of questions, each asked in several wordings
+("what's your pricing?", "What is the pricing", ...), the way /ai/chat does
+(cache lookup first, model call on a miss) and reports:
+
+- model calls, hit rate per tier (exact / near-duplicate) and latency p50/p95
+  with and without the response cache
+- wrong matches: hits that returned the answer generated for a different question
+- lookup cost in microseconds
+
+Usage:
+    cd ai-backend
+    python benchmarks/response_cache_benchmark.py --messages 300
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.llm_streaming_benchmark import percentile
+
+QUESTIONS = [
+    ["What's your pricing?", "What is the pricing", "what is your pricing?", "Pricing?"],
+    ["What are your business hours?", "what are the business hours", "Business hours?", "What're your business hours"],
+    ["Can I cancel my subscription?", "can i cancel the subscription", "Can I cancel my subscription"],
+    ["Do you offer a free trial?", "do you offer free trial", "Do you offer a free trial"],
+    ["How do I reset my password?", "how do i reset the password", "How do I reset my password"],
+    ["What does plan 2 cost?", "what does plan 2 cost", "What does Plan 2 cost?"],
+    ["What does plan 3 cost?", "what does plan 3 cost", "What does Plan 3 cost?"],
+    ["Is there a refund policy?", "is there a refund policy", "Refund policy?"],
+    ["Where is your office located?", "where is the office located", "Where's your office located?"],
+    ["Can I not cancel my subscription online?", "can i not cancel the subscription online"],
+    ["Do you deliver to Pune?", "do you deliver to pune", "Do u deliver to Pune?"],
+    ["How do I contact support?", "how do i contact support", "How do I contact the support?"],
+]
+ARTICLES = [{"title": "Pricing", "content": "The Pro plan costs 999 rupees per month. Plan 2 costs 499 and plan 3 costs 799."},
+            {"title": "Support", "content": "Support is available from 9 AM to 6 PM on weekdays by phone and chat."}]
+COMPANY = {"id": "acme", "name": "Acme"}
+
+
+def traffic(count: int, seed: int):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(QUESTIONS))]
+    for _ in range(count):
+        qid = rng.choices(range(len(QUESTIONS)), weights)[0]
+        yield qid, rng.choice(QUESTIONS[qid])
+
+
+async def run(service, cache, messages, use_cache: bool):
+    cache.clear()
+    answered_for = {}
+    latencies, wrong = [], 0
+    for qid, message in messages:
+        started = time.perf_counter()
+        result = service.cached_response(message, ARTICLES, COMPANY) if use_cache else None
+        if result is None:
+            result = await service.generate_response_with_knowledge(message, ARTICLES, COMPANY, check_cache=False)
+            answered_for[result["response"]] = qid
+        elif answered_for.get(result["response"]) != qid:
+            wrong += 1
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, wrong
+
+
+async def main_async(args):
+    from benchmarks.provider_router_benchmark import serve
+    from services.llm_service import LLMService
+    from services.response_cache import response_cache
+    from tools.fake_openai import create_app
+
+    app = create_app(args.first_token_ms, args.token_ms, seed=1)
+    server = await serve(app, args.port)
+    service = LLMService()
+    messages = list(traffic(args.messages, seed=7))
+
+    for use_cache in (False, True):
+        before_requests = app.state.requests
+        before = response_cache.get_stats()
+        latencies, wrong = await run(service, response_cache, messages, use_cache)
+        stats = response_cache.get_stats()
+        exact = stats["exact_hits"] - before["exact_hits"]
+        near = stats["near_hits"] - before["near_hits"]
+        print(f"{'cache' if use_cache else 'no cache':8s}  model calls {app.state.requests - before_requests:4d}  "
+              f"hits exact {exact:4d} near {near:4d}  wrong {wrong}  "
+              f"latency p50 {percentile(latencies, 0.5):7.2f} ms  p95 {percentile(latencies, 0.95):7.2f} ms")
+
+    iterations = 20000
+    started = time.perf_counter()
+    for i in range(iterations):
+        response_cache.get("acme", "v", messages[i % len(messages)][1])
+    print(f"lookup    {(time.perf_counter() - started) * 1e6 / iterations:.1f} us (miss path incl. SimHash)")
+
+    server.should_exit = True
+    await asyncio.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--first-token-ms", type=float, default=100)
+    parser.add_argument("--token-ms", type=float, default=3)
+    parser.add_argument("--port", type=int, default=9150)
+    args = parser.parse_args()
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    logging.disable(logging.CRITICAL)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Streaming voice request parser benchmark
+
+Compares peak Python heap and CPU for a KB-heavy /voice/voice-response body:
+
+- full:      json_codec.loads of the whole body (both KB copies materialized)
+             followed by lexical top-k retrieval over every item
+- streaming: VoiceBodyParser fed in network-sized chunks, keeping only the
+             top-k candidates and skipping call_data.knowledgeBase
+
+Both paths must select the same KB content.
+
+Usage:
+    cd ai-backend
+    python benchmarks/voice_body_parser_benchmark.py --chunks 2000 --read-size 65536
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import json_codec
+from services.ai_engine import ai_engine, KB_TOP_K
+from services.kb_cache import kb_fingerprint
+from services.voice_body_parser import StreamingKBSelector, VoiceBodyParser
+
+QUESTION = "What does the enterprise backup plan cost?"
+
+
+def build_body(chunks: int) -> bytes:
+    topics = ["managed backups and restore", "monitoring dashboards", "enterprise pricing and billing",
+              "24/7 support escalation", "data residency in India"]
+    knowledge_base = [{
+        "title": f"Product Guide {i // 20}",
+        "content": (f"Section {i} covers {topics[i % len(topics)]}. " * 40)[:1500],
+        "category": "products",
+        "chunk_id": i % 20 + 1
+    } for i in range(chunks)]
+    return json.dumps({
+        "user_message": QUESTION,
+        "call_data": {"companyName": "TechCorp", "companyId": "65f0c0ffee", "knowledgeBase": knowledge_base},
+        "voice_settings": {"personality": "priyanshu", "language": "auto"},
+        "call_sid": "CA123",
+        "knowledge_base": knowledge_base
+    }).encode("utf-8")
+
+
+def full(body: bytes, read_size: int):
+    data = json_codec.loads(body)
+    knowledge_base = data["knowledge_base"]
+    version = kb_fingerprint(knowledge_base)
+    return ai_engine._search_knowledge_base(QUESTION.lower(), knowledge_base, version), version
+
+
+def streaming(body: bytes, read_size: int):
+    selector = StreamingKBSelector(ai_engine._score_kb_item, ai_engine._kb_query_terms, KB_TOP_K)
+    parser = VoiceBodyParser(selector)
+    for offset in range(0, len(body), read_size):
+        parser.feed(body[offset:offset + read_size])
+    data = parser.close()
+    version = selector.fingerprint.hexdigest()
+    return ai_engine._search_knowledge_base(QUESTION.lower(), data["knowledge_base"], version), version
+
+
+def measure(fn, body: bytes, read_size: int, iterations: int):
+    result = fn(body, read_size)
+    start = time.process_time()
+    for _ in range(iterations):
+        fn(body, read_size)
+    cpu_ms = (time.process_time() - start) / iterations * 1000
+
+    tracemalloc.start()
+    fn(body, read_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, cpu_ms, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--read-size", type=int, default=65536, help="Bytes per fed chunk (ASGI receive size)")
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+
+    body = build_body(args.chunks)
+    full_result, full_ms, full_peak = measure(full, body, args.read_size, args.iterations)
+    stream_result, stream_ms, stream_peak = measure(streaming, body, args.read_size, args.iterations)
+
+    print(f"payload: {len(body) / 1024 / 1024:.1f} MiB ({args.chunks} KB chunks, sent twice), orjson: {json_codec.ORJSON_AVAILABLE}")
+    print(f"full:      {full_ms:8.1f} ms CPU  peak heap {full_peak / 1024 / 1024:8.2f} MiB")
+    print(f"streaming: {stream_ms:8.1f} ms CPU  peak heap {stream_peak / 1024 / 1024:8.2f} MiB")
+    print(f"same KB content: {full_result[0] == stream_result[0]}, same version: {full_result[1] == stream_result[1]}")
+
+
+if __name__ == "__main__":
+    main()
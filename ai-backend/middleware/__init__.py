@@ -0,0 +1 @@
+# Middleware package for TalkAI Phase 3
\ No newline at end of file
@@ -0,0 +1,208 @@
+"""
+Admission control and load shedding
+
+Under a spike every request used to be accepted and queued on the single
+event loop, pushing every live call past the caller's 8 s deadline. This
+middleware tracks in-flight work and event-loop lag and, above the
+configured limits, sheds work before it reaches the routers:
+
+- normal:        everything is admitted
+- shedding_low:  low-priority work (text chat, legacy /ai endpoints, test
+                 endpoints) gets an immediate 503 with Retry-After
+- overloaded:    additionally, voice turns get a pre-built fallback response
+                 instead of entering generate_response; new /voice/ws turn
+                 channels are refused (close code 1013, try again later) and
+                 utterances on open ones get the same fallback turn
+
+Health, readiness, metrics and admin endpoints are never shed; /ready reports the
+state (503 while overloaded) so the load balancer can route away.
+"""
+import os
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict
+
+from starlette.responses import JSONResponse, Response
+from starlette.websockets import WebSocketClose
+
+from services import json_codec
+from services.loop_monitor import loop_monitor
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_CRITICAL = 'critical'
+PRIORITY_VOICE = 'voice'
+PRIORITY_LOW = 'low'
+
+STATE_NORMAL = 'normal'
+STATE_SHEDDING_LOW = 'shedding_low'
+STATE_OVERLOADED = 'overloaded'
+
+_CRITICAL_PATHS = {'/', '/health', '/ready', '/keepalive', '/metrics', '/voice/health', '/voice/stats'}
+_VOICE_PATHS = {'/voice/voice-response', '/voice/ws'}
+
+# Sent instead of running the engine while overloaded - same shape as VoiceResponse
+_VOICE_FALLBACK_FIELDS = {
+    "ai_response": "Sorry, could you please say that again?",
+    "detected_language": "english",
+    "language_confidence": 0.5,
+    "sentiment": {"label": "neutral", "score": 0.5},
+    "personality": "priyanshu",
+    "context_used": False,
+    "conversation_stage": None,
+    "should_escalate": False,
+    "abusive_detected": False,
+    "intent": "overloaded",
+    "intent_confidence": 0.0,
+    "goodbye_detected": False,
+    "kb_used": False,
+    "timestamp": None,
+    "degraded_stages": ["admission"]
+}
+_VOICE_FALLBACK = json_codec.dumps(_VOICE_FALLBACK_FIELDS)
+
+# WebSocket close code for "try again later" (RFC 6455 registry)
+WS_CLOSE_TRY_AGAIN_LATER = 1013
+
+
+def voice_fallback() -> Dict[str, Any]:
+    """The overload fallback turn as a dict (for transports that build their own frames)"""
+    return {**_VOICE_FALLBACK_FIELDS, "sentiment": dict(_VOICE_FALLBACK_FIELDS["sentiment"]),
+            "degraded_stages": list(_VOICE_FALLBACK_FIELDS["degraded_stages"])}
+
+
+def request_priority(path: str) -> str:
+    """Priority class of a request path"""
+    # Admin endpoints (authenticated) are how an overloaded instance gets diagnosed
+    if path in _CRITICAL_PATHS or path.startswith('/admin/'):
+        return PRIORITY_CRITICAL
+    if path in _VOICE_PATHS:
+        return PRIORITY_VOICE
+    return PRIORITY_LOW
+
+
+class AdmissionController:
+    """In-flight and loop-lag tracking plus the admission decision"""
+
+    def __init__(self):
+        self.max_in_flight = int(os.getenv('ADMISSION_MAX_IN_FLIGHT', 64))
+        self.low_priority_max_in_flight = int(os.getenv('ADMISSION_LOW_PRIORITY_MAX_IN_FLIGHT', 32))
+        self.max_lag = float(os.getenv('ADMISSION_MAX_LAG_MS', 500)) / 1000
+        self.low_priority_max_lag = float(os.getenv('ADMISSION_LOW_PRIORITY_MAX_LAG_MS', 150)) / 1000
+        self.retry_after = os.getenv('ADMISSION_RETRY_AFTER_SECONDS', '2')
+        self.in_flight = 0
+        self.in_flight_by_priority: Dict[str, int] = {PRIORITY_VOICE: 0, PRIORITY_LOW: 0}
+        self.admitted: Dict[str, int] = {PRIORITY_CRITICAL: 0, PRIORITY_VOICE: 0, PRIORITY_LOW: 0}
+        self.shed: Dict[str, int] = {PRIORITY_VOICE: 0, PRIORITY_LOW: 0}
+        self.state = STATE_NORMAL
+
+    @property
+    def loop_lag(self) -> float:
+        """Sustained event-loop lag (seconds, windowed p75) from the loop monitor"""
+        return loop_monitor.sustained_lag
+
+    def current_state(self) -> str:
+        if self.in_flight >= self.max_in_flight or self.loop_lag >= self.max_lag:
+            state = STATE_OVERLOADED
+        elif self.in_flight >= self.low_priority_max_in_flight or self.loop_lag >= self.low_priority_max_lag:
+            state = STATE_SHEDDING_LOW
+        else:
+            state = STATE_NORMAL
+        if state != self.state:
+            logger.warning("Admission state %s -> %s (in flight %d, loop lag %.0f ms)",
+                           self.state, state, self.in_flight, self.loop_lag * 1000)
+            self.state = state
+        return state
+
+    def admit(self, priority: str) -> bool:
+        """Whether a request of this priority may enter the app right now"""
+        if priority != PRIORITY_CRITICAL:
+            state = self.current_state()
+            if state == STATE_OVERLOADED or (state == STATE_SHEDDING_LOW and priority == PRIORITY_LOW):
+                self.shed[priority] += 1
+                return False
+        self.admitted[priority] += 1
+        return True
+
+    @contextmanager
+    def in_flight_slot(self, priority: str):
+        """Count admitted work as in flight for as long as the block runs"""
+        self.in_flight += 1
+        self.in_flight_by_priority[priority] += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.in_flight_by_priority[priority] -= 1
+
+    def get_stats(self) -> Dict:
+        return {
+            "state": self.current_state(),
+            "in_flight": self.in_flight,
+            "in_flight_by_priority": dict(self.in_flight_by_priority),
+            "loop_lag_ms": round(self.loop_lag * 1000, 2),
+            "limits": {
+                "max_in_flight": self.max_in_flight,
+                "low_priority_max_in_flight": self.low_priority_max_in_flight,
+                "max_lag_ms": self.max_lag * 1000,
+                "low_priority_max_lag_ms": self.low_priority_max_lag * 1000
+            },
+            "admitted": dict(self.admitted),
+            "shed": dict(self.shed)
+        }
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware; must be the outermost so shed requests cost (almost) nothing"""
+
+    def __init__(self, app, controller: AdmissionController = None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'websocket':
+            await self._websocket(scope, receive, send)
+            return
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        controller = self.controller
+        priority = request_priority(scope['path'])
+        if not controller.admit(priority):
+            await self._shed_response(priority)(scope, receive, send)
+            return
+        if priority == PRIORITY_CRITICAL:
+            await self.app(scope, receive, send)
+            return
+
+        with controller.in_flight_slot(priority):
+            await self.app(scope, receive, send)
+
+    async def _websocket(self, scope, receive, send):
+        """
+        Admit or refuse a WebSocket handshake
+
+        The connection itself is not counted as in flight (a call keeps it open
+        for minutes); its utterances are, and are checked one by one by the router.
+        """
+        priority = request_priority(scope['path'])
+        if not self.controller.admit(priority):
+            # Answering the connect event with a close rejects the handshake
+            await receive()
+            await WebSocketClose(code=WS_CLOSE_TRY_AGAIN_LATER, reason='Server is overloaded')(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+    def _shed_response(self, priority: str) -> Response:
+        if priority == PRIORITY_VOICE:
+            # A fast, well-formed turn beats a timeout: the caller plays it and the user repeats
+            return Response(_VOICE_FALLBACK, media_type='application/json', headers={'X-Admission': 'shed'})
+        return JSONResponse(
+            {"detail": "Server is overloaded, retry later", "admission_state": self.controller.state},
+            status_code=503,
+            headers={'Retry-After': self.controller.retry_after, 'X-Admission': 'shed'}
+        )
+
+# Global instance
+admission_controller = AdmissionController()
@@ -0,0 +1,314 @@
+"""
+HTTP body compression
+
+Request bodies sent with `Content-Encoding: gzip | deflate | zstd` are
+decompressed incrementally as the app reads them (the streaming voice parser
+never sees the compressed bytes and nothing is buffered here), with a hard
+ceiling on the decompressed size. Responses are compressed when the client
+advertises support in Accept-Encoding and the body is large enough to be worth
+it (KB-heavy /ai/synthesize and batch outputs; small voice turns pass through).
+"""
+import os
+import time
+import zlib
+import logging
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Worst-case zstd expansion is bounded per input slice so a tiny bomb cannot allocate gigabytes
+_ZSTD_INPUT_SLICE = 1024
+
+_COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'application/xml', 'text/')
+
+
+class CompressionStats:
+    """Byte and timing counters for /metrics"""
+
+    def __init__(self):
+        self.requests_decompressed = 0
+        self.request_bytes_compressed = 0
+        self.request_bytes_decompressed = 0
+        self.decompression_seconds = 0.0
+        self.requests_rejected = 0
+        self.responses_compressed = 0
+        self.response_bytes_uncompressed = 0
+        self.response_bytes_compressed = 0
+        self.compression_seconds = 0.0
+
+    def get_stats(self) -> Dict:
+        return {
+            "zstd_available": ZSTD_AVAILABLE,
+            "requests_decompressed": self.requests_decompressed,
+            "request_bytes_saved": self.request_bytes_decompressed - self.request_bytes_compressed,
+            "decompression_ms_total": round(self.decompression_seconds * 1000, 2),
+            "decompression_ms_avg": round(self.decompression_seconds * 1000 / self.requests_decompressed, 3)
+            if self.requests_decompressed else 0.0,
+            "requests_rejected": self.requests_rejected,
+            "responses_compressed": self.responses_compressed,
+            "response_bytes_saved": self.response_bytes_uncompressed - self.response_bytes_compressed,
+            "compression_ms_total": round(self.compression_seconds * 1000, 2)
+        }
+
+
+class RequestBodyError(Exception):
+    """Raised from receive() when a request body cannot be accepted"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class _BodyDecoder:
+    """Incremental decoder for one request body with a decompressed-size ceiling"""
+
+    def __init__(self, encoding: str, max_bytes: int):
+        self.encoding = encoding
+        self.remaining = max_bytes
+        if encoding == 'zstd':
+            self._zstd = zstandard.ZstdDecompressor().decompressobj()
+            self._zlib = None
+        else:
+            wbits = 16 + zlib.MAX_WBITS if encoding in ('gzip', 'x-gzip') else zlib.MAX_WBITS
+            self._zlib = zlib.decompressobj(wbits)
+            self._zstd = None
+
+    def _take(self, output: bytes) -> bytes:
+        if len(output) > self.remaining:
+            raise RequestBodyError(413, "Request body too large")
+        self.remaining -= len(output)
+        return output
+
+    def decode(self, data: bytes, final: bool) -> bytes:
+        try:
+            if self._zlib is not None:
+                # max_length caps each step; the rest waits in unconsumed_tail
+                parts = [self._take(self._zlib.decompress(data, self.remaining + 1))]
+                while self._zlib.unconsumed_tail:
+                    parts.append(self._take(self._zlib.decompress(self._zlib.unconsumed_tail, self.remaining + 1)))
+                if final:
+                    parts.append(self._take(self._zlib.flush()))
+                    if not self._zlib.eof:
+                        raise RequestBodyError(400, f"Truncated {self.encoding} request body")
+                return b''.join(parts)
+
+            parts = []
+            for offset in range(0, len(data), _ZSTD_INPUT_SLICE):
+                parts.append(self._take(self._zstd.decompress(data[offset:offset + _ZSTD_INPUT_SLICE])))
+            if final and not self._zstd.eof:
+                raise RequestBodyError(400, "Truncated zstd request body")
+            return b''.join(parts)
+        except (zlib.error, ValueError) as e:
+            raise RequestBodyError(400, f"Invalid {self.encoding} request body: {e}")
+        except Exception as e:
+            if zstandard is not None and isinstance(e, zstandard.ZstdError):
+                raise RequestBodyError(400, f"Invalid zstd request body: {e}")
+            raise
+
+
+class _ResponseEncoder:
+    """Streaming gzip/zstd compressor for one response body"""
+
+    def __init__(self, encoding: str, gzip_level: int, zstd_level: int):
+        if encoding == 'zstd':
+            self._zstd = zstandard.ZstdCompressor(level=zstd_level).compressobj()
+            self._zlib = None
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._zstd = None
+
+    def encode(self, data: bytes, final: bool) -> bytes:
+        if self._zlib is not None:
+            return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        flush_mode = zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        return self._zstd.compress(data) + self._zstd.flush(flush_mode)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pick a response encoding from an Accept-Encoding header
+
+    Args:
+        accept_encoding (str): Raw header value, e.g. "gzip, zstd;q=0.9"
+
+    Returns:
+        str: 'zstd' or 'gzip', or None to send the body uncompressed
+    """
+    if not accept_encoding:
+        return None
+    offered = {}
+    for part in accept_encoding.lower().split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip()] = quality
+
+    candidates = []
+    if ZSTD_AVAILABLE:
+        candidates.append('zstd')
+    candidates.append('gzip')
+    best, best_quality = None, 0.0
+    for encoding in candidates:
+        quality = offered.get(encoding, offered.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware (keeps the receive/send streams intact, unlike BaseHTTPMiddleware)"""
+
+    def __init__(self, app, minimum_size: int = None, max_body_bytes: int = None):
+        self.app = app
+        self.minimum_size = minimum_size or int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+        self.max_body_bytes = max_body_bytes or int(os.getenv('MAX_REQUEST_BODY_BYTES', 32 * 1024 * 1024))
+        self.gzip_level = int(os.getenv('COMPRESSION_GZIP_LEVEL', 5))
+        self.zstd_level = int(os.getenv('COMPRESSION_ZSTD_LEVEL', 3))
+        self.supported_encodings = {'gzip', 'x-gzip', 'deflate'}
+        if ZSTD_AVAILABLE:
+            self.supported_encodings.add('zstd')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        content_encoding = headers.get('content-encoding', '').strip().lower()
+        if content_encoding and content_encoding != 'identity':
+            if content_encoding not in self.supported_encodings:
+                compression_stats.requests_rejected += 1
+                response = JSONResponse({"detail": f"Unsupported Content-Encoding: {content_encoding}"}, status_code=415)
+                await response(scope, receive, send)
+                return
+            scope = dict(scope)
+            scope['headers'] = [(name, value) for name, value in scope['headers']
+                                if name not in (b'content-encoding', b'content-length')]
+            receive = self._decompressing_receive(receive, _BodyDecoder(content_encoding, self.max_body_bytes))
+
+        state = {'error': None, 'started': False}
+        original_send = send
+        encoding = negotiate_encoding(headers.get('accept-encoding'))
+        if encoding:
+            send = self._compressing_send(send, encoding)
+
+        async def guarded_send(message):
+            if message['type'] == 'http.response.start':
+                if state['error'] is not None:
+                    # The endpoint swallowed the body error and built its own reply - report the real problem
+                    state['started'] = True
+                    error = state['error']
+                    await JSONResponse({"detail": error.detail}, status_code=error.status_code)(scope, receive, original_send)
+                    return
+                state['started'] = True
+            elif state['error'] is not None:
+                return
+            await send(message)
+
+        async def tracked_receive():
+            try:
+                return await receive()
+            except RequestBodyError as e:
+                if state['error'] is None:
+                    compression_stats.requests_rejected += 1
+                    logger.warning("Rejected request body for %s: %s", scope.get('path'), e.detail)
+                state['error'] = e
+                raise
+
+        try:
+            await self.app(scope, tracked_receive, guarded_send)
+        except RequestBodyError as e:
+            if state['started']:
+                raise
+            await JSONResponse({"detail": e.detail}, status_code=e.status_code)(scope, receive, original_send)
+
+    def _decompressing_receive(self, receive, decoder: _BodyDecoder):
+        counted = {'compressed': 0, 'decompressed': 0, 'seconds': 0.0}
+
+        async def wrapped():
+            message = await receive()
+            if message['type'] != 'http.request':
+                return message
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+            started = time.perf_counter()
+            decoded = decoder.decode(body, final=not more_body)
+            counted['seconds'] += time.perf_counter() - started
+            counted['compressed'] += len(body)
+            counted['decompressed'] += len(decoded)
+
+            if not more_body:
+                compression_stats.requests_decompressed += 1
+                compression_stats.request_bytes_compressed += counted['compressed']
+                compression_stats.request_bytes_decompressed += counted['decompressed']
+                compression_stats.decompression_seconds += counted['seconds']
+            return {'type': 'http.request', 'body': decoded, 'more_body': more_body}
+
+        return wrapped
+
+    def _compressing_send(self, send, encoding: str):
+        pending = {'start': None, 'encoder': None, 'passthrough': False}
+
+        async def wrapped(message):
+            if message['type'] == 'http.response.start':
+                pending['start'] = message
+                return
+            if message['type'] != 'http.response.body' or pending['passthrough']:
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            start = pending['start']
+            encoder = pending['encoder']
+
+            if encoder is None:
+                headers = MutableHeaders(raw=start['headers'])
+                content_type = headers.get('content-type', '')
+                if (headers.get('content-encoding') or 'text/event-stream' in content_type
+                        or not content_type.startswith(_COMPRESSIBLE_TYPES)
+                        or (not more_body and len(body) < self.minimum_size)):
+                    pending['passthrough'] = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = pending['encoder'] = _ResponseEncoder(encoding, self.gzip_level, self.zstd_level)
+                headers['Content-Encoding'] = encoding
+                headers.add_vary_header('Accept-Encoding')
+                del headers['Content-Length']
+                compression_stats.responses_compressed += 1
+
+            started = time.perf_counter()
+            compressed = encoder.encode(body, final=not more_body)
+            compression_stats.compression_seconds += time.perf_counter() - started
+            compression_stats.response_bytes_uncompressed += len(body)
+            compression_stats.response_bytes_compressed += len(compressed)
+
+            if pending['start'] is not None:
+                if not more_body:
+                    MutableHeaders(raw=start['headers'])['Content-Length'] = str(len(compressed))
+                await send(start)
+                pending['start'] = None
+            await send({'type': 'http.response.body', 'body': compressed, 'more_body': more_body})
+
+        return wrapped
+
+# Global instance
+compression_stats = CompressionStats()
@@ -0,0 +1,117 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import os
+import hmac
+import asyncio
+import logging
+from services.profiler import sampling_profiler, ProfilerBusyError
+from services.tracing import tracer, otlp_request
+from services.memory_monitor import memory_monitor
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+logger = logging.getLogger(__name__)
+
+def require_admin(request: Request):
+    """
+    Bearer-token check for admin endpoints
+
+    ADMIN_TOKEN unset disables the admin API entirely (404), so a deployment
+    without a token does not expose profiling.
+    """
+    admin_token = os.getenv('ADMIN_TOKEN', '')
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = request.headers.get('authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(token.strip().encode(), admin_token.encode()):
+        logger.warning("Rejected admin request to %s", request.url.path)
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+@router.get("/profile", dependencies=[Depends(require_admin)])
+async def profile(
+    seconds: float = Query(10.0, gt=0, description="Sampling duration (capped at PROFILER_MAX_SECONDS)"),
+    hz: Optional[float] = Query(None, gt=0, le=1000, description="Samples per second (PROFILER_SAMPLE_HZ by default)"),
+    format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+    main_only: bool = Query(False, description="Sample only the main (event loop) thread")
+):
+    """
+    Sample the live process's stacks for `seconds`
+
+    - collapsed: one "frame;frame;frame count" line per stack, for
+      flamegraph.pl or https://www.speedscope.app
+    - json: session metadata plus the top functions by self and total samples
+
+    Requests keep being served while sampling; only one session runs at a time.
+    """
+    try:
+        session = await sampling_profiler.profile(seconds, hz, main_only)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    stacks = session.pop('stacks')
+    if format == 'json':
+        return {**session, **sampling_profiler.top_functions(stacks)}
+    return PlainTextResponse(
+        sampling_profiler.collapsed(stacks),
+        headers={
+            "Content-Disposition": 'attachment; filename="profile.collapsed"',
+            "X-Profile-Samples": str(session['samples']),
+            "X-Profile-Overhead-Percent": str(session['overhead_percent'])
+        }
+    )
+
+@router.get("/traces/{call_sid}", dependencies=[Depends(require_admin)])
+async def call_trace(call_sid: str, format: str = Query("json", pattern="^(json|otlp)$")):
+    """
+    Trace of one call: every recorded turn with its stage spans
+
+    - json: turns oldest first, each with its stages (parent_span_id gives the nesting)
+    - otlp: the same spans as an OTLP/JSON ExportTraceServiceRequest (e.g. for Jaeger/Tempo import)
+    """
+    turns = tracer.get_call_trace(call_sid)
+    if turns is None:
+        raise HTTPException(status_code=404, detail=f"No trace recorded for call {call_sid}")
+    if format == 'otlp':
+        return otlp_request(turns)
+    return {
+        "call_sid": call_sid,
+        "trace_id": turns[0].trace_id,
+        "turns": [
+            {**turn.to_dict(), "stages": [span.to_dict() for span in turn.spans]}
+            for turn in turns
+        ]
+    }
+
+@router.get("/memory", dependencies=[Depends(require_admin)])
+async def memory_report(types: bool = Query(False, description="Also count live objects by type (walks the heap)")):
+    """RSS, guard state and approximate size of every registered subsystem"""
+    report = memory_monitor.get_stats()
+    if types:
+        report["object_counts"] = await asyncio.to_thread(memory_monitor.object_counts)
+    return report
+
+@router.post("/memory/tracemalloc/start", dependencies=[Depends(require_admin)])
+async def tracemalloc_start(frames: int = Query(1, ge=1, le=25)):
+    """Start tracemalloc (slows allocations while on) and take the baseline snapshot"""
+    return await asyncio.to_thread(memory_monitor.start_tracing, frames)
+
+@router.get("/memory/tracemalloc/diff", dependencies=[Depends(require_admin)])
+async def tracemalloc_diff(
+    group: str = Query("module", pattern="^(module|line)$"),
+    limit: int = Query(25, ge=1, le=500),
+    reset: bool = Query(False, description="Use this snapshot as the next baseline")
+):
+    """Allocation growth since the baseline, grouped by app file / package / stdlib module (or line)"""
+    try:
+        return await asyncio.to_thread(memory_monitor.snapshot_diff, group, limit, reset)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.post("/memory/tracemalloc/stop", dependencies=[Depends(require_admin)])
+async def tracemalloc_stop():
+    return memory_monitor.stop_tracing()
+
+@router.post("/memory/evict", dependencies=[Depends(require_admin)])
+async def memory_evict(fraction: float = Query(0.5, gt=0, le=1)):
+    """Run the guard's eviction now (caches first, conversation state last)"""
+    return memory_monitor.evict(fraction)
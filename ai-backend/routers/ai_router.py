@@ -2,9 +2,12 @@ from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Request
 from typing import Optional, List, Dict
 import time
 import logging
-import json
 from datetime import datetime
 from models.schemas import ChatRequest, ChatResponse, VoiceCallResponse
+from services import json_codec
+from services.json_codec import FastJSONResponse
+from services.cancellation import run_until_disconnect
+from services.fair_scheduler import fair_scheduler, lane_from_header, LANE_LIVE_VOICE, LANE_TEXT_CHAT
 
 # ✅ IMPROVED: Import services with error handling
 try:
@@ -19,6 +22,16 @@ except ImportError as e:
 router = APIRouter(prefix="/ai", tags=["AI"])
 logger = logging.getLogger(__name__)
 
+def _chat_response(ai_response: str, confidence: float, processing_time: float, model_used: str) -> FastJSONResponse:
+    """Serialize a ChatResponse payload once (no response_model re-validation)"""
+    return FastJSONResponse({
+        "ai_response": ai_response,
+        "confidence": confidence,
+        "should_escalate": False,
+        "processing_time": processing_time,
+        "model_used": model_used
+    })
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_with_ai(request: Request):
     """
@@ -28,24 +41,20 @@ async def chat_with_ai(request: Request):
     For voice calls, use /voice/voice-response endpoint
     """
     try:
-        # Get raw request body for debugging
+        # Decode straight from the raw bytes; debug previews are only built when debug is on
         body = await request.body()
-        body_str = body.decode('utf-8', errors='replace')
-        logger.debug(f"Text chat request received: {body_str[:200]}...")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Text chat request received: %s...", body[:200].decode('utf-8', errors='replace'))
         
         # Parse JSON
         try:
-            data = json.loads(body_str)
-            logger.debug(f"Parsed data: {data}")
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error: {e}")
-            return ChatResponse(
-                ai_response="I received a malformed request. Please try again.",
-                confidence=0.5,
-                should_escalate=False,
-                processing_time=1.0,
-                model_used="error_fallback"
-            )
+            data = json_codec.loads(body)
+            if not isinstance(data, dict):
+                raise json_codec.JSONDecodeError("Expected a JSON object", "", 0)
+            logger.debug("Parsed fields: %s", list(data))
+        except json_codec.JSONDecodeError as e:
+            logger.error("JSON decode error: %s", e)
+            return _chat_response("I received a malformed request. Please try again.", 0.5, 1.0, "error_fallback")
         
         # Extract required fields
         message = data.get('message', '')
@@ -53,74 +62,55 @@ async def chat_with_ai(request: Request):
         knowledge_articles = data.get('knowledge_articles', [])
         
         if not message:
-            return ChatResponse(
-                ai_response="Please provide a message.",
-                confidence=0.5,
-                should_escalate=False,
-                processing_time=0.1,
-                model_used="validation_error"
-            )
+            return _chat_response("Please provide a message.", 0.5, 0.1, "validation_error")
         
-        logger.info(f"Processing text chat message: {message[:100]}...")
+        logger.info("Processing text chat message: %.100s...", message)
         
         # Check if LLM service is available
         if not LLM_SERVICES_AVAILABLE:
             logger.warning("LLM service not available, using fallback")
-            return ChatResponse(
-                ai_response="Text chat is currently unavailable. Please use voice calls for assistance.",
-                confidence=0.8,
-                should_escalate=False,
-                processing_time=0.1,
-                model_used="fallback"
+            return _chat_response(
+                "Text chat is currently unavailable. Please use voice calls for assistance.", 0.8, 0.1, "fallback"
             )
         
         # Build company info
         company_info = {
+            "id": data.get('company_id'),
             "name": company_name or "our company",
             "business_hours": "9 AM - 6 PM EST"
         }
         
-        # Generate response with knowledge context
+        # Repeated (or reworded) questions are answered from the response cache without queueing for a model slot
         start_time = time.time()
-        result = await llm_service.generate_response_with_knowledge(
-            user_message=message,
-            knowledge_articles=knowledge_articles,
-            company_info=company_info
-        )
+        result = llm_service.cached_response(message, knowledge_articles, company_info)
+        if result is None:
+            # Generate response with knowledge context (text-chat lane of the fair scheduler)
+            async with fair_scheduler.slot(data.get('company_id') or company_name, LANE_TEXT_CHAT):
+                result = await llm_service.generate_response_with_knowledge(
+                    user_message=message,
+                    knowledge_articles=knowledge_articles,
+                    company_info=company_info,
+                    check_cache=False
+                )
         processing_time = time.time() - start_time
         
         if not result.get("success"):
             logger.warning("LLM service returned unsuccessful result")
-            return ChatResponse(
-                ai_response="I'm here to help! How can I assist you today?",
-                confidence=0.8,
-                should_escalate=False,
-                processing_time=processing_time,
-                model_used="fallback"
-            )
+            return _chat_response("I'm here to help! How can I assist you today?", 0.8, processing_time, "fallback")
         
-        logger.info(f"Text chat response generated successfully in {processing_time:.2f}s")
+        logger.info("Text chat response generated successfully in %.2fs", processing_time)
         
-        return ChatResponse(
-            ai_response=result["response"],
-            confidence=0.95,
-            should_escalate=False,
-            processing_time=processing_time,
-            model_used=result.get("model_used", "llm_service")
-        )
+        return _chat_response(result["response"], 0.95, processing_time, result.get("model_used", "llm_service"))
         
     except Exception as e:
-        logger.error(f"Text chat error: {str(e)}", exc_info=True)
-        return ChatResponse(
-            ai_response="I'm experiencing technical difficulties. Please try again or use voice calls.",
-            confidence=0.5,
-            should_escalate=False,
-            processing_time=1.0,
-            model_used="error_fallback"
+        logger.error("Text chat error: %s", e, exc_info=True)
+        return _chat_response(
+            "I'm experiencing technical difficulties. Please try again or use voice calls.", 0.5, 1.0, "error_fallback"
         )
 
 @router.post("/process-voice", response_model=VoiceCallResponse)
 async def process_voice_call(
+    request: Request,
     audio_file: UploadFile = File(...),
     company_name: str = Form("Demo Company"),
     voice: str = Form("ekta")
@@ -140,6 +130,15 @@ async def process_voice_call(
             detail="Voice processing services not available. Use Twilio-based voice calls instead."
         )
     
+    # A caller is waiting on the audio reply, so the turn is live voice work unless marked X-Work-Lane: batch
+    lane = lane_from_header(request.headers.get('x-work-lane'), LANE_LIVE_VOICE)
+    # STT -> LLM -> TTS is cancelled (provider calls included) if the client disconnects
+    return await run_until_disconnect(
+        request, _process_voice_pipeline(audio_file, company_name, voice, lane), "process_voice"
+    )
+
+async def _process_voice_pipeline(audio_file: UploadFile, company_name: str, voice: str,
+                                  lane: str = LANE_LIVE_VOICE) -> VoiceCallResponse:
     try:
         start_time = time.time()
         
@@ -155,11 +154,12 @@ async def process_voice_call(
         
         # Step 2: Generate AI response
         company_info = {"name": company_name}
-        llm_result = await llm_service.generate_response_with_knowledge(
-            user_message=stt_result["transcript"],
-            knowledge_articles=[],
-            company_info=company_info
-        )
+        async with fair_scheduler.slot(company_name, lane):
+            llm_result = await llm_service.generate_response_with_knowledge(
+                user_message=stt_result["transcript"],
+                knowledge_articles=[],
+                company_info=company_info
+            )
         
         if not llm_result["success"]:
             raise HTTPException(status_code=500, detail="AI response generation failed")
@@ -175,7 +175,7 @@ async def process_voice_call(
         
         total_time = round(time.time() - start_time, 2)
         
-        logger.info(f"Legacy voice processing completed in {total_time}s")
+        logger.info("Legacy voice processing completed in %ss", total_time)
         
         return VoiceCallResponse(
             transcript=stt_result["transcript"],
@@ -190,7 +190,7 @@ async def process_voice_call(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Legacy voice processing error: {str(e)}", exc_info=True)
+        logger.error("Legacy voice processing error: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/voices")
@@ -207,7 +207,7 @@ async def get_voices():
     try:
         return tts_service.get_available_voices()
     except Exception as e:
-        logger.error(f"Error getting voices: {str(e)}")
+        logger.error("Error getting voices: %s", e)
         return {
             "voices": {},
             "total_count": 0,
@@ -216,7 +216,7 @@ async def get_voices():
         }
 
 @router.post("/transcribe")
-async def transcribe_audio(audio_file: UploadFile = File(...)):
+async def transcribe_audio(request: Request, audio_file: UploadFile = File(...)):
     """Transcribe audio to text only (for future features)"""
     if not LLM_SERVICES_AVAILABLE:
         raise HTTPException(
@@ -224,6 +224,9 @@ async def transcribe_audio(audio_file: UploadFile = File(...)):
             detail="Transcription service not available"
         )
     
+    return await run_until_disconnect(request, _transcribe(audio_file), "transcribe")
+
+async def _transcribe(audio_file: UploadFile) -> Dict:
     try:
         audio_data = await audio_file.read()
         result = await stt_service.transcribe_audio(
@@ -242,11 +245,12 @@ async def transcribe_audio(audio_file: UploadFile = File(...)):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Transcription error: {str(e)}", exc_info=True)
+        logger.error("Transcription error: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/synthesize")
 async def synthesize_speech(
+    request: Request,
     text: str = Form(...),
     voice: str = Form("ekta")
 ):
@@ -257,6 +261,9 @@ async def synthesize_speech(
             detail="Speech synthesis service not available"
         )
     
+    return await run_until_disconnect(request, _synthesize(text, voice), "synthesize")
+
+async def _synthesize(text: str, voice: str) -> Dict:
     try:
         result = await tts_service.synthesize_speech(text=text, voice=voice)
         
@@ -271,7 +278,7 @@ async def synthesize_speech(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Synthesis error: {str(e)}", exc_info=True)
+        logger.error("Synthesis error: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/status")
@@ -1,7 +1,24 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from datetime import datetime
 import os
 import logging
+from services.kb_cache import kb_query_cache
+from services.kb_semantic import kb_semantic_retriever
+from middleware.compression import compression_stats
+from services.log_pipeline import log_stats
+from services.single_flight import single_flight_stats
+from services.provider_router import provider_router_stats
+from services.deadline import stage_costs
+from services.cancellation import cancellation_stats
+from middleware.admission import admission_controller, STATE_OVERLOADED
+from services.fair_scheduler import fair_scheduler
+from services.loop_monitor import loop_monitor
+from services.profiler import sampling_profiler
+from services.tracing import tracer
+from services.memory_monitor import memory_monitor
+from services.llm_service import llm_service
+from services.conversation_summary import conversation_summarizer
 
 router = APIRouter(tags=["Health"])
 logger = logging.getLogger(__name__)
@@ -80,7 +97,7 @@ async def health_check():
         "version": "2.0.0"
     }
     
-    logger.info(f"Health check performed - Uptime: {uptime_minutes} minutes")
+    logger.info("Health check performed - Uptime: %d minutes", uptime_minutes)
     
     return health_data
 
@@ -103,7 +120,7 @@ async def keepalive():
     uptime_seconds = (datetime.now() - app_start_time).total_seconds()
     uptime_minutes = int(uptime_seconds / 60)
     
-    logger.info(f"Keepalive ping received - Uptime: {uptime_minutes} minutes")
+    logger.info("Keepalive ping received - Uptime: %d minutes", uptime_minutes)
     
     return {
         "status": "alive",
@@ -118,34 +135,44 @@ async def readiness_check():
     Kubernetes-style readiness check
     
     Returns whether the application is ready to receive traffic.
-    Useful for load balancers and orchestration systems.
+    Useful for load balancers and orchestration systems: answers 503 while
+    the admission controller is shedding voice turns so traffic routes away.
     """
     try:
         # Check if AI engine is initialized
         from services.ai_engine import ai_engine
         
         is_ready = ai_engine is not None
+        admission = admission_controller.get_stats()
         
-        if is_ready:
-            return {
-                "status": "ready",
-                "message": "Application is ready to receive requests",
-                "timestamp": datetime.now().isoformat()
-            }
-        else:
-            return {
+        if not is_ready:
+            return JSONResponse({
                 "status": "not_ready",
                 "message": "AI engine not initialized",
+                "admission": admission,
+                "timestamp": datetime.now().isoformat()
+            }, status_code=503)
+        if admission["state"] == STATE_OVERLOADED:
+            return JSONResponse({
+                "status": "overloaded",
+                "message": "Shedding load - route traffic elsewhere",
+                "admission": admission,
                 "timestamp": datetime.now().isoformat()
-            }, 503
+            }, status_code=503)
+        return {
+            "status": "ready",
+            "message": "Application is ready to receive requests",
+            "admission": admission,
+            "timestamp": datetime.now().isoformat()
+        }
             
     except Exception as e:
-        logger.error(f"Readiness check failed: {e}")
-        return {
+        logger.error("Readiness check failed: %s", e)
+        return JSONResponse({
             "status": "not_ready",
             "error": str(e),
             "timestamp": datetime.now().isoformat()
-        }, 503
+        }, status_code=503)
 
 @router.get("/metrics")
 async def metrics():
@@ -161,5 +188,21 @@ async def metrics():
             "uptime_seconds": int(uptime_seconds),
             "status": "healthy",
             "timestamp": datetime.now().isoformat()
-        }
+        },
+        "kb_cache": kb_query_cache.get_stats(),
+        "kb_retrieval": kb_semantic_retriever.get_stats(),
+        "compression": compression_stats.get_stats(),
+        "logging": log_stats.get_stats(),
+        "single_flight": single_flight_stats(),
+        "providers": provider_router_stats(),
+        "deadlines": stage_costs.get_stats(),
+        "cancellation": cancellation_stats.get_stats(),
+        "admission": admission_controller.get_stats(),
+        "scheduler": fair_scheduler.get_stats(),
+        "event_loop": loop_monitor.get_stats(),
+        "profiler": sampling_profiler.get_stats(),
+        "tracing": tracer.get_stats(),
+        "memory": memory_monitor.get_stats(),
+        "llm": llm_service.get_stats(),
+        "conversation_summary": conversation_summarizer.get_stats()
     }
\ No newline at end of file
@@ -1,9 +1,24 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field, validator
-from typing import Optional, Dict, Any, List
+from fastapi import APIRouter, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
+from starlette.requests import ClientDisconnect
+from pydantic import BaseModel, Field, SkipValidation, ValidationError, validator
+from typing import Optional, Dict, Any, List, Awaitable, Callable
+import time
 import logging
 from datetime import datetime
-from services.ai_engine import ai_engine
+from services.ai_engine import ai_engine, KB_TOP_K
+from services import json_codec
+from services.kb_cache import kb_fingerprint
+from services.log_pipeline import call_sid_var
+from services.deadline import Deadline, deadline_from_request, parse_deadline_ms
+from services.cancellation import disconnected_response, run_until_disconnect
+from services.fair_scheduler import fair_scheduler, lane_from_header, LANE_LIVE_VOICE
+from services.profiler import TurnProfile, turn_profile_var, turn_stage
+from services.tracing import tracer
+from services.kb_semantic import kb_semantic_retriever
+from services.voice_body_parser import StreamingKBSelector, VoiceBodyParser
+from services.json_codec import FastJSONResponse
+from middleware.admission import admission_controller, voice_fallback, PRIORITY_VOICE
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -11,14 +26,20 @@ logger = logging.getLogger(__name__)
 # Track API usage statistics
 _total_requests = 0
 _total_errors = 0
+_websocket_sessions = 0
+_active_websocket_sessions = 0
 
 class VoiceRequest(BaseModel):
     """Voice request with validation"""
     user_message: str = Field(..., min_length=1, max_length=1000)
-    call_data: Optional[Dict[str, Any]] = None
+    # call_data and knowledge_base are passed through opaquely - the engine reads a few keys
+    # and deep-validating megabytes of KB chunks per turn is pure overhead
+    call_data: SkipValidation[Optional[Dict[str, Any]]] = None
     voice_settings: Optional[Dict[str, Any]] = None
     call_sid: Optional[str] = None
-    knowledge_base: Optional[List[Dict[str, Any]]] = []
+    knowledge_base: SkipValidation[Optional[List[Dict[str, Any]]]] = []
+    # Milliseconds the caller will wait (the X-Deadline-Ms header takes precedence)
+    deadline_ms: Optional[float] = None
     
     @validator('user_message')
     def validate_message(cls, v):
@@ -70,9 +91,63 @@ class VoiceResponse(BaseModel):
     goodbye_detected: Optional[bool] = False
     kb_used: Optional[bool] = False
     timestamp: Optional[str] = None
+    # Optional stages skipped or cut short to meet the deadline
+    degraded_stages: List[str] = []
+    # 'llm' (streamed chat completion) or 'template'
+    response_source: Optional[str] = None
 
-@router.post("/voice-response", response_model=VoiceResponse)
-async def generate_voice_response(request: VoiceRequest):
+def _json_invalid(e: json_codec.JSONDecodeError) -> RequestValidationError:
+    return RequestValidationError([{
+        'type': 'json_invalid', 'loc': ('body', getattr(e, 'pos', 0)),
+        'msg': 'JSON decode error', 'input': {}, 'ctx': {'error': str(e)}
+    }])
+
+def _validate_voice_request(data: Any) -> VoiceRequest:
+    """Validate a decoded voice request body (errors surface as the usual 422)"""
+    try:
+        voice_request = VoiceRequest.model_validate(data)
+    except ValidationError as e:
+        raise RequestValidationError([
+            {**error, 'loc': ('body', *error['loc'])} for error in e.errors(include_url=False, include_context=False)
+        ])
+    
+    if not isinstance(voice_request.call_data, dict):
+        voice_request.call_data = None
+    if not isinstance(voice_request.knowledge_base, list):
+        voice_request.knowledge_base = []
+    return voice_request
+
+async def _read_voice_request(request: Request, deadline: Deadline = None):
+    """
+    Stream-parse a voice request body
+    
+    knowledge_base items are scored as they arrive and only the top-k lexical
+    candidates are kept; the duplicate call_data.knowledgeBase is skipped.
+    A deadline known from the headers also governs this scoring.
+    
+    Returns:
+        Tuple[VoiceRequest, str, int]: request with candidate KB items, full KB version, full KB item count
+    """
+    # Semantic/hybrid retrieval embeds every chunk, so those modes keep the whole KB
+    selector = StreamingKBSelector(
+        ai_engine._score_kb_item, ai_engine._kb_query_terms, KB_TOP_K,
+        keep_all=kb_semantic_retriever.enabled, deadline=deadline
+    )
+    parser = VoiceBodyParser(selector)
+    try:
+        async for chunk in request.stream():
+            parser.feed(chunk)
+        data = parser.close()
+    except json_codec.JSONDecodeError as e:
+        raise _json_invalid(e)
+    return _validate_voice_request(data), selector.fingerprint.hexdigest(), selector.item_count
+
+@router.post(
+    "/voice-response",
+    response_model=VoiceResponse,
+    openapi_extra={"requestBody": {"required": True, "content": {"application/json": {"schema": VoiceRequest.model_json_schema()}}}}
+)
+async def generate_voice_response(request: Request):
     """
     Generate dynamic AI responses with advanced features:
     - Language detection (Hindi/English/Hinglish)
@@ -82,99 +157,334 @@ async def generate_voice_response(request: VoiceRequest):
     - Goodbye detection
     - Conversation memory
     - Abusive content filtering
+    
+    The turn is budgeted by the X-Deadline-Ms header or deadline_ms field
+    (VOICE_DEADLINE_MS by default); optional stages that no longer fit are
+    skipped and reported in degraded_stages. If the caller disconnects
+    (timeout, hang-up) the turn is cancelled.
+    """
+    started = time.monotonic()
+    # X-Profile-Turn: 1 returns this turn's stage timings in a Server-Timing header
+    profile = TurnProfile() if request.headers.get('x-profile-turn', '').lower() in ('1', 'true') else None
+    profile_token = turn_profile_var.set(profile)
+    # Root span of the turn; the engine stages become its children and the call_sid links the turns of a call
+    with tracer.span('voice_turn', transport='http'):
+        try:
+            header_deadline = request.headers.get('x-deadline-ms')
+            # The body field is only known once parsing is done; a header deadline also covers KB scoring during the parse
+            deadline = deadline_from_request(header_deadline, started=started) if parse_deadline_ms(header_deadline) else None
+            try:
+                with turn_stage('parse'):
+                    voice_request, kb_version, kb_item_count = await _read_voice_request(request, deadline)
+            except ClientDisconnect:
+                return disconnected_response("voice_response")
+            if deadline is None:
+                deadline = deadline_from_request(field_value=voice_request.deadline_ms, started=started)
+        
+            # Campaign pre-generation and analytics callers can mark their turns X-Work-Lane: batch
+            lane = lane_from_header(request.headers.get('x-work-lane'), LANE_LIVE_VOICE)
+            result = await run_until_disconnect(
+                request, _process_voice_request(voice_request, kb_version, kb_item_count, deadline, lane), "voice_response"
+            )
+            if isinstance(result, Response):
+                tracer.annotate(status_code=result.status_code)
+        finally:
+            turn_profile_var.reset(profile_token)
+    if isinstance(result, Response):
+        return result
+    response = FastJSONResponse(result)
+    if profile is not None:
+        response.headers['Server-Timing'] = profile.server_timing()
+        logger.info("Turn profile: %s", response.headers['Server-Timing'])
+    return response
+
+async def _process_voice_request(request: VoiceRequest, kb_version: str = None, kb_item_count: int = None,
+                                 deadline: Deadline = None, lane: str = LANE_LIVE_VOICE,
+                                 on_sentence: Callable[[str], Awaitable[None]] = None) -> Dict[str, Any]:
+    """
+    Run one voice turn through the AI engine and build the VoiceResponse payload
+    
+    kb_version / kb_item_count describe the full KB when request.knowledge_base
+    only holds the candidates kept by the streaming parser. Without an explicit
+    deadline the turn is budgeted from request.deadline_ms (or the default).
+    The engine runs in a fair-scheduler slot of the company's tenant and `lane`.
+    on_sentence receives LLM response sentences as they are generated.
     """
     global _total_requests, _total_errors
     _total_requests += 1
+    call_id = request.call_sid or f"CALL_{_total_requests}"
+    # Every log record of this turn (engine included) carries the call_sid
+    call_sid_token = call_sid_var.set(call_id)
+    if deadline is None:
+        deadline = deadline_from_request(field_value=request.deadline_ms)
+    tenant = (request.call_data or {}).get('companyId')
+    tracer.annotate(call_sid=request.call_sid, tenant=str(tenant) if tenant else 'default', lane=lane)
     
     try:
         # Log request
-        call_id = request.call_sid or f"CALL_{_total_requests}"
-        logger.info(f"[{call_id}] Processing voice request")
-        logger.debug(f"[{call_id}] Message: {request.user_message[:100]}...")
-        logger.debug(f"[{call_id}] KB items: {len(request.knowledge_base)}")
-        
-        # Generate dynamic response using AI engine
-        result = await ai_engine.generate_response(
-            user_message=request.user_message,
-            call_data=request.call_data or {},
-            voice_settings=request.voice_settings or {},
-            call_sid=request.call_sid,
-            knowledge_base=request.knowledge_base or []
-        )
+        logger.info("Processing voice request")
+        logger.debug("Message: %.100s...", request.user_message)
+        if kb_item_count is None:
+            kb_item_count = len(request.knowledge_base or [])
+        logger.debug("KB items: %d (%d candidates)", kb_item_count, len(request.knowledge_base or []))
+        
+        # Generate dynamic response using AI engine (queued fairly against other tenants' work)
+        async with fair_scheduler.slot(tenant, lane):
+            result = await ai_engine.generate_response(
+                user_message=request.user_message,
+                call_data=request.call_data or {},
+                voice_settings=request.voice_settings or {},
+                call_sid=request.call_sid,
+                knowledge_base=request.knowledge_base or [],
+                kb_version=kb_version,
+                deadline=deadline,
+                on_sentence=on_sentence,
+                kb_item_count=kb_item_count
+            )
         
         # Log successful response
-        logger.info(f"[{call_id}] Response generated successfully")
-        logger.debug(f"[{call_id}] Language: {result.get('detected_language')}")
-        logger.debug(f"[{call_id}] Intent: {result.get('intent')} (confidence: {result.get('intent_confidence')})")
-        logger.debug(f"[{call_id}] Stage: {result.get('conversation_stage')}")
+        logger.info("Response generated successfully")
+        logger.debug("Language: %s", result.get('detected_language'))
+        logger.debug("Intent: %s (confidence: %s)", result.get('intent'), result.get('intent_confidence'))
+        logger.debug("Stage: %s", result.get('conversation_stage'))
         
         # Check for goodbye
         if result.get('goodbye_detected'):
-            logger.info(f"[{call_id}] Goodbye detected - ending conversation")
+            logger.info("Goodbye detected - ending conversation")
         
         # Check for escalation
         if result.get('should_escalate'):
-            logger.warning(f"[{call_id}] Escalation requested")
+            logger.warning("Escalation requested")
         
         # Check for abusive content
         if result.get('abusive_detected'):
-            logger.warning(f"[{call_id}] Abusive content detected")
+            logger.warning("Abusive content detected")
+        
+        if deadline.degraded:
+            logger.info("Degraded to meet deadline: %s", ', '.join(deadline.degraded))
+        tracer.annotate(
+            intent=result.get('intent') or '',
+            conversation_stage=result.get('conversation_stage') or '',
+            language=result.get('detected_language') or '',
+            response_source=result.get('response_source') or 'template',
+            should_escalate=bool(result.get('should_escalate')),
+            degraded_stages=list(deadline.degraded)
+        )
         
         # Build response with enhanced metadata
-        return VoiceResponse(
-            ai_response=result['ai_response'],
-            detected_language=result['detected_language'],
-            language_confidence=result['language_confidence'],
-            sentiment=result['sentiment'],
-            personality=result['personality'],
-            context_used=result['context_used'],
-            conversation_stage=result.get('conversation_stage'),
-            should_escalate=result.get('should_escalate', False),
-            abusive_detected=result.get('abusive_detected', False),
+        return {
+            "ai_response": result['ai_response'],
+            "detected_language": result['detected_language'],
+            "language_confidence": result['language_confidence'],
+            "sentiment": result['sentiment'],
+            "personality": result['personality'],
+            "context_used": result['context_used'],
+            "conversation_stage": result.get('conversation_stage'),
+            "should_escalate": result.get('should_escalate', False),
+            "abusive_detected": result.get('abusive_detected', False),
             # ✅ NEW: Enhanced metadata
-            intent=result.get('intent'),
-            intent_confidence=result.get('intent_confidence'),
-            goodbye_detected=result.get('goodbye_detected', False),
-            kb_used=len(request.knowledge_base) > 0,
-            timestamp=datetime.now().isoformat()
-        )
+            "intent": result.get('intent'),
+            "intent_confidence": result.get('intent_confidence'),
+            "goodbye_detected": result.get('goodbye_detected', False),
+            "kb_used": kb_item_count > 0,
+            "timestamp": datetime.now().isoformat(),
+            "degraded_stages": result.get('degraded_stages', []),
+            "response_source": result.get('response_source', 'template')
+        }
         
     except ValueError as e:
         # Validation errors
         _total_errors += 1
-        logger.error(f"[{request.call_sid or 'UNKNOWN'}] Validation error: {str(e)}")
+        logger.error("Validation error: %s", e)
         raise HTTPException(status_code=400, detail=f"Invalid request: {str(e)}")
         
     except Exception as e:
         # Unexpected errors - return graceful fallback
         _total_errors += 1
-        call_id = request.call_sid or f"CALL_{_total_requests}"
         
-        logger.error(f"[{call_id}] Voice response generation failed: {str(e)}")
-        logger.error(f"[{call_id}] Error type: {type(e).__name__}")
-        logger.warning(f"[{call_id}] Returning fallback response")
+        logger.error("Voice response generation failed: %s", e)
+        logger.error("Error type: %s", type(e).__name__)
+        logger.warning("Returning fallback response")
         
         # Return graceful fallback instead of HTTP error
         personality = "priyanshu"
         if request.voice_settings and 'personality' in request.voice_settings:
             personality = request.voice_settings['personality']
         
-        return VoiceResponse(
-            ai_response="I'm experiencing technical difficulties. Let me connect you with our team for assistance.",
-            detected_language="english",
-            language_confidence=0.5,
-            sentiment={"label": "neutral", "score": 0.5},
-            personality=personality,
-            context_used=False,
-            conversation_stage="error",
-            should_escalate=True,
-            abusive_detected=False,
-            intent="error",
-            intent_confidence=0.0,
-            goodbye_detected=False,
-            kb_used=False,
-            timestamp=datetime.now().isoformat()
+        return {
+            "ai_response": "I'm experiencing technical difficulties. Let me connect you with our team for assistance.",
+            "detected_language": "english",
+            "language_confidence": 0.5,
+            "sentiment": {"label": "neutral", "score": 0.5},
+            "personality": personality,
+            "context_used": False,
+            "conversation_stage": "error",
+            "should_escalate": True,
+            "abusive_detected": False,
+            "intent": "error",
+            "intent_confidence": 0.0,
+            "goodbye_detected": False,
+            "kb_used": False,
+            "timestamp": datetime.now().isoformat(),
+            "degraded_stages": list(deadline.degraded),
+            "response_source": "template"
+        }
+    
+    finally:
+        deadline.finish()
+        call_sid_var.reset(call_sid_token)
+
+class _TurnChannelSession:
+    """Per-connection call context - sent once at call start, reused for every utterance"""
+    
+    def __init__(self, start: Dict[str, Any]):
+        self.call_sid = start.get('call_sid') or None
+        self.call_data: Dict[str, Any] = {}
+        self.voice_settings: Dict[str, Any] = {}
+        self.knowledge_base: List[Dict[str, Any]] = []
+        self.kb_version: Optional[str] = None
+        self.stage: Optional[str] = None
+        self.escalated = False
+        self.update(start)
+    
+    def update(self, message: Dict[str, Any]):
+        if isinstance(message.get('call_data'), dict):
+            self.call_data = message['call_data']
+            # The channel carries the KB once as knowledge_base; never keep a second copy
+            self.call_data.pop('knowledgeBase', None)
+        if isinstance(message.get('voice_settings'), dict):
+            self.voice_settings = message['voice_settings']
+        if 'knowledge_base' in message:
+            knowledge_base = message['knowledge_base']
+            self.knowledge_base = knowledge_base if isinstance(knowledge_base, list) else []
+            self.kb_version = kb_fingerprint(self.knowledge_base)
+    
+    def ready_message(self) -> Dict[str, Any]:
+        return {
+            "type": "ready",
+            "call_sid": self.call_sid,
+            "kb_items": len(self.knowledge_base),
+            "kb_version": self.kb_version
+        }
+
+async def _send_json(websocket: WebSocket, payload: Dict[str, Any]):
+    await websocket.send_text(json_codec.dumps(payload).decode('utf-8'))
+
+@router.websocket("/ws")
+async def voice_turn_channel(websocket: WebSocket):
+    """
+    Persistent per-call turn channel for the telephony backend
+    
+    Protocol (JSON messages):
+    - client {"type": "start", "call_sid", "call_data", "voice_settings", "knowledge_base"}
+      -> {"type": "ready", "call_sid", "kb_items", "kb_version"}
+    - client {"type": "utterance", "user_message", "turn_id"?, "deadline_ms"?}
+      -> {"type": "sentence", "turn_id", "index", "text"} per sentence as an LLM response streams
+         (TTS can start on the first one)
+      -> {"type": "response", "turn_id", ...VoiceResponse fields}
+      -> {"type": "stage", "stage", "previous_stage"} when the stage changes
+      -> {"type": "escalation", "stage"} once the call should go to a human
+      -> {"type": "goodbye"} when the caller said goodbye
+    - client {"type": "update", ...any start field} replaces call context mid-call
+    - client {"type": "end"} closes the channel and drops the call state
+    
+    Errors are reported as {"type": "error", "detail", "turn_id"?} without closing the channel.
+    """
+    global _websocket_sessions, _active_websocket_sessions
+    await websocket.accept()
+    _websocket_sessions += 1
+    _active_websocket_sessions += 1
+    session: Optional[_TurnChannelSession] = None
+    
+    try:
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            try:
+                data = json_codec.loads(message.get('text') or message.get('bytes') or b'')
+            except json_codec.JSONDecodeError as e:
+                await _send_json(websocket, {"type": "error", "detail": f"Invalid JSON: {e}"})
+                continue
+            if not isinstance(data, dict):
+                await _send_json(websocket, {"type": "error", "detail": "Messages must be JSON objects"})
+                continue
+            
+            message_type = data.get('type')
+            if message_type == 'start':
+                if session is not None and session.call_sid and session.call_sid != data.get('call_sid'):
+                    ai_engine.end_call(session.call_sid)
+                session = _TurnChannelSession(data)
+                logger.info("Turn channel started (%d KB items)", len(session.knowledge_base), extra={'call_sid': session.call_sid})
+                await _send_json(websocket, session.ready_message())
+            elif session is None:
+                await _send_json(websocket, {"type": "error", "detail": "Send a 'start' message first"})
+            elif message_type == 'utterance':
+                await _handle_utterance(websocket, session, data)
+            elif message_type == 'update':
+                session.update(data)
+                await _send_json(websocket, session.ready_message())
+            elif message_type == 'end':
+                await websocket.close(code=1000)
+                break
+            else:
+                await _send_json(websocket, {"type": "error", "detail": f"Unknown message type: {message_type}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _active_websocket_sessions -= 1
+        if session is not None:
+            logger.info("Turn channel closed", extra={'call_sid': session.call_sid})
+            ai_engine.end_call(session.call_sid)
+
+async def _handle_utterance(websocket: WebSocket, session: _TurnChannelSession, data: Dict[str, Any]):
+    """Run one utterance through the engine and push the response plus any state-change events"""
+    turn_id = data.get('turn_id')
+    try:
+        voice_request = VoiceRequest(
+            user_message=data.get('user_message'),
+            call_data=session.call_data,
+            voice_settings=session.voice_settings,
+            call_sid=session.call_sid,
+            knowledge_base=session.knowledge_base,
+            deadline_ms=data.get('deadline_ms')
         )
+    except ValidationError as e:
+        errors = e.errors(include_url=False, include_context=False)
+        await _send_json(websocket, {"type": "error", "turn_id": turn_id, "detail": errors[0]['msg'] if errors else str(e)})
+        return
+    
+    # The handshake was admitted once; every turn is checked again as load changes mid-call
+    if not admission_controller.admit(PRIORITY_VOICE):
+        await _send_json(websocket, {"type": "response", "turn_id": turn_id, **voice_fallback()})
+        return
+    
+    sentence_count = 0
+    
+    async def send_sentence(text: str):
+        nonlocal sentence_count
+        await _send_json(websocket, {"type": "sentence", "turn_id": turn_id, "index": sentence_count, "text": text})
+        sentence_count += 1
+    
+    try:
+        with admission_controller.in_flight_slot(PRIORITY_VOICE), tracer.span('voice_turn', transport='websocket'):
+            result = await _process_voice_request(
+                voice_request, session.kb_version, len(session.knowledge_base), on_sentence=send_sentence
+            )
+    except HTTPException as e:
+        await _send_json(websocket, {"type": "error", "turn_id": turn_id, "detail": e.detail})
+        return
+    await _send_json(websocket, {"type": "response", "turn_id": turn_id, **result})
+    
+    stage = result.get('conversation_stage')
+    if stage != session.stage:
+        await _send_json(websocket, {"type": "stage", "turn_id": turn_id, "stage": stage, "previous_stage": session.stage})
+        session.stage = stage
+    if result.get('should_escalate') and not session.escalated:
+        session.escalated = True
+        await _send_json(websocket, {"type": "escalation", "turn_id": turn_id, "stage": stage})
+    if result.get('goodbye_detected'):
+        await _send_json(websocket, {"type": "goodbye", "turn_id": turn_id})
 
 @router.get("/stats")
 async def get_api_stats():
@@ -193,6 +503,8 @@ async def get_api_stats():
         "failed_requests": _total_errors,
         "success_rate_percent": round(success_rate, 2),
         "error_rate_percent": round(error_rate, 2),
+        "websocket_sessions": _websocket_sessions,
+        "active_websocket_sessions": _active_websocket_sessions,
         "timestamp": datetime.now().isoformat()
     }
 
@@ -213,17 +525,17 @@ async def test_voice_engine():
             knowledge_base=[]
         )
         
-        result = await generate_voice_response(test_request)
+        result = await _process_voice_request(test_request)
         
         return {
             "status": "success",
             "test_passed": True,
-            "response": result.dict(),
+            "response": result,
             "message": "AI engine is working correctly"
         }
         
     except Exception as e:
-        logger.error(f"Test failed: {str(e)}")
+        logger.error("Test failed: %s", e)
         return {
             "status": "error",
             "test_passed": False,
@@ -14,12 +14,25 @@ Intelligent response generation (not template-based)
 import os
 import logging
 import warnings
-from typing import Dict, List, Tuple, Optional
+from typing import Awaitable, Callable, Dict, List, Tuple, Optional
 from langdetect import detect, DetectorFactory
 from textblob import TextBlob
-import openai
 import json
 import re
+import heapq
+import time
+import asyncio
+from services.call_session import CallSessionStore
+from services.conversation_summary import conversation_summarizer, CONTEXT_BUDGET_TOKENS
+from services.kb_cache import kb_query_cache, kb_fingerprint, normalize_question
+from services.kb_semantic import kb_semantic_retriever
+from services.single_flight import SingleFlight
+from services.deadline import (
+    Deadline, stage_costs, STAGE_SENTIMENT, STAGE_KB_PARTIAL_MATCH, STAGE_KB_SCAN, STAGE_EXTRACT_PARTIAL_MATCH
+)
+from services.profiler import turn_stage
+from services.llm_service import llm_service
+from services.memory_monitor import memory_monitor, PRIORITY_CONVERSATION
 
 # Suppress warnings
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="textblob")
@@ -27,6 +40,17 @@ DetectorFactory.seed = 0
 
 logger = logging.getLogger(__name__)
 
+KB_TOP_K = int(os.getenv('KB_TOP_K', 3))
+# KBs at least this large are scored in a worker thread instead of on the event loop
+KB_OFFLOAD_MIN_ITEMS = int(os.getenv('KB_OFFLOAD_MIN_ITEMS', 200))
+# The lexical KB scan checks the deadline every this many items
+KB_SCAN_DEADLINE_STRIDE = 32
+
+KB_STOP_WORDS = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+                 'of', 'with', 'is', 'are', 'was', 'were', 'be', 'been', 'being',
+                 'what', 'how', 'when', 'where', 'why', 'who', 'which', 'this', 'that',
+                 'me', 'tell', 'about', 'your', 'you', 'i', 'my', 'can', 'could', 'would'}
+
 class ConversationStateManager:
     """Manages conversation stages and flow"""
     
@@ -39,62 +63,96 @@ class ConversationStateManager:
         'closing': {'next': 'escalation', 'max_turns': 2},
         'escalation': {'next': None, 'max_turns': 1}
     }
+    # Sessions store the stage as an index into this tuple
+    STAGE_NAMES = tuple(STAGES)
+    _STAGE_INDEX = {name: index for index, name in enumerate(STAGE_NAMES)}
     
-    def __init__(self):
-        self.call_stages = {}
+    def __init__(self, sessions: CallSessionStore = None):
+        self.sessions = sessions if sessions is not None else CallSessionStore()
     
     def get_current_stage(self, call_sid: str) -> str:
-        if call_sid not in self.call_stages:
-            self.call_stages[call_sid] = {'stage': 'greeting', 'turn_count': 0}
-        return self.call_stages[call_sid]['stage']
+        return self.STAGE_NAMES[self.sessions.get(call_sid).stage]
     
     def advance_stage(self, call_sid: str, force_stage: str = None):
-        if call_sid not in self.call_stages:
-            self.call_stages[call_sid] = {'stage': 'greeting', 'turn_count': 0}
-        
-        current = self.call_stages[call_sid]
-        current['turn_count'] += 1
-        
-        stage_config = self.STAGES[current['stage']]
+        current = self.sessions.get(call_sid)
+        current.turn_count += 1
         
         if force_stage and force_stage in self.STAGES:
-            current['stage'] = force_stage
-            current['turn_count'] = 0
-        elif current['turn_count'] >= stage_config['max_turns']:
-            next_stage = stage_config['next']
-            if next_stage:
-                current['stage'] = next_stage
-                current['turn_count'] = 0
+            current.stage = self._STAGE_INDEX[force_stage]
+            current.turn_count = 0
+        else:
+            stage_config = self.STAGES[self.STAGE_NAMES[current.stage]]
+            if current.turn_count >= stage_config['max_turns'] and stage_config['next']:
+                current.stage = self._STAGE_INDEX[stage_config['next']]
+                current.turn_count = 0
     
     def should_escalate(self, call_sid: str) -> bool:
         stage = self.get_current_stage(call_sid)
         return stage == 'escalation'
+    
+    def clear_call(self, call_sid: str):
+        session = self.sessions.peek(call_sid)
+        if session is not None:
+            session.stage = 0
+            session.turn_count = 0
 
 class ConversationMemory:
-    """Conversation context management"""
-    def __init__(self):
-        self.conversations = {}
+    """Conversation context management (last CONVERSATION_MEMORY_EXCHANGES exchanges per call plus a rolling summary)"""
+    def __init__(self, sessions: CallSessionStore = None):
+        self.sessions = sessions if sessions is not None else CallSessionStore()
     
     def add_message(self, call_sid: str, user_message: str, ai_response: str, language: str):
-        if call_sid not in self.conversations:
-            self.conversations[call_sid] = []
-        
-        self.conversations[call_sid].append({
-            'user': user_message,
-            'ai': ai_response,
-            'language': language
-        })
-        
-        # Keep only last 5 exchanges
-        if len(self.conversations[call_sid]) > 5:
-            self.conversations[call_sid] = self.conversations[call_sid][-5:]
+        session = self.sessions.get(call_sid)
+        evicted = session.add_exchange(user_message, ai_response, language)
+        if evicted is not None:
+            # Older context is kept as a summary, folded in batches after the turn
+            conversation_summarizer.schedule(session, evicted)
+    
+    def has_context(self, call_sid: str) -> bool:
+        session = self.sessions.peek(call_sid)
+        return session is not None and session.exchange_count > 0
     
     def get_context(self, call_sid: str) -> List[Dict]:
-        return self.conversations.get(call_sid, [])
+        session = self.sessions.peek(call_sid)
+        if session is None:
+            return []
+        return [{'user': user, 'ai': ai, 'language': language} for user, ai, language in session.exchanges()]
+    
+    def get_prompt_context(self, call_sid: str, budget_tokens: int = CONTEXT_BUDGET_TOKENS) -> Tuple[Optional[str], List[Dict]]:
+        """
+        Conversation context for an LLM prompt within a token budget
+        
+        Args:
+            call_sid (str): Call identifier
+            budget_tokens (int): Tokens for summary plus exchanges
+            
+        Returns:
+            Tuple[Optional[str], List[Dict]]: summary of earlier exchanges (None if nothing was folded yet)
+            and the most recent exchanges (including evicted ones not folded yet) that fit the rest
+            of the budget, oldest first
+        """
+        session = self.sessions.peek(call_sid)
+        if session is None:
+            return None, []
+        call_summary = session.summary
+        summary = call_summary.text() if call_summary is not None and call_summary.notes else None
+        budget = budget_tokens - (call_summary.tokens if summary else 0)
+        exchanges = list(session.exchanges())
+        if call_summary is not None and call_summary.pending:
+            exchanges[:0] = call_summary.pending_exchanges()
+        recent = []
+        for user, ai, language in reversed(exchanges):
+            budget -= (len(user) + len(ai)) // 4 + 8
+            if budget < 0:
+                break
+            recent.append({'user': user, 'ai': ai, 'language': language})
+        recent.reverse()
+        return summary, recent
     
     def clear_conversation(self, call_sid: str):
-        if call_sid in self.conversations:
-            del self.conversations[call_sid]
+        session = self.sessions.peek(call_sid)
+        if session is not None:
+            session.clear_exchanges()
 
 class AdvancedLanguageDetector:
     """Enhanced language detection with Hinglish support"""
@@ -130,13 +188,13 @@ class AdvancedLanguageDetector:
             # Check for Hinglish (mix of both)
             if hindi_count > 0 and english_count > 0:
                 confidence = min((hindi_count + english_count) / len(words), 0.95)
-                logger.info(f"Detected HINGLISH (Hindi: {hindi_count}, English: {english_count})")
+                logger.info("Detected HINGLISH (Hindi: %d, English: %d)", hindi_count, english_count, extra={'stage': 'language'})
                 return 'hinglish', confidence
             
             # Mostly Hindi
             elif hindi_count > english_count and hindi_count >= 2:
                 confidence = min(hindi_count / len(words), 0.95)
-                logger.info(f"Detected HINDI ({hindi_count} indicators)")
+                logger.info("Detected HINDI (%d indicators)", hindi_count, extra={'stage': 'language'})
                 return 'hindi', confidence
             
             # Try langdetect for confirmation
@@ -153,7 +211,7 @@ class AdvancedLanguageDetector:
                 return 'english', 0.7
                 
         except Exception as e:
-            logger.warning(f"Language detection failed: {e}")
+            logger.warning("Language detection failed: %s", e)
             return 'english', 0.5
 
 class LightweightSentimentAnalyzer:
@@ -223,7 +281,7 @@ class LightweightSentimentAnalyzer:
             else:
                 return {'label': 'neutral', 'score': 0.5}
         except Exception as e:
-            logger.error(f"Sentiment analysis failed: {e}")
+            logger.error("Sentiment analysis failed: %s", e)
             return {'label': 'neutral', 'score': 0.5}
     
     def detect_abusive_content(self, text: str) -> Dict[str, bool]:
@@ -253,8 +311,8 @@ class LightweightSentimentAnalyzer:
         is_abusive = english_abuse or hindi_abuse or pattern_abuse
         
         if is_abusive:
-            logger.warning(f"⚠️ ABUSIVE CONTENT DETECTED: {text[:50]}...")
-            logger.warning(f"English: {english_abuse}, Hindi: {hindi_abuse}, Pattern: {pattern_abuse}")
+            logger.warning("⚠️ ABUSIVE CONTENT DETECTED: %.50s...", text)
+            logger.warning("English: %s, Hindi: %s, Pattern: %s", english_abuse, hindi_abuse, pattern_abuse)
         
         return {
             'is_abusive': is_abusive,
@@ -379,11 +437,18 @@ class DynamicIntentClassifier:
         }
         
         self.recent_intents = []  # Track last 2 intents for context
+        self._batch_classifier = None
     
-    def classify_intent(self, user_message: str) -> Tuple[str, float, Dict]:
-        """Classify user intent with confidence scoring"""
+    def classify_intent(self, user_message: str, recent_intents: List[str] = None) -> Tuple[str, float, Dict]:
+        """Classify user intent with confidence scoring
+        
+        recent_intents: the call's continuity state (updated in place); this
+        instance's own recent_intents when not given
+        """
         if not user_message:
             return 'question', 0.5, {}
+        if recent_intents is None:
+            recent_intents = self.recent_intents
         
         message_lower = user_message.lower()
         message_words = set(message_lower.split())
@@ -392,22 +457,22 @@ class DynamicIntentClassifier:
         
         # Score each intent
         for intent_name, pattern in self.intent_patterns.items():
-            score = 0
             matched_keywords = []
             matched_phrases = []
             
             # Keyword matching
             for keyword in pattern['keywords']:
                 if keyword in message_lower:
-                    score += pattern['weight']
                     matched_keywords.append(keyword)
             
             # Phrase matching (higher weight)
             for phrase in pattern.get('phrases', []):
                 if phrase in message_lower:
-                    score += pattern['weight'] * 1.5
                     matched_phrases.append(phrase)
             
+            # Computed as weight * hit units so the vectorized batch path matches bit for bit
+            score = pattern['weight'] * (len(matched_keywords) + 1.5 * len(matched_phrases))
+            
             # Check negative context (reduces score if present)
             if 'negative_context' in pattern:
                 for neg_word in pattern['negative_context']:
@@ -415,7 +480,7 @@ class DynamicIntentClassifier:
                         score *= 0.3  # Reduce score significantly if negative context present
             
             # Context continuity bonus (if same intent appeared recently)
-            if self.recent_intents and intent_name == self.recent_intents[-1]:
+            if recent_intents and intent_name == recent_intents[-1]:
                 score += pattern['weight'] * 0.5
             
             # Normalize score to confidence (0-1)
@@ -436,17 +501,29 @@ class DynamicIntentClassifier:
         threshold = self.intent_patterns[intent_name]['confidence_threshold']
         if intent_data['confidence'] >= threshold:
             # Update recent intents
-            self.recent_intents.append(intent_name)
-            if len(self.recent_intents) > 2:
-                self.recent_intents.pop(0)
+            recent_intents.append(intent_name)
+            if len(recent_intents) > 2:
+                recent_intents.pop(0)
             
-            logger.info(f" Intent classified: {intent_name} (confidence: {intent_data['confidence']:.2f})")
+            logger.info(" Intent classified: %s (confidence: %.2f)", intent_name, intent_data['confidence'], extra={'stage': 'intent'})
             return intent_name, intent_data['confidence'], all_scores
         else:
             # Default to 'question' if no strong intent detected
-            logger.info(f"No strong intent detected, defaulting to 'question'")
+            logger.info("No strong intent detected, defaulting to 'question'", extra={'stage': 'intent'})
             return 'question', 0.5, all_scores
 
+    def classify_batch(self, messages: List[str], recent_intents: List[str] = None) -> List[Tuple[str, float]]:
+        """
+        Classify a sequence of utterances with the vectorized NumPy backend
+        
+        Gives the same (intent, confidence) as calling classify_intent on each
+        message in order, without touching this instance's recent_intents.
+        """
+        if self._batch_classifier is None:
+            from services.intent_batch import VectorizedIntentClassifier
+            self._batch_classifier = VectorizedIntentClassifier(self.intent_patterns)
+        return self._batch_classifier.classify_batch(messages, recent_intents)
+
 class SmartKBExtractor:
     """IMPROVED: Dynamic extraction that adapts to question complexity"""
     
@@ -525,7 +602,7 @@ class SmartKBExtractor:
         }
     
     @staticmethod
-    def extract_relevant_answer(question: str, kb_content: str, max_sentences: int = None) -> str:
+    def extract_relevant_answer(question: str, kb_content: str, max_sentences: int = None, deadline: Deadline = None) -> str:
         """
         DYNAMIC: Automatically determines optimal sentence count based on question
         
@@ -533,6 +610,7 @@ class SmartKBExtractor:
             question: User's question
             kb_content: Knowledge base content to search
             max_sentences: Optional override (if None, auto-detected)
+            deadline: Request deadline - the partial-match pass is skipped when it no longer fits
         
         Returns:
             Relevant answer with appropriate length
@@ -551,9 +629,9 @@ class SmartKBExtractor:
             # If manually overridden, use standard limits
             max_chars = min(max_sentences * 80, 200)
         
-        logger.info(f"Question complexity: {complexity_info['complexity']} "
-                   f"(max_sentences={max_sentences}, max_chars={max_chars})")
-        logger.debug(f"   Reason: {complexity_info['reason']}")
+        logger.info("Question complexity: %s (max_sentences=%s, max_chars=%s)",
+                    complexity_info['complexity'], max_sentences, max_chars, extra={'stage': 'kb_extract'})
+        logger.debug("   Reason: %s", complexity_info['reason'], extra={'stage': 'kb_extract'})
         
         # Split into proper sentences
         sentences = re.split(r'(?<=[.!?])\s+', kb_content)
@@ -580,6 +658,10 @@ class SmartKBExtractor:
             return first_sentence
         
         # Score each sentence by relevance
+        partial_keywords = [keyword for keyword in keywords if len(keyword) > 4]
+        if partial_keywords and deadline is not None and not deadline.allows(STAGE_EXTRACT_PARTIAL_MATCH, len(sentences)):
+            partial_keywords = []
+        scoring_started = time.perf_counter()
         scored_sentences = []
         for idx, sentence in enumerate(sentences):
             sentence_lower = sentence.lower()
@@ -591,18 +673,19 @@ class SmartKBExtractor:
                     score += 2
             
             # Partial matches
-            for keyword in keywords:
-                if len(keyword) > 4:
-                    sentence_words = sentence_lower.split()
-                    for word in sentence_words:
-                        if keyword in word or word in keyword:
-                            score += 1
+            for keyword in partial_keywords:
+                sentence_words = sentence_lower.split()
+                for word in sentence_words:
+                    if keyword in word or word in keyword:
+                        score += 1
             
             # Position bonus (earlier sentences often have key info)
             position_bonus = max(0, 3 - idx)
             score += position_bonus
             
             scored_sentences.append((score, sentence, idx))
+        if partial_keywords:
+            stage_costs.observe(STAGE_EXTRACT_PARTIAL_MATCH, (time.perf_counter() - scoring_started) / len(sentences))
         
         # Sort by relevance score
         scored_sentences.sort(reverse=True, key=lambda x: x[0])
@@ -641,26 +724,45 @@ class SmartKBExtractor:
         if len(result) > max_chars:
             result = result[:max_chars - 3].strip() + "..."
         
-        logger.info(f"Extracted {len(top_sentences)} sentence(s), {len(result)} chars")
+        logger.info("Extracted %d sentence(s), %d chars", len(top_sentences), len(result), extra={'stage': 'kb_extract'})
         
         return result
 
+    @staticmethod
+    def extract_relevant_answer_from_chunks(question: str, chunks: List[Dict], max_sentences: int = None, deadline: Deadline = None) -> str:
+        """
+        Extract an answer that may span several retrieved chunks
+        
+        Args:
+            question: User's question
+            chunks: Retrieved chunks (dicts with 'content'), best first
+            max_sentences: Optional override (if None, auto-detected)
+            deadline: Request deadline (see extract_relevant_answer)
+        
+        Returns:
+            Relevant answer drawn from sentences across all chunks
+        """
+        kb_content = ' '.join(chunk.get('content', '') for chunk in chunks if chunk.get('content'))
+        return SmartKBExtractor.extract_relevant_answer(question, kb_content, max_sentences, deadline)
+
 class LightweightAIEngine:
     """Main AI engine with all features"""
     
     def __init__(self):
-        self.state_manager = ConversationStateManager()
-        self.memory = ConversationMemory()
+        # One compact session per call, shared by the stage manager and conversation memory
+        self.sessions = CallSessionStore()
+        self.state_manager = ConversationStateManager(self.sessions)
+        self.memory = ConversationMemory(self.sessions)
         self.language_detector = AdvancedLanguageDetector()
         self.sentiment_analyzer = LightweightSentimentAnalyzer()
         self.intent_classifier = DynamicIntentClassifier()
+        # Concurrent identical KB lookups (same KB version + question) share one retrieval
+        self.kb_single_flight = SingleFlight("kb_answer")
         
-        # Check OpenAI API key
-        self.openai_api_key = os.getenv('OPENAI_API_KEY')
-        if self.openai_api_key and self.openai_api_key != 'your_openai_api_key_here':
-            openai.api_key = self.openai_api_key
-            self.use_openai = True
-            logger.info(" OpenAI API configured")
+        # Check OpenAI API key (streaming chat completions through llm_service)
+        self.use_openai = llm_service.openai_configured
+        if self.use_openai:
+            logger.info(" OpenAI API configured (model %s)", llm_service.openai_model)
         else:
             self.use_openai = False
             logger.info(" Using template-based responses (OpenAI not configured)")
@@ -671,14 +773,29 @@ class LightweightAIEngine:
         call_data: Dict = None,
         voice_settings: Dict = None,
         call_sid: str = None,
-        knowledge_base: List = None
+        knowledge_base: List = None,
+        kb_version: str = None,
+        deadline: Deadline = None,
+        on_sentence: Callable[[str], Awaitable[None]] = None,
+        kb_item_count: int = None
     ) -> Dict:
-        """ FIXED: Generate AI response with comprehensive error handling"""
+        """ FIXED: Generate AI response with comprehensive error handling
+        
+        kb_version: fingerprint of the full KB when knowledge_base holds only
+        pre-selected candidates (streaming body parser)
+        kb_item_count: size of the full KB (knowledge_base is complete when it
+        matches or is not given)
+        deadline: when the caller gives up - optional stages (sentiment, KB
+        partial-match scoring, the extraction partial-match pass) are skipped
+        or cut short as it nears and listed in 'degraded_stages'
+        on_sentence: with an LLM configured, awaited with each response
+        sentence as it is generated, before the turn completes
+        """
         try:
-            logger.info(f"=== Processing Request ===")
-            logger.info(f"Message: {user_message[:100]}...")
-            logger.info(f"Call SID: {call_sid}")
-            logger.info(f"KB items: {len(knowledge_base) if knowledge_base else 0}")
+            logger.info("=== Processing Request ===", extra={'stage': 'request'})
+            logger.info("Message: %.100s...", user_message, extra={'stage': 'request'})
+            logger.info("Call SID: %s", call_sid, extra={'stage': 'request'})
+            logger.info("KB items: %d", len(knowledge_base) if knowledge_base else 0, extra={'stage': 'request'})
             
             #  SAFETY: Validate inputs
             if not user_message or len(user_message.strip()) == 0:
@@ -698,31 +815,42 @@ class LightweightAIEngine:
             
             # Step 2: Detect language
             # FIXED: Respect user's language selection if not 'auto'
-            user_selected_language = voice_settings.get('language', 'auto')
+            with turn_stage('language'):
+                user_selected_language = voice_settings.get('language', 'auto')
             
-            if user_selected_language == 'hi-IN':
-                # User selected Hindi only
-                language = 'hindi'
-                lang_confidence = 1.0
-                logger.info(f"Language: {language} (user selected Hindi)")
-            elif user_selected_language == 'en-IN':
-                # User selected English only
-                language = 'english'
-                lang_confidence = 1.0
-                logger.info(f"Language: {language} (user selected English)")
-            else:
-                # Auto-detect (default behavior)
-                language, lang_confidence = self.language_detector.detect_language(user_message)
-                logger.info(f"Language: {language} (auto-detected, confidence: {lang_confidence:.2f})")
+                if user_selected_language == 'hi-IN':
+                    # User selected Hindi only
+                    language = 'hindi'
+                    lang_confidence = 1.0
+                    logger.info("Language: %s (user selected Hindi)", language, extra={'stage': 'language'})
+                elif user_selected_language == 'en-IN':
+                    # User selected English only
+                    language = 'english'
+                    lang_confidence = 1.0
+                    logger.info("Language: %s (user selected English)", language, extra={'stage': 'language'})
+                else:
+                    # Auto-detect (default behavior)
+                    language, lang_confidence = self.language_detector.detect_language(user_message)
+                    logger.info("Language: %s (auto-detected, confidence: %.2f)", language, lang_confidence, extra={'stage': 'language'})
+            
+            # Cancellation point: a disconnected caller's turn stops here
+            await asyncio.sleep(0)
             
-            # Step 3: Analyze sentiment
-            sentiment = self.sentiment_analyzer.analyze_sentiment(user_message)
-            logger.info(f"Sentiment: {sentiment['label']} ({sentiment['score']:.2f})")
+            # Step 3: Analyze sentiment (optional - neutral when the deadline is close)
+            with turn_stage('sentiment'):
+                if deadline is None or deadline.allows(STAGE_SENTIMENT):
+                    sentiment_started = time.perf_counter()
+                    sentiment = self.sentiment_analyzer.analyze_sentiment(user_message)
+                    stage_costs.observe(STAGE_SENTIMENT, time.perf_counter() - sentiment_started)
+                    logger.info("Sentiment: %s (%.2f)", sentiment['label'], sentiment['score'], extra={'stage': 'sentiment'})
+                else:
+                    sentiment = {'label': 'neutral', 'score': 0.5}
             
             # Step 4: CRITICAL - Check for abusive content FIRST
-            abuse_check = self.sentiment_analyzer.detect_abusive_content(user_message)
+            with turn_stage('abuse'):
+                abuse_check = self.sentiment_analyzer.detect_abusive_content(user_message)
             if abuse_check['is_abusive']:
-                logger.warning(f" ABUSIVE CONTENT DETECTED - Returning warning response")
+                logger.warning(" ABUSIVE CONTENT DETECTED - Returning warning response")
                 return {
                     'ai_response': self._get_abusive_response(language, personality),
                     'detected_language': language,
@@ -735,40 +863,61 @@ class LightweightAIEngine:
                     'abusive_detected': True,  # CRITICAL FLAG
                     'intent': 'abusive',
                     'intent_confidence': 1.0,
-                    'goodbye_detected': False
+                    'goodbye_detected': False,
+                    'degraded_stages': list(deadline.degraded) if deadline else []
                 }
             
             # Step 5: Get conversation context
-            context = self.memory.get_context(call_sid) if call_sid else []
+            context_used = self.memory.has_context(call_sid) if call_sid else False
+            
+            await asyncio.sleep(0)
             
             # Step 6: Classify intent
-            intent, intent_confidence, all_intents = self.intent_classifier.classify_intent(user_message)
-            logger.info(f"Intent: {intent} (confidence: {intent_confidence:.2f})")
+            with turn_stage('intent'):
+                # Continuity bonus from this call's own recent intents
+                recent_intents = self.sessions.get(call_sid).recent_intents if call_sid else None
+                intent, intent_confidence, all_intents = self.intent_classifier.classify_intent(user_message, recent_intents)
+                logger.info("Intent: %s (confidence: %.2f)", intent, intent_confidence, extra={'stage': 'intent'})
             
             # Step 7: CRITICAL - Handle goodbye detection FIRST (before any other processing)
             if intent == 'goodbye' and intent_confidence >= 0.45:
-                logger.info(f" GOODBYE DETECTED - Ending conversation gracefully")
+                logger.info(" GOODBYE DETECTED - Ending conversation gracefully")
                 return {
                     'ai_response': self._get_goodbye_response(language, personality),
                     'detected_language': language,
                     'language_confidence': lang_confidence,
                     'sentiment': sentiment,
                     'personality': personality,
-                    'context_used': len(context) > 0,
+                    'context_used': context_used,
                     'conversation_stage': 'closed',
                     'should_escalate': False,
                     'abusive_detected': False,
                     'intent': 'goodbye',
                     'intent_confidence': intent_confidence,
-                    'goodbye_detected': True  #  CRITICAL FLAG
+                    'goodbye_detected': True,  #  CRITICAL FLAG
+                    'degraded_stages': list(deadline.degraded) if deadline else []
                 }
             
-            # Step 8: Search knowledge base
+            # Step 8: Search knowledge base (cached per KB version and question)
             relevant_kb_info = ""
-            if knowledge_base and len(knowledge_base) > 0:
-                relevant_kb_info = self._search_knowledge_base(user_message, knowledge_base)
-                if relevant_kb_info:
-                    logger.info(f" Found relevant KB content ({len(relevant_kb_info)} chars)")
+            kb_entry = None
+            with turn_stage('kb_search'):
+                if knowledge_base and len(knowledge_base) > 0:
+                    # One fingerprint per turn, shared by the KB lookup and the LLM prompt prefix
+                    kb_version = kb_version or kb_fingerprint(knowledge_base)
+                    kb_entry = await self._lookup_knowledge_base(
+                        user_message, knowledge_base, call_data.get('companyId'), kb_version, deadline
+                    )
+                    relevant_kb_info = kb_entry['content']
+                    if deadline is not None:
+                        # A coalesced lookup may have been cut short by another request's deadline
+                        for stage in kb_entry.get('degraded', ()):
+                            deadline.degrade(stage)
+                    if relevant_kb_info:
+                        logger.info(" Found relevant KB content (%d chars)", len(relevant_kb_info), extra={'stage': 'kb_search'})
+            
+            # Last cancellation point - a turn nobody hears must not advance the conversation
+            await asyncio.sleep(0)
             
             # Step 9: Check for explicit escalation request
             escalation_keywords = ['human', 'agent', 'representative', 'person', 'insaan', 'vyakti', 'team member', 'specialist']
@@ -788,38 +937,56 @@ class LightweightAIEngine:
                 'tell', 'explain', 'batao', 'samjhao', 'about', 'baare'
             ])
             
-            if is_question and relevant_kb_info:
-                # FIXED: Generate smart answer from KB (works with ANY PDF, not just cricket)
-                logger.info(" User asked question - generating smart KB-based answer")
-                response_text = self._generate_smart_kb_answer(
-                    user_question=user_message,
-                    kb_content=relevant_kb_info,
-                    language=language,
-                    personality=personality,
-                    intent=intent
-                )
-            else:
-                # Use stage-based response
-                response_text = self._get_stage_based_response(
-                    stage=current_stage,
-                    intent=intent,
-                    language=language,
-                    personality=personality,
-                    kb_info=relevant_kb_info,
-                    company_name=company_name,
-                    sentiment=sentiment,
-                    user_message=user_message
-                )
+            with turn_stage('response'):
+                response_text = None
+                response_source = 'template'
+                if self.use_openai and not user_wants_escalation:
+                    # LLM answer grounded in the retrieved KB chunks; templates below if it fails or runs out of time
+                    # The whole KB can go into the cached prompt prefix only if we have all of it
+                    kb_complete = kb_item_count is None or kb_item_count == len(knowledge_base)
+                    response_text = await self._generate_llm_response(
+                        user_message, kb_entry, call_data, call_sid, language, deadline, on_sentence,
+                        knowledge_base if kb_complete else None, kb_version
+                    )
+                if response_text is not None:
+                    response_source = 'llm'
+                elif is_question and relevant_kb_info:
+                    # FIXED: Generate smart answer from KB (works with ANY PDF, not just cricket)
+                    logger.info(" User asked question - generating smart KB-based answer", extra={'stage': 'response'})
+                    response_text = self._generate_smart_kb_answer(
+                        user_question=user_message,
+                        kb_content=relevant_kb_info,
+                        language=language,
+                        personality=personality,
+                        intent=intent,
+                        kb_entry=kb_entry,
+                        deadline=deadline
+                    )
+                else:
+                    # Use stage-based response
+                    response_text = self._get_stage_based_response(
+                        stage=current_stage,
+                        intent=intent,
+                        language=language,
+                        personality=personality,
+                        kb_info=relevant_kb_info,
+                        company_name=company_name,
+                        sentiment=sentiment,
+                        user_message=user_message,
+                        kb_entry=kb_entry,
+                        deadline=deadline
+                    )
             
-            logger.info(f" Generated response: {response_text[:100]}...")
+            logger.info(" Generated response: %.100s...", response_text, extra={'stage': 'response'})
             
             # Step 11: Advance conversation stage
-            if call_sid and not user_wants_escalation:
-                self.state_manager.advance_stage(call_sid)
+            with turn_stage('memory'):
+                if call_sid and not user_wants_escalation:
+                    self.state_manager.advance_stage(call_sid)
             
-            # Step 12: Store in memory
-            if call_sid:
-                self.memory.add_message(call_sid, user_message, response_text, language)
+                # Step 12: Store in memory
+                if call_sid:
+                    self.memory.add_message(call_sid, user_message, response_text, language)
             
             # Step 13: Return complete response
             return {
@@ -828,19 +995,21 @@ class LightweightAIEngine:
                 'language_confidence': lang_confidence,
                 'sentiment': sentiment,
                 'personality': personality,
-                'context_used': len(context) > 0,
+                'context_used': context_used,
                 'conversation_stage': self.state_manager.get_current_stage(call_sid) if call_sid else current_stage,
                 'should_escalate': self.state_manager.should_escalate(call_sid) if call_sid else False,
                 'abusive_detected': False,
                 'intent': intent,
                 'intent_confidence': intent_confidence,
-                'goodbye_detected': False
+                'goodbye_detected': False,
+                'response_source': response_source,
+                'degraded_stages': list(deadline.degraded) if deadline else []
             }
             
         except Exception as e:
             # CRITICAL: Graceful error handling to prevent 500 errors
-            logger.error(f" ERROR in generate_response: {e}")
-            logger.error(f"Stack trace:", exc_info=True)
+            logger.error(" ERROR in generate_response: %s", e)
+            logger.error("Stack trace:", exc_info=True)
             
             # Return fallback instead of crashing
             personality = voice_settings.get('personality', 'priyanshu') if voice_settings else 'priyanshu'
@@ -855,67 +1024,262 @@ class LightweightAIEngine:
             
             return self._fallback_response(personality, language)
     
-    def _search_knowledge_base(self, query: str, knowledge_base: List) -> str:
-        """Enhanced knowledge base search"""
-        if not knowledge_base:
-            return ""
+    async def _generate_llm_response(self, user_message: str, kb_entry: Optional[Dict], call_data: Dict, call_sid: str,
+                                     language: str, deadline: Deadline = None,
+                                     on_sentence: Callable[[str], Awaitable[None]] = None,
+                                     knowledge_base: List = None, kb_version: str = None) -> Optional[str]:
+        """Streamed LLM response for this turn, or None to fall back to templates"""
+        company_info = {
+            "name": call_data.get('companyName', 'our company'),
+            "business_hours": call_data.get('businessHours')
+        }
+        # Recent exchanges verbatim plus a summary of older ones, within CONVERSATION_CONTEXT_TOKENS
+        summary, history = self.memory.get_prompt_context(call_sid) if call_sid else (None, [])
+        knowledge_context = None
+        if kb_entry and kb_entry['chunks']:
+            # Formatted once per cached KB answer entry (KB version + question)
+            knowledge_context = kb_entry.get('prompt_block')
+            if knowledge_context is None:
+                knowledge_context = kb_entry['prompt_block'] = llm_service._build_knowledge_context(kb_entry['chunks'])
+        messages = llm_service.build_messages(
+            user_message, None, company_info, history, language,
+            knowledge_context=knowledge_context, knowledge_base=knowledge_base, kb_version=kb_version,
+            summary=summary
+        )
+        result = await llm_service.generate_streaming(messages, deadline, on_sentence)
+        if result is None:
+            logger.info(" LLM unavailable in time - using template response", extra={'stage': 'response'})
+            return None
+        logger.info(" LLM response: %d sentences, first after %s ms%s", len(result['sentences']),
+                    result['first_sentence_ms'], " (cut at deadline)" if result['truncated'] else "",
+                    extra={'stage': 'response'})
+        return result['response']
+    
+    def end_call(self, call_sid: str):
+        """Drop the conversation stage and memory of a finished call"""
+        if call_sid:
+            self.sessions.discard(call_sid)
+    
+    def _kb_cache_key(self, query: str, knowledge_base: List, company_id: str = None, kb_version: str = None) -> Tuple[Tuple[str, str, str], str]:
+        """Return (cache key, KB version) and record the company's current KB version"""
+        kb_version = kb_version or kb_fingerprint(knowledge_base)
+        kb_query_cache.note_kb_version(company_id, kb_version)
+        
+        # The normalized form only keys the cache; retrieval and extraction see the caller's words
+        complexity = SmartKBExtractor._analyze_question_complexity(query)['complexity']
+        return (kb_version, normalize_question(query) or query, complexity), kb_version
+    
+    @staticmethod
+    def _store_kb_entry(cache_key: Tuple[str, str, str], question: str, chunks: List[Dict], degraded: List[str] = None) -> Dict:
+        entry = {
+            'question': question,
+            'content': chunks[0]['content'] if chunks else "",
+            'chunks': chunks,
+            'answers': {}
+        }
+        if degraded:
+            # Cut short by a deadline - good enough for this turn, not for the cache
+            entry['degraded'] = degraded
+            return entry
+        return kb_query_cache.put(cache_key, entry)
+    
+    async def _lookup_knowledge_base(self, query: str, knowledge_base: List, company_id: str = None, kb_version: str = None, deadline: Deadline = None) -> Dict:
+        """
+        Cached KB retrieval keyed by (KB version, normalized question, complexity bucket)
         
-        logger.info(f"Searching {len(knowledge_base)} KB items...")
+        Large KBs are scored in a worker thread so the event loop keeps serving
+        other calls, and concurrent misses for the same KB version and question
+        (campaign start) share that single retrieval.
         
-        # Extract query keywords
-        query_lower = query.lower()
-        query_words = set(query_lower.split())
+        Returns:
+            Dict: {'content': best merged chunk, 'chunks': top-k merged chunks, 'answers': extracted answers by max_sentences,
+                   'degraded': stages cut short by the deadline (uncached entries only)}
+        """
+        cache_key, kb_version = self._kb_cache_key(query, knowledge_base, company_id, kb_version)
+        question = query
         
-        stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
-                      'of', 'with', 'is', 'are', 'was', 'were', 'be', 'been', 'being',
-                      'what', 'how', 'when', 'where', 'why', 'who', 'which', 'this', 'that',
-                      'me', 'tell', 'about', 'your', 'you', 'i', 'my', 'can', 'could', 'would'}
+        entry = kb_query_cache.get(cache_key)
+        if entry is not None:
+            logger.info(" KB cache hit", extra={'stage': 'kb_search'})
+            return entry
         
-        meaningful_words = query_words - stop_words
+        if len(knowledge_base) < KB_OFFLOAD_MIN_ITEMS:
+            degraded = []
+            chunks = self._retrieve_knowledge_chunks(question, knowledge_base, kb_version, deadline=deadline, degraded=degraded)
+            return self._store_kb_entry(cache_key, question, chunks, degraded)
         
-        # Score each KB item
-        scored_items = []
-        for item in knowledge_base:
-            content = item.get('content', '').lower()
-            title = item.get('title', '').lower()
-            
-            score = 0
-            
-            # Title match (high weight)
-            for word in meaningful_words:
-                if word in title:
-                    score += 10
+        async def retrieve():
+            degraded = []
+            try:
+                chunks = await asyncio.to_thread(
+                    self._retrieve_knowledge_chunks, question, knowledge_base, kb_version, None, deadline, degraded
+                )
+            except asyncio.CancelledError:
+                # Every waiter is gone; the worker thread stops scanning at its next deadline check
+                if deadline is not None:
+                    deadline.cancel()
+                raise
+            return self._store_kb_entry(cache_key, question, chunks, degraded)
+        
+        return await self.kb_single_flight.do(cache_key, retrieve)
+    
+    def _extract_kb_answer(self, user_question: str, kb_content: str, max_sentences: int = None, kb_entry: Dict = None, deadline: Deadline = None) -> str:
+        """Extract an answer from KB content (all top-k chunks of a KB entry), reusing the cached extraction when available"""
+        with turn_stage('extraction'):
+            if kb_entry is None or kb_entry['content'] != kb_content:
+                return SmartKBExtractor.extract_relevant_answer(user_question, kb_content, max_sentences, deadline)
             
-            # Content match (medium weight)
-            for word in meaningful_words:
-                if word in content:
-                    score += 2
-                
-                # Partial match for longer words
-                if len(word) > 4:
-                    for content_word in content.split():
-                        if word in content_word or content_word in word:
-                            score += 1
+            answers = kb_entry['answers']
+            if max_sentences not in answers:
+                degraded_before = len(deadline.degraded) if deadline else 0
+                answer = SmartKBExtractor.extract_relevant_answer_from_chunks(
+                    kb_entry['question'], kb_entry['chunks'], max_sentences, deadline
+                )
+                if deadline is not None and len(deadline.degraded) > degraded_before:
+                    return answer
+                answers[max_sentences] = answer
+            return answers[max_sentences]
+    
+    def _search_knowledge_base(self, query: str, knowledge_base: List, kb_version: str = None) -> str:
+        """Enhanced knowledge base search - content of the best match merged with adjacent top-k chunks"""
+        chunks = self._retrieve_knowledge_chunks(query, knowledge_base, kb_version)
+        return chunks[0]['content'] if chunks else ""
+    
+    def _retrieve_knowledge_chunks(self, query: str, knowledge_base: List, kb_version: str = None, top_k: int = None,
+                                   deadline: Deadline = None, degraded: List[str] = None) -> List[Dict]:
+        """
+        Retrieve the top-k KB chunks (lexical, semantic or hybrid per KB_RETRIEVAL_MODE)
+        
+        Uses heap-based partial selection instead of sorting every item, then merges
+        adjacent chunks of the same document so answers spanning a chunk boundary survive.
+        Under deadline pressure lexical scoring drops the partial-match pass and
+        the lexical scan stops early with the best items seen so far; the stages
+        cut short are appended to `degraded`.
+        
+        Returns:
+            List[Dict]: Merged chunks best first - {'score', 'title', 'chunk_ids', 'content', 'indexes'}
+        """
+        if not knowledge_base:
+            return []
+        
+        top_k = top_k or KB_TOP_K
+        degraded = degraded if degraded is not None else []
+        logger.info("Searching %d KB items (top %d)...", len(knowledge_base), top_k, extra={'stage': 'kb_search'})
+        
+        def cut_short(stage: str):
+            if stage not in degraded:
+                degraded.append(stage)
+            if deadline is not None:
+                deadline.degrade(stage)
+        
+        lexical = not kb_semantic_retriever.enabled or kb_semantic_retriever.mode == 'hybrid'
+        partial = not lexical or deadline is None or deadline.allows(STAGE_KB_PARTIAL_MATCH, len(knowledge_base))
+        if not partial:
+            cut_short(STAGE_KB_PARTIAL_MATCH)
+        scoring_started = time.perf_counter()
+        
+        if kb_semantic_retriever.enabled:
+            lexical_scores = None
+            if kb_semantic_retriever.mode == 'hybrid':
+                meaningful_words = self._kb_query_terms(query)
+                lexical_scores = [self._score_kb_item(meaningful_words, item, partial) for item in knowledge_base]
+            top_items = kb_semantic_retriever.rank(
+                query, knowledge_base, kb_version or kb_fingerprint(knowledge_base), lexical_scores, top_k
+            )
+        else:
+            # Extract query keywords and score each KB item
+            meaningful_words = self._kb_query_terms(query)
             
-            # Bonus for multiple word matches
-            matched_words = sum(1 for word in meaningful_words if word in content)
-            if matched_words > 1:
-                score += matched_words * 2
+            def scored_items():
+                for index, item in enumerate(knowledge_base):
+                    if deadline is not None and index % KB_SCAN_DEADLINE_STRIDE == 0 and index and deadline.expired():
+                        logger.info("Deadline reached - KB scan stopped after %d of %d items", index, len(knowledge_base),
+                                    extra={'stage': 'kb_search'})
+                        cut_short(STAGE_KB_SCAN)
+                        return
+                    yield self._score_kb_item(meaningful_words, item, partial), index
             
-            scored_items.append((score, item))
+            top_items = [(score, index) for score, index in heapq.nlargest(top_k, scored_items(), key=lambda x: x[0])
+                         if score > 0]
         
-        # Get best match
-        if not scored_items:
-            return ""
-        
-        scored_items.sort(reverse=True, key=lambda x: x[0])
-        best_match = scored_items[0]
+        if lexical and partial and STAGE_KB_SCAN not in degraded:
+            stage_costs.observe(STAGE_KB_PARTIAL_MATCH, (time.perf_counter() - scoring_started) / len(knowledge_base))
         
-        if best_match[0] > 0:
-            logger.info(f" Best KB match (score: {best_match[0]}): {best_match[1].get('title', 'Untitled')}")
-            return best_match[1].get('content', '')
+        if not top_items:
+            return []
         
-        return ""
+        chunks = self._merge_adjacent_chunks(top_items, knowledge_base)
+        best = chunks[0]
+        logger.info(" Best KB match (score: %s): %s chunks %s", best['score'], best['title'] or 'Untitled', best['chunk_ids'], extra={'stage': 'kb_search'})
+        return chunks
+    
+    @staticmethod
+    def _merge_adjacent_chunks(top_items: List[Tuple[float, int]], knowledge_base: List) -> List[Dict]:
+        """Merge retrieved chunks that are consecutive chunk_ids of the same document"""
+        def position(entry):
+            rank, (score, index) = entry
+            chunk_id = knowledge_base[index].get('chunk_id')
+            return (str(knowledge_base[index].get('title', '')), chunk_id if isinstance(chunk_id, int) else -1, rank)
+        
+        groups = []
+        for rank, (score, index) in sorted(enumerate(top_items), key=position):
+            item = knowledge_base[index]
+            chunk_id = item.get('chunk_id')
+            previous = groups[-1] if groups else None
+            if (previous and previous['title'] == item.get('title', '') and isinstance(chunk_id, int)
+                    and previous['chunk_ids'][-1] == chunk_id - 1):
+                previous['chunk_ids'].append(chunk_id)
+                previous['indexes'].append(index)
+                previous['content'] = f"{previous['content']} {item.get('content', '')}"
+                if score > previous['score']:
+                    previous['score'], previous['rank'] = score, rank
+                continue
+            groups.append({
+                'score': score,
+                'rank': rank,
+                'title': item.get('title', ''),
+                'chunk_ids': [chunk_id],
+                'indexes': [index],
+                'content': item.get('content', '')
+            })
+        
+        groups.sort(key=lambda group: group['rank'])
+        return groups
+    
+    @staticmethod
+    def _kb_query_terms(query: str) -> set:
+        """Meaningful (non stop word) query keywords used for lexical KB scoring"""
+        return set(query.lower().split()) - KB_STOP_WORDS
+    
+    def _score_kb_item(self, meaningful_words: set, item: Dict, partial: bool = True) -> int:
+        """Lexical relevance score of one KB item (partial=False skips the costly partial-word pass)"""
+        content = item.get('content', '').lower()
+        title = item.get('title', '').lower()
+        
+        score = 0
+        
+        # Title match (high weight)
+        for word in meaningful_words:
+            if word in title:
+                score += 10
+        
+        # Content match (medium weight)
+        for word in meaningful_words:
+            if word in content:
+                score += 2
+            
+            # Partial match for longer words
+            if partial and len(word) > 4:
+                for content_word in content.split():
+                    if word in content_word or content_word in word:
+                        score += 1
+        
+        # Bonus for multiple word matches
+        matched_words = sum(1 for word in meaningful_words if word in content)
+        if matched_words > 1:
+            score += matched_words * 2
+        
+        return score
     
     def _generate_smart_kb_answer(
         self,
@@ -923,12 +1287,14 @@ class LightweightAIEngine:
         kb_content: str,
         language: str,
         personality: str,
-        intent: str
+        intent: str,
+        kb_entry: Dict = None,
+        deadline: Deadline = None
     ) -> str:
         """ FIXED: Generate intelligent answer from KB (works with ANY PDF type)"""
         
         #  Extract relevant sentences with DYNAMIC complexity detection
-        relevant_answer = SmartKBExtractor.extract_relevant_answer(user_question, kb_content)
+        relevant_answer = self._extract_kb_answer(user_question, kb_content, kb_entry=kb_entry, deadline=deadline)
         
         if not relevant_answer:
             return self._get_no_info_response(language, personality)
@@ -989,7 +1355,9 @@ class LightweightAIEngine:
         kb_info: str,
         company_name: str,
         sentiment: Dict,
-        user_message: str
+        user_message: str,
+        kb_entry: Dict = None,
+        deadline: Deadline = None
     ) -> str:
         """Generate response based on conversation stage"""
         
@@ -1022,7 +1390,7 @@ class LightweightAIEngine:
             elif intent == 'services':
                 if kb_info:
                     # Use KB info if available
-                    relevant_info = SmartKBExtractor.extract_relevant_answer(user_message, kb_info, 2)
+                    relevant_info = self._extract_kb_answer(user_message, kb_info, 2, kb_entry, deadline)
                     if language == 'hindi':
                         return f"Ji haan, {relevant_info} Kya aur details chahiye?"
                     elif language == 'hinglish':
@@ -1171,4 +1539,9 @@ class LightweightAIEngine:
         }
 
 # Global instance
-ai_engine = LightweightAIEngine()
\ No newline at end of file
+ai_engine = LightweightAIEngine()
+
+memory_monitor.register('call_sessions', lambda: ai_engine.sessions.sessions,
+                        ai_engine.sessions.evict_idle, PRIORITY_CONVERSATION)
+memory_monitor.register('lexicons', lambda: (ai_engine.language_detector, ai_engine.sentiment_analyzer,
+                                             ai_engine.intent_classifier))
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""
+Compact per-call session state
+
+A call used to cost a {'stage', 'turn_count'} dict in ConversationStateManager
+plus a list of per-exchange dicts in ConversationMemory, and the list was
+re-sliced on every turn past the fifth. A CallSession packs a call's state
+into one __slots__ object: stage index, turn count, recent intents, the
+caller's language and a fixed-size ring buffer of (user, ai, language)
+exchanges stored flat in one preallocated list. Languages are interned, and
+appending overwrites the oldest slots in place. Sessions live in one store
+ordered by last activity, so the memory guard evicts idle calls first.
+"""
+import os
+import sys
+import math
+import itertools
+from typing import Dict, Iterator, List, Optional, Tuple
+
+Exchange = Tuple[str, str, str]
+
+# Exchanges remembered per call
+MEMORY_EXCHANGES = int(os.getenv('CONVERSATION_MEMORY_EXCHANGES', 5))
+
+
+class CallSession:
+    """State of one call; the exchange ring is allocated on the first exchange"""
+
+    __slots__ = ('stage', 'turn_count', 'recent_intents', 'language', 'summary', '_ring', '_head', '_size')
+
+    def __init__(self):
+        self.stage = 0
+        self.turn_count = 0
+        # Continuity state of DynamicIntentClassifier for this call
+        self.recent_intents: List[str] = []
+        self.language: Optional[str] = None
+        # Rolling summary of exchanges pushed out of the ring (services/conversation_summary.py)
+        self.summary = None
+        self._ring: Optional[List[Optional[str]]] = None
+        self._head = 0
+        self._size = 0
+
+    def add_exchange(self, user_message: str, ai_response: str, language: str) -> Optional[Exchange]:
+        """
+        Remember an exchange
+
+        Returns:
+            Exchange: the oldest exchange when the ring was full and it was overwritten, else None
+        """
+        language = sys.intern(language)
+        self.language = language
+        ring = self._ring
+        if ring is None:
+            # Flat [user, ai, language, user, ai, language, ...]: no per-exchange container
+            ring = self._ring = [None] * (MEMORY_EXCHANGES * 3)
+        slot = self._head * 3
+        evicted = tuple(ring[slot:slot + 3]) if self._size == MEMORY_EXCHANGES else None
+        ring[slot] = user_message
+        ring[slot + 1] = ai_response
+        ring[slot + 2] = language
+        self._head = (self._head + 1) % MEMORY_EXCHANGES
+        if self._size < MEMORY_EXCHANGES:
+            self._size += 1
+        return evicted
+
+    def exchanges(self) -> Iterator[Exchange]:
+        """Remembered exchanges, oldest first"""
+        ring = self._ring
+        start = self._head - self._size
+        for offset in range(self._size):
+            slot = (start + offset) % MEMORY_EXCHANGES * 3
+            yield ring[slot], ring[slot + 1], ring[slot + 2]
+
+    @property
+    def exchange_count(self) -> int:
+        return self._size
+
+    def clear_exchanges(self):
+        self.summary = None
+        self._ring = None
+        self._head = 0
+        self._size = 0
+
+
+class CallSessionStore:
+    """call_sid -> CallSession, least recently active first"""
+
+    def __init__(self):
+        # A plain dict re-inserted on access: insertion order is activity order, without OrderedDict's per-entry links
+        self.sessions: Dict[str, CallSession] = {}
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def get(self, call_sid: str) -> CallSession:
+        """The call's session (created on first use), marked as most recently active"""
+        sessions = self.sessions
+        session = sessions.pop(call_sid, None)
+        if session is None:
+            session = CallSession()
+        sessions[call_sid] = session
+        return session
+
+    def peek(self, call_sid: str) -> Optional[CallSession]:
+        """The call's session if it exists, without touching its activity order"""
+        return self.sessions.get(call_sid)
+
+    def discard(self, call_sid: str):
+        self.sessions.pop(call_sid, None)
+
+    def evict_idle(self, fraction: float) -> int:
+        """Drop the least recently active share of sessions (memory guard); returns how many"""
+        stale = list(itertools.islice(self.sessions, math.ceil(len(self.sessions) * fraction)))
+        for call_sid in stale:
+            del self.sessions[call_sid]
+        return len(stale)
+
+    def get_stats(self) -> Dict:
+        return {
+            "sessions": len(self.sessions),
+            "exchanges": sum(session.exchange_count for session in self.sessions.values())
+        }
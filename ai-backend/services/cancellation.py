@@ -0,0 +1,104 @@
+"""
+Cancel request work when the client disconnects
+
+The Node caller times out after a few seconds and phone users hang up; without
+this the handler keeps running the full engine pipeline and its provider calls
+for nobody. run_until_disconnect() runs the handler's work as a task next to a
+watcher on the ASGI receive channel and cancels the work on `http.disconnect`.
+The CancelledError travels through the engine's await points, SingleFlight
+groups (a coalesced provider call stops once its last waiter is gone) and the
+provider router (in-flight httpx requests are closed).
+"""
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+logger = logging.getLogger(__name__)
+
+# nginx's "client closed request" - never seen by the client, but shows up in access logs
+CLIENT_CLOSED_REQUEST = 499
+
+
+class CancellationStats:
+    """Per-endpoint counters of work cancelled because the client went away"""
+
+    def __init__(self):
+        self.endpoints: Dict[str, Dict[str, float]] = {}
+
+    def _endpoint(self, endpoint: str) -> Dict[str, float]:
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = {'completed': 0, 'cancelled': 0, 'cancelled_seconds': 0.0}
+        return self.endpoints[endpoint]
+
+    def completed(self, endpoint: str):
+        self._endpoint(endpoint)['completed'] += 1
+
+    def cancelled(self, endpoint: str, seconds: float):
+        counters = self._endpoint(endpoint)
+        counters['cancelled'] += 1
+        counters['cancelled_seconds'] += seconds
+
+    def get_stats(self) -> Dict:
+        return {
+            endpoint: {
+                "completed": counters['completed'],
+                "cancelled": counters['cancelled'],
+                # Time the cancelled requests had been running (work done for nobody)
+                "cancelled_ms_total": round(counters['cancelled_seconds'] * 1000, 2)
+            }
+            for endpoint, counters in self.endpoints.items()
+        }
+
+
+async def _wait_for_disconnect(request: Request):
+    # Only valid once the body has been read - until then receive() delivers body chunks
+    while True:
+        message = await request.receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+def disconnected_response(endpoint: str, started: float = None) -> Response:
+    """Count a disconnect and build the (undeliverable) response for it"""
+    cancellation_stats.cancelled(endpoint, time.perf_counter() - started if started is not None else 0.0)
+    logger.info("Client disconnected - %s cancelled", endpoint)
+    return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+
+async def run_until_disconnect(request: Request, work: Awaitable, endpoint: str) -> Any:
+    """
+    Await `work` unless the client disconnects first, in which case it is cancelled
+
+    Call after the request body has been consumed.
+
+    Args:
+        request (Request): The request whose connection is watched
+        work (Awaitable): The handler's processing (coroutine)
+        endpoint (str): Name for the /metrics counters
+
+    Returns:
+        Any: work's result, or a 499 Response when the client went away
+    """
+    started = time.perf_counter()
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait((task, watcher), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            # Disconnected (or this handler itself was cancelled): unwind the work before returning
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    if task.cancelled():
+        return disconnected_response(endpoint, started)
+    cancellation_stats.completed(endpoint)
+    return task.result()
+
+# Global instance
+cancellation_stats = CancellationStats()
@@ -0,0 +1,220 @@
+"""
+Rolling per-call conversation summary
+
+A call session remembers its last CONVERSATION_MEMORY_EXCHANGES exchanges
+verbatim; older ones used to be dropped. Exchanges pushed out of the ring now
+wait on the call's summary (still verbatim, still in the prompt) until
+FOLD_BATCH of them have gathered, and are then folded together into a compact
+extractive summary of the call: the caller's most informative sentence
+(numbers, names, content words) and the agent's answer when it carries a
+fact, as short notes. The summary is capped at
+CONVERSATION_SUMMARY_TOKENS - when a fold goes over, the least informative
+notes are dropped (recency only breaks near-ties) - so a long call keeps what matters
+from its start while the LLM context stays bounded (CONVERSATION_CONTEXT_TOKENS
+covers summary plus recent exchanges).
+
+Folding is plain string scoring (tens of microseconds per exchange) and runs
+after the turn, from the event loop's ready queue, not inside the response
+path. Notes keep only (score, fold, text); the content words used to spot
+repeats are recomputed once per batch rather than stored per note.
+"""
+import os
+import re
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, Iterator, List, Tuple
+
+from services.prompt_builder import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Summary size per call, and the whole conversation context (summary + recent exchanges) of a prompt
+SUMMARY_MAX_TOKENS = int(os.getenv('CONVERSATION_SUMMARY_TOKENS', 150))
+CONTEXT_BUDGET_TOKENS = int(os.getenv('CONVERSATION_CONTEXT_TOKENS', 600))
+# Longest note (words) taken from one sentence
+NOTE_MAX_WORDS = 24
+# Evicted exchanges folded together
+FOLD_BATCH = 4
+# Recency bonus of a note: up to RECENCY_WEIGHT of its score, shrinking by NOTE_DECAY per fold since it was
+# (last) seen. Bounded, so an early account number still outranks later small talk when the summary is trimmed.
+RECENCY_WEIGHT = 0.5
+NOTE_DECAY = 0.8
+
+_SENTENCE_END = re.compile(r'(?<=[.!?।])\s+')
+_WORD = re.compile(r'\w+')
+_NUMBER = re.compile(r'\d[\d,.:/-]*')
+_STOP_WORDS = {
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'is', 'are', 'was',
+    'were', 'be', 'been', 'being', 'what', 'how', 'when', 'where', 'why', 'who', 'which', 'this', 'that',
+    'me', 'tell', 'about', 'your', 'you', 'i', 'my', 'can', 'could', 'would', 'will', 'do', 'does', 'did',
+    'have', 'has', 'it', 'its', 'we', 'our', 'us', 'they', 'them', 'so', 'if', 'then', 'there', 'here',
+    'yes', 'no', 'ok', 'okay', 'please', 'thanks', 'thank', 'just', 'also', 'very', 'some', 'any', 'all',
+    'hai', 'hain', 'ka', 'ki', 'ke', 'ko', 'se', 'mein', 'main', 'aap', 'kya', 'nahi', 'haan', 'bhi',
+    'tha', 'thi', 'ho', 'hum', 'mera', 'meri', 'aapka', 'yeh', 'woh', 'par', 'toh', 'ji'
+}
+
+
+def _content_words(text: str) -> set:
+    return {word for word in _WORD.findall(text.lower()) if len(word) > 2 and word not in _STOP_WORDS}
+
+
+def _sentence_score(sentence: str) -> float:
+    """Information score: distinct content words, identifiers, numbers and capitalized names, per length"""
+    words = sentence.split()
+    if not words:
+        return 0.0
+    score = len(_content_words(sentence))
+    for number in _NUMBER.findall(sentence):
+        # Account, order and phone numbers cannot be recovered once dropped
+        score += 6.0 if len(number) >= 3 else 1.0
+    score += 2.0 * sum(1 for word in words[1:] if word[:1].isupper() and not word.isupper())
+    return score / (1.0 + len(words) / 40.0)
+
+
+def _best_sentence(text: str) -> Tuple[str, float]:
+    best, best_score = "", 0.0
+    for sentence in _SENTENCE_END.split(text.strip()):
+        score = _sentence_score(sentence)
+        if score > best_score:
+            best, best_score = sentence, score
+    words = best.split()
+    if len(words) > NOTE_MAX_WORDS:
+        best = ' '.join(words[:NOTE_MAX_WORDS]) + '...'
+    return best, best_score
+
+
+class CallSummary:
+    """Extractive notes of a call's older exchanges, in call order, plus the exchanges not folded yet"""
+
+    __slots__ = ('notes', 'tokens', 'folded', 'pending')
+
+    def __init__(self):
+        # (score, fold last seen, text)
+        self.notes: List[Tuple[float, int, str]] = []
+        self.tokens = 0
+        self.folded = 0
+        # Flat [user, ai, language, user, ai, language, ...] like the session ring, oldest first
+        self.pending: List[str] = []
+
+    def text(self) -> str:
+        return '\n'.join(f"- {note[2]}" for note in self.notes)
+
+    def pending_exchanges(self) -> Iterator[Tuple[str, str, str]]:
+        """Evicted exchanges waiting for the next fold, oldest first"""
+        pending = self.pending
+        for slot in range(0, len(pending), 3):
+            yield pending[slot], pending[slot + 1], pending[slot + 2]
+
+
+class ConversationSummarizer:
+    """Folds evicted exchanges into per-call summaries, FOLD_BATCH at a time, after the turn"""
+
+    def __init__(self):
+        self.max_tokens = SUMMARY_MAX_TOKENS
+        # Summaries with a full batch of pending exchanges
+        self._pending: Deque[CallSummary] = deque()
+        self._scheduled = False
+        self.folds = 0
+        self.notes_added = 0
+        self.notes_dropped = 0
+        self.duplicates_skipped = 0
+        self.fold_seconds = 0.0
+
+    def schedule(self, session, exchange: Tuple[str, str, str]):
+        """
+        Queue an exchange evicted from a session's ring for its summary
+
+        Once FOLD_BATCH exchanges are waiting, they are folded on the next event-loop
+        iteration (inline when no loop is running).
+        """
+        if not self.max_tokens:
+            return
+        summary = session.summary
+        if summary is None:
+            summary = session.summary = CallSummary()
+        summary.pending.extend(exchange)
+        if len(summary.pending) < FOLD_BATCH * 3:
+            return
+        self._pending.append(summary)
+        if self._scheduled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._drain()
+            return
+        self._scheduled = True
+        loop.call_soon(self._drain)
+
+    def _drain(self):
+        self._scheduled = False
+        while self._pending:
+            summary = self._pending.popleft()
+            started = time.perf_counter()
+            self.fold(summary)
+            self.fold_seconds += time.perf_counter() - started
+
+    def fold(self, summary: CallSummary):
+        """Fold a summary's pending exchanges into its notes and trim them back to the token cap"""
+        pending = summary.pending
+        if not pending:
+            return
+        summary.pending = []
+        notes = summary.notes
+        # Content words of the existing notes, once per batch
+        note_words = [_content_words(note[2]) for note in notes]
+
+        for slot in range(0, len(pending), 3):
+            user_message, ai_response = pending[slot], pending[slot + 1]
+            self.folds += 1
+            summary.folded += 1
+
+            user_sentence, user_score = _best_sentence(user_message)
+            candidates = []
+            if user_sentence and user_score > 0:
+                candidates.append((user_score, "Caller", user_sentence))
+            ai_sentence, ai_score = _best_sentence(ai_response)
+            # The agent's side only when it states a fact (a number) or answers the caller's topic
+            if ai_sentence and (_NUMBER.search(ai_sentence)
+                                or len(_content_words(ai_sentence) & _content_words(user_message)) >= 2):
+                candidates.append((ai_score * 0.8, "Agent", ai_sentence))
+
+            for score, speaker, sentence in candidates:
+                words = _content_words(sentence)
+                repeated = next((index for index, seen in enumerate(note_words)
+                                 if words and len(words - seen) <= len(words) // 5), None)
+                if repeated is not None:
+                    # Repeats something already noted (the caller asked again): keep the note, refresh it
+                    note = notes[repeated]
+                    notes[repeated] = (max(note[0], score), summary.folded, note[2])
+                    self.duplicates_skipped += 1
+                    continue
+                text = f"{speaker}: {sentence}"
+                notes.append((score, summary.folded, text))
+                note_words.append(words)
+                summary.tokens += estimate_tokens(text) + 1
+                self.notes_added += 1
+
+        while summary.tokens > self.max_tokens and summary.notes:
+            weakest = min(summary.notes, key=lambda note: (
+                note[0] * (1.0 + RECENCY_WEIGHT * NOTE_DECAY ** (summary.folded - note[1])), note[1]))
+            summary.notes.remove(weakest)
+            summary.tokens -= estimate_tokens(weakest[2]) + 1
+            self.notes_dropped += 1
+
+    def get_stats(self) -> Dict:
+        return {
+            "summary_max_tokens": self.max_tokens,
+            "context_budget_tokens": CONTEXT_BUDGET_TOKENS,
+            "folds": self.folds,
+            "pending": len(self._pending),
+            "notes_added": self.notes_added,
+            "notes_dropped": self.notes_dropped,
+            "duplicates_skipped": self.duplicates_skipped,
+            "avg_fold_us": round(self.fold_seconds * 1e6 / self.folds, 1) if self.folds else None
+        }
+
+# Global instance
+conversation_summarizer = ConversationSummarizer()
@@ -0,0 +1,149 @@
+"""
+Per-request deadlines and graceful degradation
+
+The telephony backend gives a voice turn a fixed budget (8 s for
+/voice/voice-response) and then gives up. A Deadline carries that budget
+through the engine; optional stages ask it whether they still fit and are
+skipped or cut short when they do not, so a good-enough answer goes out in
+time instead of a perfect one after the caller has hung up. Stage costs are
+learned (EWMA of their measured durations) rather than hard-coded.
+"""
+import os
+import time
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Budget applied when the caller sends neither X-Deadline-Ms nor deadline_ms
+DEFAULT_DEADLINE_MS = float(os.getenv('VOICE_DEADLINE_MS', 8000))
+# Time kept back for building and sending the response
+DEADLINE_RESERVE_MS = float(os.getenv('DEADLINE_RESERVE_MS', 150))
+
+# Optional stages and their cost estimate (seconds; per KB item / per sentence
+# for the partial-match passes) before anything has been measured
+STAGE_SENTIMENT = 'sentiment'
+STAGE_KB_PARTIAL_MATCH = 'kb_partial_match'
+STAGE_KB_SCAN = 'kb_scan'
+STAGE_EXTRACT_PARTIAL_MATCH = 'extract_partial_match'
+# LLM generation, costed as its time to the first complete sentence
+STAGE_LLM = 'llm'
+_INITIAL_COSTS = {
+    STAGE_SENTIMENT: 0.005,
+    STAGE_LLM: 1.0,
+    STAGE_KB_PARTIAL_MATCH: 0.00005,
+    STAGE_EXTRACT_PARTIAL_MATCH: 0.00002
+}
+
+
+class StageCosts:
+    """EWMA of how long each optional stage takes (per unit) when it runs in full"""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.costs: Dict[str, float] = dict(_INITIAL_COSTS)
+        self.degraded: Dict[str, int] = {}
+        self.requests = 0
+        self.degraded_requests = 0
+        self.expired_requests = 0
+
+    def estimate(self, stage: str) -> float:
+        return self.costs.get(stage, 0.0)
+
+    def observe(self, stage: str, seconds: float):
+        previous = self.costs.get(stage)
+        self.costs[stage] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+
+    def get_stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "degraded_requests": self.degraded_requests,
+            "expired_requests": self.expired_requests,
+            "degraded_by_stage": dict(self.degraded),
+            "stage_cost_ms": {stage: round(cost * 1000, 3) for stage, cost in self.costs.items()}
+        }
+
+
+class Deadline:
+    """Absolute deadline of one request plus the optional stages it had to drop"""
+
+    def __init__(self, budget_ms: float, started: float = None):
+        self.started = started if started is not None else time.monotonic()
+        self.budget = max(0.0, budget_ms) / 1000
+        self.expires_at = self.started + self.budget
+        self.reserve = DEADLINE_RESERVE_MS / 1000
+        self.degraded: List[str] = []
+        self.cancelled = False
+
+    def remaining(self) -> float:
+        """Seconds left before the caller gives up"""
+        return self.expires_at - time.monotonic()
+
+    def expired(self) -> bool:
+        """True once only the response reserve is left (or the request was cancelled)"""
+        return self.cancelled or self.remaining() <= self.reserve
+
+    def cancel(self):
+        """The client is gone - loops that poll expired() (e.g. in worker threads) stop early"""
+        self.cancelled = True
+
+    def allows(self, stage: str, units: int = 1) -> bool:
+        """
+        Whether an optional stage still fits in the budget; records it as degraded if not
+
+        Args:
+            stage (str): Stage name (STAGE_* constant)
+            units (int): Work size when the stage cost is tracked per unit (KB items, sentences)
+
+        Returns:
+            bool: True to run the stage in full
+        """
+        if self.remaining() - self.reserve >= stage_costs.estimate(stage) * units:
+            return True
+        self.degrade(stage)
+        return False
+
+    def degrade(self, stage: str):
+        """Record that a stage was skipped or cut short"""
+        if stage not in self.degraded:
+            self.degraded.append(stage)
+            stage_costs.degraded[stage] = stage_costs.degraded.get(stage, 0) + 1
+            logger.info("Deadline: degraded %s (%.0f ms left)", stage, self.remaining() * 1000)
+
+    def finish(self):
+        """Count this request in the /metrics deadline stats"""
+        stage_costs.requests += 1
+        if self.degraded:
+            stage_costs.degraded_requests += 1
+        if self.remaining() <= 0:
+            stage_costs.expired_requests += 1
+
+
+def parse_deadline_ms(value) -> Optional[float]:
+    """A positive millisecond budget from a header or body field, or None"""
+    try:
+        budget = float(value)
+    except (TypeError, ValueError):
+        return None
+    return budget if budget > 0 else None
+
+
+def deadline_from_request(header_value=None, field_value=None, started: float = None) -> Deadline:
+    """
+    Build the deadline of a request
+
+    Args:
+        header_value: X-Deadline-Ms header (milliseconds, relative to arrival)
+        field_value: deadline_ms body field (same meaning; the header wins)
+        started (float): time.monotonic() when the request arrived
+
+    Returns:
+        Deadline: VOICE_DEADLINE_MS budget when neither is given
+    """
+    budget = parse_deadline_ms(header_value)
+    if budget is None:
+        budget = parse_deadline_ms(field_value)
+    return Deadline(budget if budget is not None else DEFAULT_DEADLINE_MS, started)
+
+# Global instance
+stage_costs = StageCosts()
@@ -0,0 +1,231 @@
+"""
+Multi-tenant fair scheduling of engine work
+
+All companies share one event loop, so a single tenant's bulk campaign can
+fill every engine slot and leave other tenants' live calls queued behind it.
+Work is classified by tenant (call_data.companyId) and lane (live voice, text
+chat, batch) and granted a limited number of engine slots with weighted fair
+queuing: every (tenant, lane) flow gets a virtual-time tag per request and the
+smallest tag runs next, so each tenant gets an equal share within a lane and
+lanes share by weight. A per-tenant concurrency cap stops one tenant from
+holding every slot even when nobody else is waiting yet.
+"""
+import os
+import time
+import heapq
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LANE_LIVE_VOICE = 'live_voice'
+LANE_TEXT_CHAT = 'text_chat'
+LANE_BATCH = 'batch'
+LANES = (LANE_LIVE_VOICE, LANE_TEXT_CHAT, LANE_BATCH)
+
+DEFAULT_TENANT = 'default'
+
+
+def _parse_lane_weights(value: str) -> Dict[str, float]:
+    weights = {LANE_LIVE_VOICE: 8.0, LANE_TEXT_CHAT: 2.0, LANE_BATCH: 1.0}
+    for part in (value or '').split(','):
+        lane, _, weight = part.partition('=')
+        lane = lane.strip()
+        try:
+            if lane in weights and float(weight) > 0:
+                weights[lane] = float(weight)
+        except ValueError:
+            logger.warning("Ignoring invalid lane weight '%s'", part)
+    return weights
+
+
+def lane_from_header(value: Optional[str], default: str) -> str:
+    """Lane requested by the caller (X-Work-Lane), falling back to the endpoint's lane"""
+    value = (value or '').strip().lower()
+    return value if value in LANES else default
+
+
+class _Waiter:
+    __slots__ = ('tenant', 'lane', 'start', 'finish', 'seq', 'enqueued', 'future')
+
+    def __init__(self, tenant: str, lane: str, start: float, finish: float, seq: int, future: asyncio.Future):
+        self.tenant = tenant
+        self.lane = lane
+        self.start = start
+        self.finish = finish
+        self.seq = seq
+        self.enqueued = time.perf_counter()
+        self.future = future
+
+
+class _QueueTimes:
+    """Recent queue waits of one tenant or lane"""
+
+    def __init__(self, window: int = 1000):
+        self.waits = deque(maxlen=window)
+        self.dispatched = 0
+        self.total_wait = 0.0
+
+    def record(self, wait: float):
+        self.waits.append(wait)
+        self.dispatched += 1
+        self.total_wait += wait
+
+    def get_stats(self) -> Dict:
+        ordered = sorted(self.waits)
+
+        def percentile(fraction: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 2) if ordered else 0.0
+
+        return {
+            "dispatched": self.dispatched,
+            "wait_ms_avg": round(self.total_wait * 1000 / self.dispatched, 2) if self.dispatched else 0.0,
+            "wait_ms_p50": percentile(0.5),
+            "wait_ms_p99": percentile(0.99),
+            "wait_ms_max": round(ordered[-1] * 1000, 2) if ordered else 0.0
+        }
+
+
+class FairScheduler:
+    """Weighted fair queuing of engine slots across (tenant, lane) flows"""
+
+    def __init__(self, max_concurrency: int = None, tenant_max_concurrency: int = None, lane_weights: Dict[str, float] = None):
+        self.max_concurrency = max_concurrency or int(os.getenv('SCHEDULER_MAX_CONCURRENCY', 8))
+        self.tenant_max_concurrency = tenant_max_concurrency or int(os.getenv('SCHEDULER_TENANT_MAX_CONCURRENCY', 4))
+        self.lane_weights = lane_weights or _parse_lane_weights(os.getenv('SCHEDULER_LANE_WEIGHTS', ''))
+        self.running = 0
+        self.running_by_tenant: Dict[str, int] = {}
+        self.virtual_time = 0.0
+        self._seq = 0
+        # FIFO per flow (tags grow within a flow, so the head is the flow's next candidate)
+        self._flows: Dict[Tuple[str, str], deque] = {}
+        self._flow_finish: Dict[Tuple[str, str], float] = {}
+        # Heads of flows that may run now; flows of tenants at their cap are parked instead
+        self._ready: List[Tuple[float, int, Tuple[str, str]]] = []
+        self._parked: Dict[str, List[Tuple[str, str]]] = {}
+        self.tenant_times: Dict[str, _QueueTimes] = {}
+        self.lane_times: Dict[str, _QueueTimes] = {lane: _QueueTimes() for lane in LANES}
+        self.cancelled_while_queued = 0
+
+    @asynccontextmanager
+    async def slot(self, tenant: Optional[str], lane: str = LANE_LIVE_VOICE):
+        """
+        Hold one engine slot for the duration of the block
+
+        Args:
+            tenant (str): companyId (None -> 'default')
+            lane (str): LANE_LIVE_VOICE, LANE_TEXT_CHAT or LANE_BATCH
+        """
+        tenant = str(tenant) if tenant else DEFAULT_TENANT
+        await self._acquire(tenant, lane if lane in LANES else LANE_BATCH)
+        try:
+            yield
+        finally:
+            self._release(tenant)
+
+    async def _acquire(self, tenant: str, lane: str):
+        flow = (tenant, lane)
+        # Start tag: the flow's previous finish, or now (virtual) if the flow was idle
+        start = max(self.virtual_time, self._flow_finish.get(flow, 0.0))
+        finish = start + 1.0 / self.lane_weights[lane]
+        self._flow_finish[flow] = finish
+        self._seq += 1
+        waiter = _Waiter(tenant, lane, start, finish, self._seq, asyncio.get_running_loop().create_future())
+
+        queue = self._flows.get(flow)
+        if queue is None:
+            queue = self._flows[flow] = deque()
+        queue.append(waiter)
+        if len(queue) == 1:
+            self._schedule(flow)
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted in the same tick the caller went away - hand the slot on
+                self._release(tenant)
+            else:
+                # Left in its flow and skipped when it reaches the head
+                waiter.future.cancel()
+                self.cancelled_while_queued += 1
+            raise
+
+    def _schedule(self, flow: Tuple[str, str]):
+        """Offer a non-empty flow's head for dispatch (or park it while its tenant is at the cap)"""
+        if self.running_by_tenant.get(flow[0], 0) >= self.tenant_max_concurrency:
+            self._parked.setdefault(flow[0], []).append(flow)
+            return
+        head = self._flows[flow][0]
+        heapq.heappush(self._ready, (head.finish, head.seq, flow))
+
+    def _release(self, tenant: str):
+        self.running -= 1
+        running = self.running_by_tenant[tenant] - 1
+        if running:
+            self.running_by_tenant[tenant] = running
+        else:
+            del self.running_by_tenant[tenant]
+        if running < self.tenant_max_concurrency:
+            for flow in self._parked.pop(tenant, ()):
+                self._schedule(flow)
+        self._dispatch()
+        if not self._flows and not self.running:
+            # Idle: forget old tags so the dict does not grow with every tenant ever seen
+            self._flow_finish.clear()
+
+    def _dispatch(self):
+        """Grant free slots to flow heads in virtual finish-time order"""
+        while self._ready and self.running < self.max_concurrency:
+            _, _, flow = heapq.heappop(self._ready)
+            if self.running_by_tenant.get(flow[0], 0) >= self.tenant_max_concurrency:
+                # Another flow of the same tenant took its last slot since this head was offered
+                self._parked.setdefault(flow[0], []).append(flow)
+                continue
+            queue = self._flows[flow]
+            waiter = queue.popleft()
+            if not waiter.future.done():
+                self.running += 1
+                self.running_by_tenant[waiter.tenant] = self.running_by_tenant.get(waiter.tenant, 0) + 1
+                self.virtual_time = max(self.virtual_time, waiter.start)
+                wait = time.perf_counter() - waiter.enqueued
+                if waiter.tenant not in self.tenant_times:
+                    self.tenant_times[waiter.tenant] = _QueueTimes()
+                self.tenant_times[waiter.tenant].record(wait)
+                self.lane_times[waiter.lane].record(wait)
+                waiter.future.set_result(None)
+            if queue:
+                self._schedule(flow)
+            else:
+                del self._flows[flow]
+
+    def get_stats(self) -> Dict:
+        queued_by_tenant: Dict[str, int] = {}
+        for (tenant, _), queue in self._flows.items():
+            queued = sum(1 for waiter in queue if not waiter.future.done())
+            if queued:
+                queued_by_tenant[tenant] = queued_by_tenant.get(tenant, 0) + queued
+        return {
+            "max_concurrency": self.max_concurrency,
+            "tenant_max_concurrency": self.tenant_max_concurrency,
+            "lane_weights": dict(self.lane_weights),
+            "running": self.running,
+            "queued": sum(queued_by_tenant.values()),
+            "cancelled_while_queued": self.cancelled_while_queued,
+            "lanes": {lane: times.get_stats() for lane, times in self.lane_times.items()},
+            "tenants": {
+                tenant: {
+                    "running": self.running_by_tenant.get(tenant, 0),
+                    "queued": queued_by_tenant.get(tenant, 0),
+                    **times.get_stats()
+                }
+                for tenant, times in self.tenant_times.items()
+            }
+        }
+
+# Global instance
+fair_scheduler = FairScheduler()
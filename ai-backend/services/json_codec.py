@@ -0,0 +1,50 @@
+"""
+Fast JSON encode/decode for the request hot path
+
+Uses orjson on raw bytes when it is installed and falls back to the standard
+library otherwise, so the service still runs on a bare environment.
+"""
+import json
+import logging
+from typing import Any
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can catch this either way
+JSONDecodeError = json.JSONDecodeError
+
+
+def loads(data) -> Any:
+    """Decode JSON from bytes or str without an intermediate str copy"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode to compact UTF-8 JSON bytes"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response rendered straight from a dict
+
+    Returning a Response subclass makes FastAPI skip response_model
+    re-validation, so endpoints build the payload once and serialize it once.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
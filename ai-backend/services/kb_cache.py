@@ -0,0 +1,162 @@
+"""
+Knowledge base query cache
+
+Campaign callers ask the same handful of questions against the same company KB,
+so the selected chunk and the extracted answer are cached per
+(KB version, normalized question, complexity bucket).
+"""
+import os
+import math
+import hashlib
+import unicodedata
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from services.memory_monitor import memory_monitor
+
+logger = logging.getLogger(__name__)
+
+
+class KBFingerprint:
+    """Incremental KB version hash - items can be fed one at a time while streaming"""
+
+    def __init__(self):
+        self._digest = hashlib.blake2b(digest_size=16)
+
+    def update(self, item: Dict):
+        digest = self._digest
+        digest.update(str(item.get('title', '')).encode('utf-8', 'replace'))
+        digest.update(b'\x1f')
+        digest.update(str(item.get('chunk_id', '')).encode('utf-8', 'replace'))
+        digest.update(b'\x1f')
+        digest.update(str(item.get('content', '')).encode('utf-8', 'replace'))
+        digest.update(b'\x1e')
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+def kb_fingerprint(knowledge_base: List) -> str:
+    """
+    Compute a stable version identifier for a knowledge base payload
+
+    Args:
+        knowledge_base (List): KB items as sent by the Node backend
+
+    Returns:
+        str: Hex digest that changes whenever any title, chunk or content changes
+    """
+    fingerprint = KBFingerprint()
+    for item in knowledge_base or []:
+        fingerprint.update(item)
+    return fingerprint.hexdigest()
+
+
+def _is_word_char(char: str) -> bool:
+    # Letters, digits and combining marks (Devanagari vowel signs are Mn/Mc, not \w)
+    return unicodedata.category(char)[0] in 'LNM'
+
+
+def normalize_question(question: str) -> str:
+    """
+    Cache-key form of a question: casefolded, punctuation and symbols stripped, whitespace collapsed
+
+    Combining marks are kept ('कितना' stays 'कितना') and so are joiners inside a
+    word ('e-commerce', "what's"). Only for keys - retrieval uses the original text.
+    """
+    text = unicodedata.normalize('NFC', question or '').casefold()
+    chars = []
+    last = len(text) - 1
+    for index, char in enumerate(text):
+        if unicodedata.category(char)[0] in 'PS' and not (
+                0 < index < last and _is_word_char(text[index - 1]) and _is_word_char(text[index + 1])):
+            chars.append(' ')
+        else:
+            chars.append(char)
+    return ' '.join(''.join(chars).split())
+
+
+class KBQueryCache:
+    """LRU cache of KB retrieval results with hit/miss metrics"""
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries or int(os.getenv('KB_CACHE_MAX_ENTRIES', 1024))
+        self._entries: "OrderedDict[Tuple[str, str, str], Dict]" = OrderedDict()
+        self._company_versions: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def note_kb_version(self, company_id: Optional[str], kb_version: str):
+        """
+        Record the KB version a company is currently using
+
+        When a company's KB changes, every entry cached for its previous
+        version is dropped immediately instead of waiting for LRU eviction.
+        """
+        if not company_id:
+            return
+        company_id = str(company_id)
+        previous = self._company_versions.get(company_id)
+        if previous == kb_version:
+            return
+        self._company_versions[company_id] = kb_version
+        if previous is not None and previous not in self._company_versions.values():
+            self.invalidate_version(previous)
+
+    def invalidate_version(self, kb_version: str) -> int:
+        """Drop all entries cached for a KB version"""
+        stale = [key for key in self._entries if key[0] == kb_version]
+        for key in stale:
+            del self._entries[key]
+        if stale:
+            self.invalidations += len(stale)
+            logger.info("KB cache invalidated %d entries for version %s", len(stale), kb_version[:8])
+        return len(stale)
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: Tuple[str, str, str], entry: Dict) -> Dict:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+        self._company_versions.clear()
+
+    def shrink(self, fraction: float) -> int:
+        """Evict the least recently used share of entries (memory guard)"""
+        count = math.ceil(len(self._entries) * fraction)
+        for _ in range(count):
+            self._entries.popitem(last=False)
+        self.evictions += count
+        return count
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate_percent": round(self.hits / lookups * 100, 2) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+# Create global instance
+kb_query_cache = KBQueryCache()
+memory_monitor.register('kb_query_cache', lambda: kb_query_cache._entries, kb_query_cache.shrink)
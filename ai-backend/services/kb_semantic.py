@@ -0,0 +1,241 @@
+"""
+Semantic knowledge base retrieval
+
+Embeds KB chunks with a hashed word + character n-gram vectorizer (CPU only, no
+model download) and answers queries with a single matrix product and top-k.
+A small concept lexicon maps English and Hinglish surface forms onto shared
+features so "cost" or "kitna lagega" can find a chunk that says "pricing".
+"""
+import os
+import re
+import math
+import zlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from services.memory_monitor import memory_monitor, PRIORITY_INDEX
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Surface forms (English + Hinglish) that should land on the same feature
+CONCEPT_LEXICON = {
+    'price': [
+        'price', 'prices', 'pricing', 'cost', 'costs', 'rate', 'rates', 'fee', 'fees',
+        'charge', 'charges', 'plan', 'plans', 'package', 'packages', 'budget', 'expensive',
+        'cheap', 'affordable', 'rupees', 'rupaye', 'rupay', 'inr', 'dollar', 'paisa',
+        'paise', 'kitna', 'kitne', 'lagega', 'lagenge', 'kimat', 'keemat', 'daam', 'subscription'
+    ],
+    'service': [
+        'service', 'services', 'offer', 'offers', 'offering', 'provide', 'provides',
+        'product', 'products', 'solution', 'solutions', 'feature', 'features', 'seva',
+        'karte', 'suvidha'
+    ],
+    'contact': [
+        'contact', 'phone', 'number', 'email', 'mail', 'call', 'reach', 'sampark',
+        'helpline', 'whatsapp'
+    ],
+    'location': [
+        'address', 'location', 'office', 'branch', 'where', 'kahan', 'pata', 'thikana',
+        'located', 'city'
+    ],
+    'time': [
+        'hours', 'timing', 'timings', 'time', 'open', 'close', 'closing', 'schedule',
+        'kab', 'samay', 'waqt', 'days', 'weekend'
+    ],
+    'support': [
+        'support', 'help', 'issue', 'problem', 'complaint', 'madad', 'dikkat', 'samasya',
+        'troubleshoot', 'error', 'fix'
+    ],
+    'refund': [
+        'refund', 'refunds', 'return', 'returns', 'cancel', 'cancellation', 'money back',
+        'wapas', 'vapas'
+    ],
+    'delivery': [
+        'delivery', 'deliver', 'shipping', 'ship', 'dispatch', 'courier', 'pahunch'
+    ]
+}
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+class HashedNgramVectorizer:
+    """Stateless hashed feature vectorizer (word unigrams, char trigrams, concepts)"""
+
+    def __init__(self, dim: int = None):
+        self.dim = dim or int(os.getenv('KB_SEMANTIC_DIM', 2048))
+        self._concepts = {}
+        for concept, forms in CONCEPT_LEXICON.items():
+            for form in forms:
+                self._concepts[form] = f"__concept_{concept}"
+
+    def _features(self, text: str) -> Dict[int, float]:
+        features: Dict[int, float] = {}
+        dim = self.dim
+        tokens = _TOKEN_RE.findall(text.lower())
+
+        def add(feature: str, weight: float):
+            index = zlib.crc32(feature.encode('utf-8')) % dim
+            features[index] = features.get(index, 0.0) + weight
+
+        for i, token in enumerate(tokens):
+            add(token, 1.0)
+            concept = self._concepts.get(token)
+            if concept is None and i + 1 < len(tokens):
+                concept = self._concepts.get(f"{token} {tokens[i + 1]}")
+            if concept:
+                add(concept, 2.0)
+            padded = f" {token} "
+            for j in range(len(padded) - 2):
+                add(padded[j:j + 3], 0.3)
+
+        return features
+
+    def transform(self, texts: List[str]):
+        """Embed texts into an L2-normalized float32 matrix"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self._features(text or '')
+            if features:
+                indices = np.fromiter(features.keys(), dtype=np.int64, count=len(features))
+                values = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+                matrix[row, indices] = np.log1p(values)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+class SemanticKBIndex:
+    """Embedding matrix for one KB version"""
+
+    def __init__(self, knowledge_base: List, vectorizer: HashedNgramVectorizer):
+        self.vectorizer = vectorizer
+        texts = [f"{item.get('title', '')} {item.get('content', '')}" for item in knowledge_base]
+        self.matrix = vectorizer.transform(texts)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def scores(self, query: str):
+        """Cosine similarity of the query against every chunk"""
+        return self.matrix @ self.vectorizer.transform([query])[0]
+
+    def scores_batch(self, queries: List[str]):
+        """Cosine similarities for many queries in one matrix product (queries x chunks)"""
+        return self.vectorizer.transform(queries) @ self.matrix.T
+
+    def top_k(self, query: str, k: int = 5) -> List[Tuple[float, int]]:
+        """Return (score, index) pairs of the k most similar chunks"""
+        return SemanticKBRetriever._select_top(self.scores(query), k)
+
+
+class SemanticKBRetriever:
+    """Caches one SemanticKBIndex per KB version and fuses with lexical scores"""
+
+    def __init__(self):
+        self.mode = os.getenv('KB_RETRIEVAL_MODE', 'lexical').lower()
+        self.hybrid_alpha = float(os.getenv('KB_HYBRID_ALPHA', 0.5))
+        self.min_score = float(os.getenv('KB_SEMANTIC_MIN_SCORE', 0.1))
+        self.max_indexes = int(os.getenv('KB_SEMANTIC_INDEX_CACHE', 16))
+        self.vectorizer = HashedNgramVectorizer() if NUMPY_AVAILABLE else None
+        self._indexes: "OrderedDict[str, SemanticKBIndex]" = OrderedDict()
+        # Large KBs are ranked from worker threads (ai_engine KB offload)
+        self._lock = threading.Lock()
+
+        if self.mode not in ('lexical', 'semantic', 'hybrid'):
+            logger.warning("Unknown KB_RETRIEVAL_MODE '%s', using lexical", self.mode)
+            self.mode = 'lexical'
+        if self.mode != 'lexical' and not NUMPY_AVAILABLE:
+            logger.warning("numpy not installed - %s KB retrieval disabled, using lexical", self.mode)
+            self.mode = 'lexical'
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'lexical'
+
+    def get_index(self, kb_version: str, knowledge_base: List) -> SemanticKBIndex:
+        """Return the index for a KB version, embedding the chunks on first use"""
+        with self._lock:
+            index = self._indexes.get(kb_version)
+            if index is not None and len(index) == len(knowledge_base):
+                self._indexes.move_to_end(kb_version)
+                return index
+
+            index = SemanticKBIndex(knowledge_base, self.vectorizer)
+            self._indexes[kb_version] = index
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        logger.info("Embedded %d KB chunks for version %s", len(index), kb_version[:8])
+        return index
+
+    def rank(self, query: str, knowledge_base: List, kb_version: str, lexical_scores: Optional[List[float]] = None, top_k: int = None) -> List[Tuple[float, int]]:
+        """
+        Rank KB items for a query
+
+        Args:
+            query (str): User question
+            knowledge_base (List): KB items
+            kb_version (str): KB fingerprint used as the index cache key
+            lexical_scores (List[float]): Lexical scores per item, required for hybrid mode
+            top_k (int): Only select the k best items (partial selection, no full sort)
+
+        Returns:
+            List[Tuple[float, int]]: (score, item index) sorted best first, below-threshold items removed
+        """
+        semantic = self.get_index(kb_version, knowledge_base).scores(query)
+
+        if self.mode == 'hybrid' and lexical_scores is not None:
+            lexical = np.asarray(lexical_scores, dtype=np.float32)
+            top = lexical.max() if len(lexical) else 0.0
+            if top > 0:
+                lexical = lexical / top
+            fused = self.hybrid_alpha * semantic + (1.0 - self.hybrid_alpha) * lexical
+        else:
+            fused = semantic
+
+        return [(score, index) for score, index in self._select_top(fused, top_k) if score >= self.min_score]
+
+    @staticmethod
+    def _select_top(scores, k: int = None) -> List[Tuple[float, int]]:
+        """Best-first (score, index) pairs; argpartition when only k are needed"""
+        if k is None or k >= len(scores):
+            candidates = np.argsort(-scores, kind='stable')
+        elif k <= 0:
+            return []
+        else:
+            candidates = np.argpartition(-scores, k - 1)[:k]
+            candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(float(scores[i]), int(i)) for i in candidates]
+
+    def clear(self):
+        self._indexes.clear()
+
+    def shrink(self, fraction: float) -> int:
+        """Drop the least recently used share of indexes (memory guard)"""
+        with self._lock:
+            count = math.ceil(len(self._indexes) * fraction)
+            for _ in range(count):
+                self._indexes.popitem(last=False)
+        return count
+
+    def get_stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "numpy_available": NUMPY_AVAILABLE,
+            "indexed_versions": len(self._indexes),
+            "indexed_chunks": sum(len(index) for index in self._indexes.values()),
+            "index_bytes": sum(index.matrix.nbytes for index in self._indexes.values())
+        }
+
+# Create global instance
+kb_semantic_retriever = SemanticKBRetriever()
+memory_monitor.register('kb_semantic_indexes', lambda: kb_semantic_retriever._indexes,
+                        kb_semantic_retriever.shrink, PRIORITY_INDEX)
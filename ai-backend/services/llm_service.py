@@ -1,7 +1,63 @@
+"""
+Text responses: OpenAI-compatible chat completions with a template fallback
+
+With OPENAI_API_KEY set, responses come from streaming chat completions
+(OPENAI_BASE_URL points the client at any OpenAI-compatible server, e.g.
+tools/fake_openai.py locally). The stream is cut into sentences as it
+arrives, so a voice turn can hand its first sentence to TTS while the rest is
+still being generated. Without a key, on errors, or when nothing arrived
+before the deadline, the keyword templates answer instead. Text-chat answers
+are cached (services/response_cache.py) and repeated or reworded questions are
+served from the cache before any model call.
+"""
 import os
-from typing import Dict, List
-import requests
-import json
+import re
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from services.deadline import Deadline, STAGE_LLM, stage_costs
+from services.kb_cache import kb_fingerprint
+from services.prompt_builder import prompt_builder
+from services.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+# Sentence end: terminal punctuation (Devanagari danda included), optional closing quote/bracket, then whitespace
+_SENTENCE_END = re.compile(r'[.!?\u0964]+["\')\]]*\s+')
+# Words whose trailing period does not end a sentence
+_ABBREVIATIONS = {'mr', 'mrs', 'ms', 'dr', 'st', 'vs', 'etc', 'e.g', 'i.e', 'approx', 'no'}
+
+
+class SentenceSplitter:
+    """Cuts streamed text into complete sentences"""
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Add streamed text; returns the sentences it completed"""
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self.buffer):
+            words = self.buffer[start:match.start()].split()
+            if words and words[-1].lower().rstrip('.') in _ABBREVIATIONS:
+                continue
+            sentence = self.buffer[start:match.end()].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """The unterminated rest once the stream is over"""
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return rest or None
+
 
 class LLMService:
     """
@@ -11,36 +67,234 @@ class LLMService:
     def __init__(self):
         self.hf_token = os.getenv('HUGGINGFACE_TOKEN')
         self.llm_model = "comprehensive_ai"
+        
+        # OpenAI (or OpenAI-compatible) chat completions
+        self.openai_api_key = os.getenv('OPENAI_API_KEY')
+        self.openai_configured = bool(self.openai_api_key) and self.openai_api_key != 'your_openai_api_key_here'
+        self.openai_base_url = os.getenv('OPENAI_BASE_URL') or None
+        self.openai_model = os.getenv('AI_MODEL', 'gpt-3.5-turbo')
+        self.max_tokens = int(os.getenv('MAX_TOKENS', 100))
+        self.temperature = float(os.getenv('TEMPERATURE', 0.7))
+        self.timeout = float(os.getenv('LLM_TIMEOUT_S', 10))
+        # Ask for token usage at the end of each stream (servers without stream_options support: false)
+        self.stream_usage = os.getenv('LLM_STREAM_USAGE', 'true').lower() == 'true'
+        self._client = None
+        if self.openai_configured:
+            # Importing openai takes most of a second - pay it at startup, not in the first turn
+            self._get_client()
+        
+        self.requests = 0
+        self.fallbacks = 0
+        self.truncated = 0
+        self.errors = 0
+        self.first_sentence_ms: Optional[float] = None
+    
+    def _get_client(self):
+        if self._client is None:
+            from openai import AsyncOpenAI
+            # No client retries: a retried voice turn would miss its deadline anyway
+            self._client = AsyncOpenAI(
+                api_key=self.openai_api_key,
+                base_url=self.openai_base_url,
+                timeout=self.timeout,
+                max_retries=0
+            )
+        return self._client
     
-    async def generate_response_with_knowledge(self, user_message: str, knowledge_articles: List[Dict] = None, company_info: Dict = None) -> Dict:
+    def build_messages(self, user_message: str, knowledge_articles: List[Dict] = None, company_info: Dict = None,
+                       history: List[Dict] = None, language: str = None, knowledge_context: str = None,
+                       knowledge_base: List = None, kb_version: str = None, summary: str = None) -> List[Dict]:
         """
-        Generate AI response using comprehensive response system
+        Chat messages for one turn (compiled company/KB prefix first - see services/prompt_builder.py)
+        
+        Args:
+            user_message (str): What the user said
+            knowledge_articles (List[Dict]): Retrieved KB articles/chunks, best first
+            company_info (Dict): Company information (system prompt)
+            history (List[Dict]): Earlier exchanges ({'user', 'ai'}), oldest first
+            language (str): Reply language of a voice turn (adds spoken-reply instructions)
+            knowledge_context (str): Pre-formatted block of knowledge_articles
+            knowledge_base (List): The company's complete KB, compiled into the prefix once per kb_version
+            kb_version (str): Fingerprint of knowledge_base
+            summary (str): Summary of the call's exchanges older than history
+            
+        Returns:
+            List[Dict]: OpenAI chat messages
+        """
+        return prompt_builder.build_messages(
+            user_message, company_info, knowledge_articles, history, language,
+            knowledge_context, knowledge_base, kb_version, summary
+        )
+    
+    async def stream_sentences(self, messages: List[Dict]) -> AsyncIterator[str]:
+        """
+        Stream a chat completion, yielding each sentence as soon as it is complete
+        
+        Raises:
+            openai.OpenAIError: request or stream failure
+        """
+        stream = await self._get_client().chat.completions.create(
+            model=self.openai_model,
+            messages=messages,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            stream=True,
+            **({"stream_options": {"include_usage": True}} if self.stream_usage else {})
+        )
+        splitter = SentenceSplitter()
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    # Final chunk (include_usage): prompt tokens and how many hit the provider's prefix cache
+                    details = chunk.usage.prompt_tokens_details
+                    prompt_builder.record_usage(chunk.usage.prompt_tokens, details.cached_tokens if details else 0)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    for sentence in splitter.feed(delta):
+                        yield sentence
+        finally:
+            await stream.close()
+        rest = splitter.flush()
+        if rest:
+            yield rest
+    
+    async def generate_streaming(self, messages: List[Dict], deadline: Deadline = None,
+                                 on_sentence: Callable[[str], Awaitable[None]] = None) -> Optional[Dict]:
+        """
+        Generate a response by streaming chat completion, bounded by the deadline
+        
+        Args:
+            messages (List[Dict]): Chat messages (build_messages)
+            deadline (Deadline): Request deadline; generation stops when only the reserve is left
+            on_sentence: Awaited with each sentence as it completes (e.g. to start TTS)
+            
+        Returns:
+            Dict: {'response', 'sentences', 'first_sentence_ms', 'truncated'}, or None when no
+            sentence arrived in time or the request failed (the caller falls back to templates)
+        """
+        if not self.openai_configured:
+            return None
+        self.requests += 1
+        if deadline is not None and not deadline.allows(STAGE_LLM):
+            self.fallbacks += 1
+            return None
+        
+        sentences: List[str] = []
+        first_sentence_ms = None
+        started = time.perf_counter()
+        
+        async def consume():
+            nonlocal first_sentence_ms
+            async for sentence in self.stream_sentences(messages):
+                if first_sentence_ms is None:
+                    first_sentence = time.perf_counter() - started
+                    stage_costs.observe(STAGE_LLM, first_sentence)
+                    first_sentence_ms = self.first_sentence_ms = round(first_sentence * 1000, 1)
+                sentences.append(sentence)
+                if on_sentence is not None:
+                    await on_sentence(sentence)
+        
+        budget = deadline.remaining() - deadline.reserve if deadline is not None else self.timeout
+        truncated = False
+        try:
+            await asyncio.wait_for(consume(), timeout=max(0.0, budget))
+        except asyncio.TimeoutError:
+            truncated = True
+            if deadline is not None:
+                deadline.degrade(STAGE_LLM)
+        except Exception as e:
+            truncated = True
+            self.errors += 1
+            logger.warning("LLM generation failed: %s", e)
+        
+        if not sentences:
+            self.fallbacks += 1
+            return None
+        if truncated:
+            # What was already streamed (and possibly spoken) stands
+            self.truncated += 1
+        return {
+            "response": ' '.join(sentences),
+            "sentences": sentences,
+            "first_sentence_ms": first_sentence_ms,
+            "truncated": truncated
+        }
+    
+    def _cache_scope(self, knowledge_articles: List[Dict] = None, company_info: Dict = None):
+        """(company, KB version) a text answer is cached under - the articles it was grounded in"""
+        company_info = company_info or {}
+        return str(company_info.get('id') or company_info.get('name') or ''), kb_fingerprint(knowledge_articles)
+    
+    def cached_response(self, user_message: str, knowledge_articles: List[Dict] = None, company_info: Dict = None) -> Optional[Dict]:
+        """
+        Answer to a text message from the response cache (exact or near-duplicate question)
+        
+        Args:
+            user_message (str): What the user said
+            knowledge_articles (List[Dict]): Relevant knowledge base articles
+            company_info (Dict): Company information ('id' or 'name' scopes the cache)
+            
+        Returns:
+            Optional[Dict]: Result as from generate_response_with_knowledge plus 'cache' ('exact' or 'near'),
+            or None on a miss
+        """
+        if not self.openai_configured:
+            # Only model answers are cached
+            return None
+        company, kb_version = self._cache_scope(knowledge_articles, company_info)
+        result, tier = response_cache.get(company, kb_version, user_message)
+        if result is None:
+            return None
+        return {**result, "cache": tier}
+    
+    async def generate_response_with_knowledge(self, user_message: str, knowledge_articles: List[Dict] = None,
+                                               company_info: Dict = None, check_cache: bool = True) -> Dict:
+        """
+        Generate AI response using the LLM (when configured) or the comprehensive response system
         
         Args:
             user_message (str): What the user said
             knowledge_articles (List[Dict]): Relevant knowledge base articles
             company_info (Dict): Company information
+            check_cache (bool): Serve a cached answer when there is one (False when the caller already looked)
             
         Returns:
             Dict: AI response with knowledge context
         """
-        print(f"LLM Service called with message: {user_message}")
+        logger.debug("LLM Service called with message: %.100s", user_message)
         try:
-            # Generate intelligent response
-            response = self._get_comprehensive_response(user_message)
-            print(f"Generated response: {response[:100]}...")
+            if check_cache:
+                cached = self.cached_response(user_message, knowledge_articles, company_info)
+                if cached is not None:
+                    return cached
+            result = None
+            if self.openai_configured:
+                result = await self.generate_streaming(self.build_messages(user_message, knowledge_articles, company_info))
+            if result is not None:
+                response = result["response"]
+                model_used, provider = self.openai_model, "openai"
+            else:
+                # Generate intelligent response
+                response = self._get_comprehensive_response(user_message)
+                model_used, provider = self.llm_model, "comprehensive_ai"
+            logger.debug("Generated response: %.100s...", response)
             
-            return {
+            answer = {
                 "response": response,
                 "knowledge_used": bool(knowledge_articles),
                 "knowledge_count": len(knowledge_articles) if knowledge_articles else 0,
-                "model_used": self.llm_model,
-                "provider": "comprehensive_ai",
+                "model_used": model_used,
+                "provider": provider,
                 "success": True
             }
+            if result is not None and not result["truncated"]:
+                response_cache.put(*self._cache_scope(knowledge_articles, company_info), user_message, answer)
+            return answer
             
         except Exception as e:
-            print(f"LLM Service error: {e}")
+            logger.error("LLM Service error: %s", e)
             return {
                 "response": "I apologize, but I'm experiencing technical difficulties. Please try again or contact our support team.",
                 "error": str(e),
@@ -115,20 +369,11 @@ Is there a specific aspect of {topic} you'd like to explore further?"""
         Returns:
             str: Formatted knowledge context
         """
-        if not knowledge_articles:
-            return "No specific knowledge base articles available for this query."
-        
-        context = ""
-        for i, article in enumerate(knowledge_articles[:3], 1):  # Limit to 3 articles
-            title = article.get("title", "Untitled")
-            content = article.get("content", "")[:300]  # Limit content length
-            context += f"{i}. {title}: {content}...\n\n"
-        
-        return context
+        return prompt_builder.knowledge_block(knowledge_articles)
     
     def get_system_prompt(self, company_context: Dict = None) -> str:
         """
-        Generate professional system prompt for AI based on company context
+        Professional system prompt for AI based on company context (compiled once per company)
         
         Args:
             company_context (Dict): Company-specific information
@@ -136,43 +381,21 @@ Is there a specific aspect of {topic} you'd like to explore further?"""
         Returns:
             str: Professional system prompt for AI
         """
-        base_prompt = """You are a professional AI customer service assistant. Your personality traits:
-
-        PROFESSIONAL BEHAVIOR:
-        - Always use polite, respectful language
-        - Address customers with courtesy ("Thank you", "Please", "I'd be happy to help")
-        - Maintain a calm, patient tone even with difficult customers
-        - Use proper grammar and complete sentences
-        
-        UNBIASED & INCLUSIVE:
-        - Treat all customers equally regardless of background
-        - Never make assumptions about gender, race, age, or personal circumstances
-        - Use inclusive language ("they/them" when gender unknown)
-        - Avoid cultural or regional stereotypes
-        
-        HELPFUL & SOLUTION-FOCUSED:
-        - Listen carefully to customer concerns
-        - Ask clarifying questions when needed
-        - Provide specific, actionable solutions
-        - If you cannot help, politely escalate to human support
-        
-        COMPANY REPRESENTATION:
-        - You represent the company professionally
-        - Acknowledge company responsibility when appropriate
-        - Follow company policies and procedures
-        - Protect customer privacy and confidentiality"""
-        
-        if company_context:
-            company_name = company_context.get("name", "the company")
-            base_prompt += f"\n\nCOMPANY CONTEXT:\n- You work for {company_name}\n- Answer as a {company_name} representative, not as TalkAI\n- Use company-specific knowledge to provide accurate information"
-            
-            if company_context.get("business_hours"):
-                hours = company_context.get("business_hours")
-                base_prompt += f"\n- Business hours: {hours}"
-        
-        base_prompt += "\n\nRemember: Be helpful, professional, respectful, and unbiased in all interactions."
-        
-        return base_prompt
+        return prompt_builder.system_prompt(company_context)
+    
+    def get_stats(self) -> Dict:
+        return {
+            "mode": "openai" if self.openai_configured else "template",
+            "model": self.openai_model if self.openai_configured else self.llm_model,
+            "base_url": self.openai_base_url,
+            "requests": self.requests,
+            "template_fallbacks": self.fallbacks,
+            "truncated_at_deadline": self.truncated,
+            "errors": self.errors,
+            "last_first_sentence_ms": self.first_sentence_ms,
+            "prompts": prompt_builder.get_stats(),
+            "response_cache": response_cache.get_stats()
+        }
 
 # Create global instance
-llm_service = LLMService()
\ No newline at end of file
+llm_service = LLMService()
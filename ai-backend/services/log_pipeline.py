@@ -0,0 +1,188 @@
+"""
+Non-blocking structured logging
+
+Application loggers hand records to a bounded in-memory queue; a background
+QueueListener thread does the message formatting and the stdout writes, so the
+event loop never waits on I/O. Every record carries the call_sid of the turn
+being processed (bound through a context variable), and verbose per-stage
+records (logged with extra={'stage': ...}) are sampled per call and shed
+entirely when the queue backs up.
+"""
+import os
+import sys
+import time
+import queue
+import atexit
+import logging
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from services import json_codec
+
+call_sid_var: ContextVar[Optional[str]] = ContextVar('call_sid', default=None)
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime', 'call_sid'}
+
+
+class LogStats:
+    """Overhead counters for /metrics"""
+
+    def __init__(self):
+        self.enqueued = 0
+        self.sampled_out = 0
+        self.shed = 0
+        self.dropped_queue_full = 0
+        self.enqueue_seconds = 0.0
+        self.queue = None
+
+    def get_stats(self) -> Dict:
+        return {
+            "enqueued": self.enqueued,
+            "sampled_out": self.sampled_out,
+            "shed_under_load": self.shed,
+            "dropped_queue_full": self.dropped_queue_full,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "enqueue_us_avg": round(self.enqueue_seconds * 1e6 / self.enqueued, 2) if self.enqueued else 0.0
+        }
+
+
+class CallContextFilter(logging.Filter):
+    """Stamps record.call_sid and applies sampling to verbose per-stage records"""
+
+    def __init__(self, sample_rate: float = 1.0, high_water: int = 0):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.high_water = high_water
+        self._threshold = int(sample_rate * 0xFFFFFFFF)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        call_sid = call_sid_var.get()
+        if call_sid is not None or not hasattr(record, 'call_sid'):
+            record.call_sid = call_sid
+        call_sid = record.call_sid
+        if record.levelno >= logging.WARNING or not hasattr(record, 'stage'):
+            return True
+
+        if self.high_water and log_stats.queue is not None and log_stats.queue.qsize() >= self.high_water:
+            log_stats.shed += 1
+            return False
+        if self.sample_rate < 1.0:
+            # Per-call decision: a sampled call keeps all of its stage lines
+            key = (call_sid or record.name).encode('utf-8', 'replace')
+            if zlib.crc32(key) > self._threshold:
+                log_stats.sampled_out += 1
+                return False
+        return True
+
+
+class BoundedQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the caller and defers formatting to the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Same process, so the record (msg + args) can be formatted later by the listener
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_stats.dropped_queue_full += 1
+
+    def emit(self, record: logging.LogRecord):
+        started = time.perf_counter()
+        try:
+            self.enqueue(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+        log_stats.enqueue_seconds += time.perf_counter() - started
+        log_stats.enqueued += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, call_sid, message plus `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'call_sid': getattr(record, 'call_sid', None),
+            'message': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        return json_codec.dumps(payload).decode('utf-8')
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(call_sid)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, 'call_sid'):
+            record.call_sid = None
+        return super().format(record)
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging():
+    """
+    Route application logging through the background queue (idempotent)
+
+    Environment:
+        LOG_LEVEL: root level (default INFO)
+        LOG_FORMAT: 'json' or 'text' (default text)
+        LOG_QUEUE_SIZE: max queued records before new ones are dropped (default 10000)
+        LOG_STAGE_SAMPLE_RATE: fraction of calls whose per-stage lines are kept (default 1.0)
+        LOG_STAGE_HIGH_WATER: queue depth at which per-stage lines are shed (default 1000, 0 = never)
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', 10000)))
+    log_stats.queue = log_queue
+
+    output = logging.StreamHandler(sys.stdout)
+    if os.getenv('LOG_FORMAT', 'text').lower() == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(TextFormatter())
+
+    handler = BoundedQueueHandler(log_queue)
+    handler.addFilter(CallContextFilter(
+        sample_rate=float(os.getenv('LOG_STAGE_SAMPLE_RATE', 1.0)),
+        high_water=int(os.getenv('LOG_STAGE_HIGH_WATER', 1000))
+    ))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    # httpx logs every provider request at INFO
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+# Global instance
+log_stats = LogStats()
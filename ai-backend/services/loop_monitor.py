@@ -0,0 +1,192 @@
+"""
+Event-loop lag monitor and blocking-call detector
+
+STT/TTS and the CPU-heavy engine code run inside `async def` handlers, so any
+synchronous stretch holds the one event loop and every other call waits.
+A probe coroutine wakes every LOOP_MONITOR_INTERVAL_MS and records how late it
+was (lag histogram). Admission control sheds on the sustained lag: the 75th
+percentile of the last LOOP_LAG_WINDOW samples, so one stall (a GC pause, the
+first request loading a model) does not count, and samples from the first
+LOOP_MONITOR_WARMUP_S after start are left out of it entirely. A watchdog thread watches the probe's heartbeat; when it
+is older than LOOP_STALL_THRESHOLD_MS the loop is blocked, and the watchdog
+grabs the loop thread's stack (sys._current_frames) and charges the stall to
+the innermost application frame - the function that is holding the loop.
+Top offenders by blocked time are exported on /metrics.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Frames under this directory (ai-backend/) count as application code
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LAG_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+_STACK_DEPTH = 12
+_MAX_OFFENDERS = 200
+
+
+def _is_app_frame(filename: str) -> bool:
+    return (filename.startswith(_APP_ROOT) and 'site-packages' not in filename
+            and not filename.endswith('loop_monitor.py'))
+
+
+def _short_path(filename: str) -> str:
+    return os.path.relpath(filename, _APP_ROOT) if filename.startswith(_APP_ROOT) else filename
+
+
+def _offender(frame) -> Optional[Dict]:
+    """Innermost application frame of a stack plus a short formatted stack"""
+    stack = traceback.extract_stack(frame)
+    app_frames = [entry for entry in stack if _is_app_frame(entry.filename)]
+    culprit = app_frames[-1] if app_frames else (stack[-1] if stack else None)
+    if culprit is None:
+        return None
+    return {
+        "location": f"{_short_path(culprit.filename)}:{culprit.name}",
+        "line": culprit.lineno,
+        "stack": [f"{_short_path(entry.filename)}:{entry.lineno} {entry.name}" for entry in stack[-_STACK_DEPTH:]]
+    }
+
+
+class LoopMonitor:
+    """Lag histogram from a probe coroutine plus a watchdog thread that samples stalls"""
+
+    def __init__(self):
+        self.enabled = os.getenv('LOOP_MONITOR_ENABLED', 'true').lower() == 'true'
+        self.interval = float(os.getenv('LOOP_MONITOR_INTERVAL_MS', 50)) / 1000
+        self.stall_threshold = float(os.getenv('LOOP_STALL_THRESHOLD_MS', 100)) / 1000
+        self.warmup = float(os.getenv('LOOP_MONITOR_WARMUP_S', 10))
+        self.last_lag = 0.0
+        self.lag_window = deque(maxlen=int(os.getenv('LOOP_LAG_WINDOW', 20)))
+        self.max_lag = 0.0
+        self.samples = 0
+        self.histogram = [0] * (len(_LAG_BUCKETS_MS) + 1)
+        self.stalls = 0
+        self.offenders: Dict[str, Dict] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._probe: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._heartbeat = time.monotonic()
+        self._warm_until = 0.0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start monitoring the running loop (idempotent; restarts on a new loop)"""
+        if not self.enabled:
+            return
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._probe is not None and not self._probe.done():
+            return
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._warm_until = self._heartbeat + self.warmup
+        self._probe = loop.create_task(self._run_probe())
+        if self._watchdog is None or not self._watchdog.is_alive():
+            self._watchdog = threading.Thread(target=self._run_watchdog, name='loop-watchdog', daemon=True)
+            self._watchdog.start()
+
+    async def _run_probe(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self._heartbeat = time.monotonic()
+            self.record_lag(max(0.0, loop.time() - expected))
+
+    def record_lag(self, lag: float):
+        self.samples += 1
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        if time.monotonic() >= self._warm_until:
+            self.lag_window.append(lag)
+        lag_ms = lag * 1000
+        for index, bound in enumerate(_LAG_BUCKETS_MS):
+            if lag_ms <= bound:
+                self.histogram[index] += 1
+                return
+        self.histogram[-1] += 1
+
+    @property
+    def sustained_lag(self) -> float:
+        """75th percentile of the lag window (seconds); 0 until the window has filled"""
+        if len(self.lag_window) < self.lag_window.maxlen:
+            return 0.0
+        return sorted(self.lag_window)[int(len(self.lag_window) * 0.75)]
+
+    def _run_watchdog(self):
+        stall = None
+        while True:
+            time.sleep(min(self.stall_threshold / 2, 0.05))
+            loop = self._loop
+            if loop is None or loop.is_closed():
+                return
+            blocked_for = time.monotonic() - self._heartbeat - self.interval
+            if blocked_for >= self.stall_threshold:
+                if stall is None:
+                    frame = sys._current_frames().get(self._loop_thread_id)
+                    stall = _offender(frame) if frame is not None else None
+                    if stall is not None:
+                        stall['heartbeat'] = self._heartbeat
+            elif stall is not None:
+                # The loop is running again: charge the whole stall to the sampled offender
+                self._record_stall(stall, blocked_for_total=self._heartbeat - stall['heartbeat'] - self.interval)
+                stall = None
+
+    def _record_stall(self, stall: Dict, blocked_for_total: float):
+        blocked_for_total = max(blocked_for_total, self.stall_threshold)
+        with self._lock:
+            self.stalls += 1
+            entry = self.offenders.get(stall['location'])
+            if entry is None:
+                if len(self.offenders) >= _MAX_OFFENDERS:
+                    smallest = min(self.offenders, key=lambda key: self.offenders[key]['blocked_seconds'])
+                    del self.offenders[smallest]
+                entry = self.offenders[stall['location']] = {'stalls': 0, 'blocked_seconds': 0.0, 'max_seconds': 0.0}
+            entry['stalls'] += 1
+            entry['blocked_seconds'] += blocked_for_total
+            entry['max_seconds'] = max(entry['max_seconds'], blocked_for_total)
+            entry['line'] = stall['line']
+            entry['stack'] = stall['stack']
+        logger.warning("Event loop blocked for %.0f ms in %s (line %s)",
+                       blocked_for_total * 1000, stall['location'], stall['line'])
+
+    def top_offenders(self, limit: int = 10) -> List[Dict]:
+        with self._lock:
+            ranked = sorted(self.offenders.items(), key=lambda item: item[1]['blocked_seconds'], reverse=True)[:limit]
+            return [{
+                "location": location,
+                "stalls": entry['stalls'],
+                "blocked_ms_total": round(entry['blocked_seconds'] * 1000, 1),
+                "blocked_ms_max": round(entry['max_seconds'] * 1000, 1),
+                "last_line": entry['line'],
+                "last_stack": entry['stack']
+            } for location, entry in ranked]
+
+    def get_stats(self) -> Dict:
+        labels = [f"le_{bound}ms" for bound in _LAG_BUCKETS_MS] + ["gt_2500ms"]
+        return {
+            "enabled": self.enabled,
+            "interval_ms": self.interval * 1000,
+            "stall_threshold_ms": self.stall_threshold * 1000,
+            "samples": self.samples,
+            "lag_ms": {
+                "last": round(self.last_lag * 1000, 2),
+                "sustained_p75": round(self.sustained_lag * 1000, 2),
+                "max": round(self.max_lag * 1000, 2)
+            },
+            "lag_histogram": dict(zip(labels, self.histogram)),
+            "stalls": self.stalls,
+            "top_offenders": self.top_offenders()
+        }
+
+# Global instance
+loop_monitor = LoopMonitor()
@@ -0,0 +1,331 @@
+"""
+Memory accounting and RSS guard
+
+The service runs on a 256 MB VM, and conversation state, cached KB results,
+semantic indexes and traces all live in process memory. Subsystems register
+the container they keep (plus an eviction hook when they can shrink). The
+monitor reports each container's entry count and approximate deep size
+(sampled, so it stays cheap on large dicts), and on demand it diffs
+tracemalloc snapshots grouped by module or package.
+
+The guard checks RSS every MEMORY_CHECK_INTERVAL_S. Once RSS passes
+MEMORY_EVICT_AT of MEMORY_RSS_LIMIT_MB it evicts subsystems in priority order
+(caches before live conversation state) until RSS falls back below the mark.
+"""
+import os
+import gc
+import sys
+import time
+import asyncio
+import logging
+import tracemalloc
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_STDLIB_ROOT = os.path.dirname(os.__file__)
+_SIZE_SAMPLE = 64
+_MAX_DEPTH = 8
+
+# Eviction order: cheapest to rebuild first
+PRIORITY_CACHE = 0
+PRIORITY_INDEX = 1
+PRIORITY_CONVERSATION = 2
+
+try:
+    import ctypes
+    _libc = ctypes.CDLL("libc.so.6")
+    # glibc keeps freed arenas mapped; malloc_trim hands them back so evictions show in RSS
+    _malloc_trim = _libc.malloc_trim
+except (ImportError, OSError, AttributeError):
+    _malloc_trim = None
+
+
+def current_rss() -> int:
+    """Resident set size in bytes (Linux /proc; peak RSS elsewhere)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _deep_size(obj: Any, seen: set, depth: int = 0) -> int:
+    if id(obj) in seen or depth > _MAX_DEPTH:
+        return 0
+    seen.add(id(obj))
+    nbytes = getattr(obj, 'nbytes', None)
+    if isinstance(nbytes, int):
+        # numpy arrays: the buffer, not just the header
+        return sys.getsizeof(obj) + (nbytes if getattr(obj, 'base', None) is None else 0)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += _deep_size(key, seen, depth + 1) + _deep_size(value, seen, depth + 1)
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        for item in obj:
+            size += _deep_size(item, seen, depth + 1)
+    else:
+        if hasattr(obj, '__dict__'):
+            size += _deep_size(vars(obj), seen, depth + 1)
+        for slot in getattr(type(obj), '__slots__', ()):
+            if hasattr(obj, slot):
+                size += _deep_size(getattr(obj, slot), seen, depth + 1)
+    return size
+
+
+def approx_size(container: Any, sample: int = _SIZE_SAMPLE) -> int:
+    """
+    Approximate deep size of a container in bytes
+
+    Dicts, lists and deques larger than `sample` entries are measured on their
+    first `sample` entries and extrapolated.
+    """
+    seen: set = set()
+    if isinstance(container, (dict, list, deque)) and len(container) > sample:
+        items = container.items() if isinstance(container, dict) else container
+        measured = 0
+        for count, item in enumerate(items):
+            if count == sample:
+                break
+            measured += _deep_size(item, seen)
+        return sys.getsizeof(container) + int(measured * len(container) / sample)
+    return _deep_size(container, seen)
+
+
+def _short_filename(filename: str) -> str:
+    """App-relative, site-packages-relative or 'stdlib:'-prefixed path of a source file"""
+    if filename.startswith(_APP_ROOT) and 'site-packages' not in filename:
+        return os.path.relpath(filename, _APP_ROOT)
+    marker = 'site-packages' + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    if filename.startswith(_STDLIB_ROOT):
+        return 'stdlib:' + os.path.relpath(filename, _STDLIB_ROOT)
+    return filename
+
+
+def _module_of(filename: str) -> str:
+    """Group key of an allocation site: app file, third-party package or stdlib module"""
+    short = _short_filename(filename)
+    if short == filename or (filename.startswith(_APP_ROOT) and 'site-packages' not in filename):
+        return short
+    # Packages and stdlib modules are grouped by their top-level name
+    return short.split(os.sep, 1)[0]
+
+
+class _Subsystem:
+    __slots__ = ('name', 'container', 'evict', 'priority')
+
+    def __init__(self, name: str, container: Callable[[], Any], evict: Optional[Callable[[float], int]], priority: int):
+        self.name = name
+        self.container = container
+        self.evict = evict
+        self.priority = priority
+
+
+class MemoryMonitor:
+    """Per-subsystem memory report, tracemalloc diffs and the RSS eviction guard"""
+
+    def __init__(self):
+        self.rss_limit = float(os.getenv('MEMORY_RSS_LIMIT_MB', 0)) * 1024 * 1024
+        self.evict_at = float(os.getenv('MEMORY_EVICT_AT', 0.85))
+        self.evict_fraction = float(os.getenv('MEMORY_EVICT_FRACTION', 0.5))
+        self.check_interval = float(os.getenv('MEMORY_CHECK_INTERVAL_S', 5))
+        self.subsystems: Dict[str, _Subsystem] = {}
+        self.peak_rss = 0
+        self.guard_runs = 0
+        self.evicted: Dict[str, int] = {}
+        self.last_eviction: Optional[Dict] = None
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._guard: Optional[asyncio.Task] = None
+        self._guard_loop = None
+
+    def register(self, name: str, container: Callable[[], Any], evict: Callable[[float], int] = None,
+                 priority: int = PRIORITY_CACHE):
+        """
+        Track a subsystem's memory
+
+        Args:
+            name (str): Report key
+            container (Callable): Returns the object holding the subsystem's data
+            evict (Callable): evict(fraction) drops that share of entries and returns how many (None = not evictable)
+            priority (int): Eviction order (PRIORITY_* - lower goes first)
+        """
+        self.subsystems[name] = _Subsystem(name, container, evict, priority)
+
+    @property
+    def threshold(self) -> float:
+        return self.rss_limit * self.evict_at
+
+    def start(self):
+        """Start the RSS guard on the running loop (idempotent; only with MEMORY_RSS_LIMIT_MB set)"""
+        if not self.rss_limit:
+            return
+        loop = asyncio.get_running_loop()
+        if self._guard_loop is loop and self._guard is not None and not self._guard.done():
+            return
+        self._guard_loop = loop
+        self._guard = loop.create_task(self._run_guard())
+
+    async def _run_guard(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            rss = current_rss()
+            self.peak_rss = max(self.peak_rss, rss)
+            if rss >= self.threshold:
+                self.guard_runs += 1
+                self.evict(self.evict_fraction, reason='rss')
+
+    def evict(self, fraction: float, reason: str = 'manual') -> Dict:
+        """
+        Shrink evictable subsystems, lowest priority first, until RSS is under the guard threshold
+
+        Returns:
+            Dict: entries evicted per subsystem and RSS before/after
+        """
+        before = current_rss()
+        evicted: Dict[str, int] = {}
+        for priority in sorted({subsystem.priority for subsystem in self.subsystems.values()}):
+            for subsystem in self.subsystems.values():
+                if subsystem.priority == priority and subsystem.evict is not None:
+                    count = subsystem.evict(fraction)
+                    if count:
+                        evicted[subsystem.name] = count
+                        self.evicted[subsystem.name] = self.evicted.get(subsystem.name, 0) + count
+            gc.collect()
+            if _malloc_trim is not None:
+                _malloc_trim(0)
+            if reason == 'rss' and current_rss() < self.threshold:
+                break
+        after = current_rss()
+        self.last_eviction = {
+            "reason": reason,
+            "at": time.time(),
+            "evicted": evicted,
+            "rss_mb_before": round(before / 1048576, 1),
+            "rss_mb_after": round(after / 1048576, 1)
+        }
+        logger.warning("Memory eviction (%s): %s, RSS %.1f -> %.1f MB", reason, evicted or 'nothing evictable',
+                       before / 1048576, after / 1048576)
+        return self.last_eviction
+
+    def subsystem_report(self) -> Dict[str, Dict]:
+        report = {}
+        for subsystem in self.subsystems.values():
+            container = subsystem.container()
+            report[subsystem.name] = {
+                "entries": len(container) if hasattr(container, '__len__') else None,
+                "approx_mb": round(approx_size(container) / 1048576, 3),
+                "evictable": subsystem.evict is not None
+            }
+        return report
+
+    @staticmethod
+    def object_counts(limit: int = 25) -> List[Dict]:
+        """Live gc-tracked objects by type (walks the whole heap - admin use only)"""
+        counts: Dict[str, int] = {}
+        for obj in gc.get_objects():
+            name = type(obj).__qualname__
+            counts[name] = counts.get(name, 0) + 1
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [{"type": name, "count": count} for name, count in ranked]
+
+    # tracemalloc sessions (admin API); tracing slows allocation down, so it is off by default
+
+    def start_tracing(self, frames: int = 1) -> Dict:
+        """Start tracemalloc (if needed) and take the baseline snapshot"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._baseline = tracemalloc.take_snapshot()
+        return self.tracing_status()
+
+    def stop_tracing(self) -> Dict:
+        self._baseline = None
+        tracemalloc.stop()
+        return self.tracing_status()
+
+    def tracing_status(self) -> Dict:
+        traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "has_baseline": self._baseline is not None,
+            "traced_mb": round(traced / 1048576, 3),
+            "traced_peak_mb": round(peak / 1048576, 3)
+        }
+
+    def snapshot_diff(self, group: str = 'module', limit: int = 25, reset: bool = False) -> Dict:
+        """
+        Allocation growth since the baseline snapshot
+
+        Args:
+            group (str): 'module' (app file / package / stdlib module) or 'line'
+            limit (int): Rows to return, by size growth
+            reset (bool): Make this snapshot the new baseline
+
+        Returns:
+            Dict: rows of size/count now and their change since the baseline
+        """
+        if not tracemalloc.is_tracing() or self._baseline is None:
+            raise RuntimeError("tracemalloc is not running - start a session first")
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>')
+        ]
+        snapshot = tracemalloc.take_snapshot().filter_traces(filters)
+        baseline = self._baseline.filter_traces(filters)
+        rows: Dict[str, Dict] = {}
+        for stat in snapshot.compare_to(baseline, 'lineno' if group == 'line' else 'filename'):
+            frame = stat.traceback[0]
+            if group == 'line':
+                key = f"{_short_filename(frame.filename)}:{frame.lineno}"
+            else:
+                key = _module_of(frame.filename)
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = {"size": 0, "size_diff": 0, "count": 0, "count_diff": 0}
+            row["size"] += stat.size
+            row["size_diff"] += stat.size_diff
+            row["count"] += stat.count
+            row["count_diff"] += stat.count_diff
+        if reset:
+            self._baseline = snapshot
+        ranked = sorted(rows.items(), key=lambda item: item[1]["size_diff"], reverse=True)[:limit]
+        return {
+            "group": group,
+            "rows": [{
+                "where": key,
+                "size_kb": round(row["size"] / 1024, 1),
+                "size_diff_kb": round(row["size_diff"] / 1024, 1),
+                "count": row["count"],
+                "count_diff": row["count_diff"]
+            } for key, row in ranked],
+            **self.tracing_status()
+        }
+
+    def get_stats(self) -> Dict:
+        rss = current_rss()
+        self.peak_rss = max(self.peak_rss, rss)
+        return {
+            "rss_mb": round(rss / 1048576, 1),
+            "peak_rss_mb": round(self.peak_rss / 1048576, 1),
+            "guard": {
+                "rss_limit_mb": round(self.rss_limit / 1048576, 1) if self.rss_limit else None,
+                "evict_at_mb": round(self.threshold / 1048576, 1) if self.rss_limit else None,
+                "runs": self.guard_runs,
+                "evicted": dict(self.evicted),
+                "last_eviction": self.last_eviction
+            },
+            "subsystems": self.subsystem_report(),
+            "tracemalloc": self.tracing_status()
+        }
+
+# Global instance
+memory_monitor = MemoryMonitor()
@@ -0,0 +1,201 @@
+"""
+Production profiling: on-demand stack sampling and per-turn stage timings
+
+SamplingProfiler runs a background thread that, for a fixed number of
+seconds, snapshots every thread's stack (sys._current_frames) at
+PROFILER_SAMPLE_HZ and folds them into collapsed stacks ("a;b;c 42" lines),
+the input format of flamegraph.pl and speedscope. No thread exists between
+sessions, so an idle profiler costs nothing.
+
+A turn opts into a TurnProfile with the X-Profile-Turn header; the engine's
+turn_stage() blocks then record how long each stage took and the response
+carries them in a Server-Timing header. The same blocks are the child spans of
+a traced turn (services/tracing.py); with neither, turn_stage() is two
+context-variable lookups.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from services.tracing import current_span_var, tracer
+
+logger = logging.getLogger(__name__)
+
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_NO_STAGE = nullcontext()
+
+# Profile of the current turn (X-Profile-Turn); None for unprofiled requests
+turn_profile_var: ContextVar[Optional['TurnProfile']] = ContextVar('turn_profile', default=None)
+
+
+class ProfilerBusyError(Exception):
+    """A sampling session is already running"""
+    pass
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(_APP_ROOT):
+        filename = os.path.relpath(filename, _APP_ROOT)
+    else:
+        filename = os.path.basename(filename)
+    return f"{filename}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """Wall-clock stack sampler for the whole process, one session at a time"""
+
+    def __init__(self):
+        self.default_hz = float(os.getenv('PROFILER_SAMPLE_HZ', 100))
+        self.max_seconds = float(os.getenv('PROFILER_MAX_SECONDS', 60))
+        self.sessions = 0
+        self.last_session: Optional[Dict] = None
+        self._running = False
+
+    def _sample(self, seconds: float, hz: float, main_only: bool) -> Tuple[Counter, int, float]:
+        stacks: Counter = Counter()
+        labels: Dict = {}
+        own_thread = threading.get_ident()
+        main_thread = threading.main_thread().ident
+        interval = 1.0 / hz
+        samples = 0
+        sampling_time = 0.0
+        deadline = time.perf_counter() + seconds
+        next_tick = time.perf_counter()
+        while True:
+            next_tick += interval
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if next_tick > now:
+                time.sleep(next_tick - now)
+            started = time.perf_counter()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread or (main_only and thread_id != main_thread):
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(code)
+                    names.append(label)
+                    frame = frame.f_back
+                names.reverse()
+                stacks[';'.join(names)] += 1
+            samples += 1
+            sampling_time += time.perf_counter() - started
+        return stacks, samples, sampling_time
+
+    async def profile(self, seconds: float, hz: float = None, main_only: bool = False) -> Dict:
+        """
+        Sample all thread stacks for a while (the event loop keeps serving meanwhile)
+
+        Args:
+            seconds (float): Session length (capped at PROFILER_MAX_SECONDS)
+            hz (float): Samples per second (PROFILER_SAMPLE_HZ by default, at most 1000)
+            main_only (bool): Only the main thread (the event loop under uvicorn)
+
+        Returns:
+            Dict: collapsed stacks plus session metadata
+
+        Raises:
+            ProfilerBusyError: another session is still running
+        """
+        if self._running:
+            raise ProfilerBusyError("A profiling session is already running")
+        seconds = max(0.1, min(float(seconds), self.max_seconds))
+        hz = max(1.0, min(float(hz or self.default_hz), 1000.0))
+        self._running = True
+        try:
+            logger.info("Sampling profiler started (%.1f s at %.0f Hz)", seconds, hz)
+            stacks, samples, sampling_time = await asyncio.to_thread(self._sample, seconds, hz, main_only)
+        finally:
+            self._running = False
+        self.sessions += 1
+        self.last_session = {
+            "seconds": seconds,
+            "hz": hz,
+            "samples": samples,
+            # Time the sampler held the GIL - what the sampled process lost to profiling
+            "overhead_percent": round(sampling_time * 100 / seconds, 2)
+        }
+        logger.info("Sampling profiler finished: %d samples, %.2f%% overhead", samples, self.last_session["overhead_percent"])
+        return {**self.last_session, "stacks": stacks}
+
+    @staticmethod
+    def collapsed(stacks: Counter) -> str:
+        """Collapsed-stack text (flamegraph.pl / speedscope input)"""
+        return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    @staticmethod
+    def top_functions(stacks: Counter, limit: int = 25) -> Dict[str, List[Dict]]:
+        """Functions by self samples (innermost frame) and by total samples (anywhere on the stack)"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        return {
+            "self": [{"function": name, "samples": count} for name, count in own.most_common(limit)],
+            "total": [{"function": name, "samples": count} for name, count in total.most_common(limit)]
+        }
+
+    def get_stats(self) -> Dict:
+        return {
+            "running": self._running,
+            "sessions": self.sessions,
+            "last_session": self.last_session
+        }
+
+
+class TurnProfile:
+    """Stage durations of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - started))
+
+    def server_timing(self) -> str:
+        """Server-Timing header value (durations in ms, stages in completion order)"""
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ', '.join(entries)
+
+
+def turn_stage(name: str):
+    """Time a stage of the current turn: a child span when traced, a Server-Timing entry when profiled"""
+    profile = turn_profile_var.get()
+    if current_span_var.get() is None:
+        return _NO_STAGE if profile is None else profile.stage(name)
+    return _traced_stage(name, profile)
+
+
+@contextmanager
+def _traced_stage(name: str, profile: Optional[TurnProfile]):
+    with tracer.span(name):
+        if profile is None:
+            yield
+        else:
+            with profile.stage(name):
+                yield
+
+# Global instance
+sampling_profiler = SamplingProfiler()
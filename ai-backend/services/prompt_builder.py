@@ -0,0 +1,291 @@
+"""
+Prompt assembly for LLM requests
+
+Every chat request used to rebuild the ~1.3 KB system prompt and re-format
+its KB articles, and the retrieved KB text sat inside the system prompt, so
+no two turns shared a prompt prefix. PromptBuilder compiles each company's
+system prompt once and, when the engine holds the company's whole knowledge
+base and it fits PROMPT_PREFIX_KB_CHARS, appends the formatted KB once per KB
+version. Messages are ordered from most to least stable:
+
+    system   compiled prefix (company prompt [+ whole KB])  - same bytes every turn
+    system   summary of the call's older exchanges           - changes as exchanges age out
+    history  recent exchanges of the call
+    system   this turn's retrieved passages / reply language
+    user     the utterance
+
+so providers with prompt-prefix caching (OpenAI, vLLM, ...) reuse the prefix
+across turns and calls of a tenant. Token counts are estimated locally at
+compile time and reconciled with the provider's reported usage (prompt and
+cached tokens) when the stream returns it.
+"""
+import os
+import math
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from services.memory_monitor import memory_monitor
+
+logger = logging.getLogger(__name__)
+
+BASE_SYSTEM_PROMPT = """You are a professional AI customer service assistant. Your personality traits:
+
+PROFESSIONAL BEHAVIOR:
+- Always use polite, respectful language
+- Address customers with courtesy ("Thank you", "Please", "I'd be happy to help")
+- Maintain a calm, patient tone even with difficult customers
+- Use proper grammar and complete sentences
+
+UNBIASED & INCLUSIVE:
+- Treat all customers equally regardless of background
+- Never make assumptions about gender, race, age, or personal circumstances
+- Use inclusive language ("they/them" when gender unknown)
+- Avoid cultural or regional stereotypes
+
+HELPFUL & SOLUTION-FOCUSED:
+- Listen carefully to customer concerns
+- Ask clarifying questions when needed
+- Provide specific, actionable solutions
+- If you cannot help, politely escalate to human support
+
+COMPANY REPRESENTATION:
+- You represent the company professionally
+- Acknowledge company responsibility when appropriate
+- Follow company policies and procedures
+- Protect customer privacy and confidentiality"""
+
+# Articles and characters per article in a retrieved-passages block
+KNOWLEDGE_BLOCK_ARTICLES = 3
+KNOWLEDGE_BLOCK_ARTICLE_CHARS = 300
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count (~4 UTF-8 bytes per token for BPE vocabularies)"""
+    return (len(text.encode('utf-8')) + 3) // 4
+
+
+class CompiledPrefix:
+    """Stable leading system message of a company (and KB version)"""
+
+    __slots__ = ('text', 'message', 'tokens', 'kb_included')
+
+    def __init__(self, text: str, kb_included: bool):
+        self.text = text
+        self.message = {"role": "system", "content": text}
+        self.tokens = estimate_tokens(text)
+        self.kb_included = kb_included
+
+
+class PromptBuilder:
+    """Compiles and caches per-company prompt prefixes; assembles chat messages"""
+
+    def __init__(self):
+        self.max_entries = int(os.getenv('PROMPT_CACHE_SIZE', 256))
+        self.prefix_kb_chars = int(os.getenv('PROMPT_PREFIX_KB_CHARS', 8000))
+        self._system_prompts: 'OrderedDict[Tuple, str]' = OrderedDict()
+        self._prefixes: 'OrderedDict[Tuple, CompiledPrefix]' = OrderedDict()
+        self._language_notes: Dict[str, str] = {}
+        self.compiled = 0
+        self.hits = 0
+        self.builds = 0
+        self.estimated_prompt_tokens = 0
+        self.estimated_prefix_tokens = 0
+        self.usage_reports = 0
+        self.provider_prompt_tokens = 0
+        self.provider_cached_tokens = 0
+
+    @staticmethod
+    def _company_key(company_info: Optional[Dict]) -> Tuple:
+        if not company_info:
+            return ()
+        return company_info.get("name", "the company"), company_info.get("business_hours")
+
+    def _remember(self, cache: OrderedDict, key: Tuple, value):
+        cache[key] = value
+        if len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+    def system_prompt(self, company_info: Dict = None) -> str:
+        """
+        Company system prompt, compiled once per (name, business hours)
+
+        Args:
+            company_info (Dict): Company-specific information ('name', 'business_hours')
+
+        Returns:
+            str: System prompt
+        """
+        key = self._company_key(company_info)
+        prompt = self._system_prompts.get(key)
+        if prompt is not None:
+            self._system_prompts.move_to_end(key)
+            return prompt
+
+        prompt = BASE_SYSTEM_PROMPT
+        if key:
+            company_name, hours = key
+            prompt += (f"\n\nCOMPANY CONTEXT:\n- You work for {company_name}\n"
+                       f"- Answer as a {company_name} representative, not as TalkAI\n"
+                       "- Use company-specific knowledge to provide accurate information")
+            if hours:
+                prompt += f"\n- Business hours: {hours}"
+        prompt += "\n\nRemember: Be helpful, professional, respectful, and unbiased in all interactions."
+        self._remember(self._system_prompts, key, prompt)
+        return prompt
+
+    @staticmethod
+    def knowledge_block(articles: List[Dict]) -> str:
+        """
+        Retrieved-passages block (best articles first, each cut short)
+
+        Args:
+            articles (List[Dict]): KB articles/chunks with 'title' and 'content'
+
+        Returns:
+            str: Numbered "title: content..." lines
+        """
+        if not articles:
+            return "No specific knowledge base articles available for this query."
+        return ''.join(
+            f"{i}. {article.get('title', 'Untitled')}: {article.get('content', '')[:KNOWLEDGE_BLOCK_ARTICLE_CHARS]}...\n\n"
+            for i, article in enumerate(articles[:KNOWLEDGE_BLOCK_ARTICLES], 1)
+        )
+
+    def _full_knowledge_block(self, knowledge_base: List) -> Optional[str]:
+        """The whole KB in document order, or None if it does not fit PROMPT_PREFIX_KB_CHARS"""
+        parts = []
+        size = 0
+        for i, item in enumerate(item for item in knowledge_base if isinstance(item, dict)):
+            content = item.get('content') or ''
+            if not content:
+                continue
+            part = f"{i + 1}. {item.get('title', 'Untitled')}: {content.strip()}\n"
+            size += len(part)
+            if size > self.prefix_kb_chars:
+                return None
+            parts.append(part)
+        return ''.join(parts) or None
+
+    def prefix(self, company_info: Dict = None, knowledge_base: List = None, kb_version: str = None) -> CompiledPrefix:
+        """
+        Compiled prefix of a company, with its whole KB when known and small enough
+
+        Args:
+            company_info (Dict): Company-specific information
+            knowledge_base (List): The company's complete KB (never a per-question selection)
+            kb_version (str): Fingerprint of the complete KB - the prefix is compiled once per version and
+                also serves requests that only carry candidates of that version
+
+        Returns:
+            CompiledPrefix: Byte-identical for every turn with the same company and KB version
+        """
+        company = self._company_key(company_info)
+        keys = ((company, kb_version), (company, None)) if kb_version else ((company, None),)
+        for key in keys:
+            prefix = self._prefixes.get(key)
+            if prefix is not None:
+                self._prefixes.move_to_end(key)
+                self.hits += 1
+                return prefix
+            if knowledge_base:
+                break
+
+        text = self.system_prompt(company_info)
+        kb_block = self._full_knowledge_block(knowledge_base) if knowledge_base and kb_version else None
+        if kb_block:
+            text += "\n\nKNOWLEDGE BASE (answer from it when it covers the question):\n" + kb_block
+        prefix = CompiledPrefix(text, kb_included=kb_block is not None)
+        # A KB too large for the prefix is remembered too, so it is not re-rendered every turn
+        self._remember(self._prefixes, keys[0] if knowledge_base else keys[-1], prefix)
+        self.compiled += 1
+        logger.debug("Compiled prompt prefix: %d tokens (KB %s)", prefix.tokens, "included" if kb_block else "per turn")
+        return prefix
+
+    def build_messages(self, user_message: str, company_info: Dict = None, knowledge_articles: List[Dict] = None,
+                       history: List[Dict] = None, language: str = None, knowledge_context: str = None,
+                       knowledge_base: List = None, kb_version: str = None, summary: str = None) -> List[Dict]:
+        """
+        Chat messages for one turn, stable parts first
+
+        Args:
+            user_message (str): What the user said
+            company_info (Dict): Company information (system prompt)
+            knowledge_articles (List[Dict]): Retrieved KB articles/chunks, best first
+            history (List[Dict]): Earlier exchanges ({'user', 'ai'}), oldest first
+            language (str): Reply language of a voice turn (adds spoken-reply instructions)
+            knowledge_context (str): Pre-formatted knowledge_block() of the retrieved articles
+            knowledge_base (List): The company's complete KB, for the compiled prefix
+            kb_version (str): Fingerprint of knowledge_base
+            summary (str): Summary of the call's exchanges older than history
+
+        Returns:
+            List[Dict]: OpenAI chat messages
+        """
+        prefix = self.prefix(company_info, knowledge_base, kb_version)
+        messages = [prefix.message]
+        chars = len(user_message)
+        if summary:
+            messages.append({"role": "system", "content": "EARLIER IN THIS CALL:\n" + summary})
+            chars += len(summary)
+        for exchange in history or ():
+            messages.append({"role": "user", "content": exchange['user']})
+            messages.append({"role": "assistant", "content": exchange['ai']})
+            chars += len(exchange['user']) + len(exchange['ai'])
+
+        turn_notes = []
+        if not prefix.kb_included and (knowledge_context or knowledge_articles):
+            if knowledge_context is None:
+                knowledge_context = self.knowledge_block(knowledge_articles)
+            turn_notes.append("RELEVANT KNOWLEDGE (answer from it when it covers the question):\n" + knowledge_context)
+        if language:
+            note = self._language_notes.get(language)
+            if note is None:
+                note = self._language_notes[language] = (
+                    f"You are speaking on a phone call: reply in {language}, in two or three short,"
+                    " conversational sentences without lists or formatting.")
+            turn_notes.append(note)
+        if turn_notes:
+            notes = "\n\n".join(turn_notes)
+            messages.append({"role": "system", "content": notes})
+            chars += len(notes)
+        messages.append({"role": "user", "content": user_message})
+
+        self.builds += 1
+        self.estimated_prefix_tokens += prefix.tokens
+        # Per-turn parts by character count (the prefix was measured in bytes when compiled)
+        self.estimated_prompt_tokens += prefix.tokens + chars // 4
+        return messages
+
+    def record_usage(self, prompt_tokens: int, cached_tokens: int = 0):
+        """Provider-reported prompt tokens of a request and how many were served from its prefix cache"""
+        self.usage_reports += 1
+        self.provider_prompt_tokens += prompt_tokens or 0
+        self.provider_cached_tokens += cached_tokens or 0
+
+    def shrink(self, fraction: float) -> int:
+        """Drop the least recently used share of compiled prefixes (memory guard)"""
+        count = math.ceil(len(self._prefixes) * fraction)
+        for _ in range(count):
+            self._prefixes.popitem(last=False)
+        return count
+
+    def get_stats(self) -> Dict:
+        return {
+            "compiled_prefixes": len(self._prefixes),
+            "compilations": self.compiled,
+            "prefix_hits": self.hits,
+            "builds": self.builds,
+            "estimated_prompt_tokens": self.estimated_prompt_tokens,
+            "estimated_prefix_share": round(self.estimated_prefix_tokens / self.estimated_prompt_tokens, 3)
+            if self.estimated_prompt_tokens else None,
+            "provider_usage_reports": self.usage_reports,
+            "provider_prompt_tokens": self.provider_prompt_tokens,
+            "provider_cached_tokens": self.provider_cached_tokens,
+            "provider_cached_share": round(self.provider_cached_tokens / self.provider_prompt_tokens, 3)
+            if self.provider_prompt_tokens else None
+        }
+
+# Global instance
+prompt_builder = PromptBuilder()
+memory_monitor.register('prompt_prefixes', lambda: prompt_builder._prefixes, prompt_builder.shrink)
@@ -0,0 +1,312 @@
+"""
+Latency-aware routing for external inference providers (Hugging Face STT/TTS)
+
+Each capability has one or more endpoints. Requests go to the endpoint with
+the lowest EWMA latency; if it has not answered within that endpoint's p95
+latency, a hedged duplicate goes to the next endpoint and the first success
+wins. A failing endpoint (timeouts, 5xx, 429 - e.g. a cold model returning
+503 "loading") trips its circuit breaker and is skipped until a half-open
+probe succeeds: once per open_seconds one request is routed to it first
+(hedging and failover still cover that request).
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_CLOSED = 'closed'
+CIRCUIT_OPEN = 'open'
+CIRCUIT_HALF_OPEN = 'half_open'
+
+
+class ProviderError(Exception):
+    """Every endpoint failed (or a non-retryable error came back)"""
+
+
+class ProviderRequestError(ProviderError):
+    """Non-retryable 4xx - every endpoint would answer the same"""
+
+
+class ProviderEndpoint:
+    """One provider URL with latency statistics and a circuit breaker"""
+
+    def __init__(self, url: str, ewma_alpha: float, failure_threshold: int, open_seconds: float, window: int = 100):
+        self.url = url
+        self.ewma_alpha = ewma_alpha
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.ewma_latency: Optional[float] = None
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.state = CIRCUIT_CLOSED
+        self.opened_at = 0.0
+
+    def available(self, now: float) -> bool:
+        """Closed endpoints take traffic; an open one is due a single probe after open_seconds (read-only)"""
+        return self.state == CIRCUIT_CLOSED or self.probe_due(now)
+
+    def probe_due(self, now: float) -> bool:
+        return self.state == CIRCUIT_OPEN and now - self.opened_at >= self.open_seconds
+
+    def start_attempt(self):
+        """An attempt is launched on this endpoint - on an open circuit that attempt is the half-open probe"""
+        if self.state == CIRCUIT_OPEN:
+            self.state = CIRCUIT_HALF_OPEN
+
+    def _reopen(self):
+        self.state = CIRCUIT_OPEN
+        self.opened_at = time.monotonic()
+
+    def record_success(self, latency: float):
+        self.requests += 1
+        self.latencies.append(latency)
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency += self.ewma_alpha * (latency - self.ewma_latency)
+        self.consecutive_failures = 0
+        if self.state != CIRCUIT_CLOSED:
+            logger.info("Provider endpoint %s recovered - circuit closed", self.url)
+        self.state = CIRCUIT_CLOSED
+
+    def record_abandoned(self, latency: float):
+        """A hedged attempt that lost the race - its latency is at least this"""
+        self.requests += 1
+        self.latencies.append(latency)
+        if self.ewma_latency is not None:
+            self.ewma_latency += self.ewma_alpha * (max(latency, self.ewma_latency) - self.ewma_latency)
+        if self.state == CIRCUIT_HALF_OPEN:
+            # The probe never completed - wait another open interval before the next one
+            self._reopen()
+
+    def record_failure(self, latency: float):
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        # A failure counts as slow so a flapping endpoint sinks in the ordering
+        self.latencies.append(latency)
+        if self.ewma_latency is not None:
+            self.ewma_latency += self.ewma_alpha * (max(latency, self.ewma_latency * 2) - self.ewma_latency)
+        if self.state == CIRCUIT_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != CIRCUIT_OPEN:
+                logger.warning("Provider endpoint %s ejected after %d consecutive failures",
+                               self.url, self.consecutive_failures)
+            self._reopen()
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < 20:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def get_stats(self) -> Dict:
+        p95 = self.p95()
+        return {
+            "url": self.url,
+            "state": self.state,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ewma_ms": round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None
+        }
+
+
+class ProviderRouter:
+    """Routes one capability (e.g. 'tts') across its configured endpoints"""
+
+    def __init__(self, capability: str, urls: List[str], headers: Dict[str, str] = None):
+        self.capability = capability
+        self.headers = headers or {}
+        self.timeout = float(os.getenv('PROVIDER_TIMEOUT_SECONDS', 10))
+        self.hedge_default = float(os.getenv('PROVIDER_HEDGE_DEFAULT_MS', 800)) / 1000
+        self.hedge_min = float(os.getenv('PROVIDER_HEDGE_MIN_MS', 50)) / 1000
+        self.max_attempts = int(os.getenv('PROVIDER_MAX_ATTEMPTS', 3))
+        self.endpoints = [
+            ProviderEndpoint(
+                url,
+                ewma_alpha=float(os.getenv('PROVIDER_EWMA_ALPHA', 0.2)),
+                failure_threshold=int(os.getenv('PROVIDER_CIRCUIT_FAILURES', 5)),
+                open_seconds=float(os.getenv('PROVIDER_CIRCUIT_OPEN_SECONDS', 30))
+            )
+            for url in urls
+        ]
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self.cancelled = 0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop = None
+        _routers.append(self)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Connection pools belong to one event loop
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            if self._client is not None:
+                self._discard_client()
+            self._client = httpx.AsyncClient(timeout=self.timeout, headers=self.headers)
+            self._client_loop = loop
+        return self._client
+
+    def _discard_client(self):
+        """Drop a client bound to another event loop, closing its pool on that loop while it still runs"""
+        client, loop = self._client, self._client_loop
+        self._client = self._client_loop = None
+        if loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        else:
+            # Its connections cannot be awaited from here; lifespan shutdown (aclose) is what prevents this
+            logger.warning("%s: event loop changed with its connection pool still open", self.capability)
+
+    async def aclose(self):
+        """Close the connection pool (application shutdown); the next request opens a new one"""
+        if self._client is None:
+            return
+        if self._client_loop is not asyncio.get_running_loop():
+            self._discard_client()
+            return
+        client, self._client, self._client_loop = self._client, None, None
+        await client.aclose()
+
+    def _candidates(self) -> List[ProviderEndpoint]:
+        now = time.monotonic()
+        available = [endpoint for endpoint in self.endpoints if endpoint.available(now)]
+        if not available:
+            # Everything is ejected: try the endpoint that has been out the longest rather than fail outright
+            available = [min(self.endpoints, key=lambda endpoint: endpoint.opened_at)]
+        # Due probes and unmeasured endpoints sort first so recovered/new ones get sampled (hedging covers a slow probe)
+        return sorted(available, key=lambda endpoint: (
+            not endpoint.probe_due(now),
+            endpoint.ewma_latency if endpoint.ewma_latency is not None else -1.0
+        ))
+
+    def _hedge_delay(self, endpoint: ProviderEndpoint) -> float:
+        p95 = endpoint.p95()
+        if p95 is None:
+            return self.hedge_default
+        return max(self.hedge_min, min(p95, self.timeout))
+
+    async def _attempt(self, endpoint: ProviderEndpoint, request_kwargs: Dict, parse: Callable[[httpx.Response], Any]):
+        started = time.perf_counter()
+        try:
+            response = await self._get_client().post(endpoint.url, **request_kwargs)
+        except asyncio.CancelledError:
+            endpoint.record_abandoned(time.perf_counter() - started)
+            raise
+        except httpx.HTTPError as e:
+            endpoint.record_failure(time.perf_counter() - started)
+            raise ProviderError(f"{endpoint.url}: {type(e).__name__}: {e}") from e
+
+        latency = time.perf_counter() - started
+        if response.status_code == 429 or response.status_code >= 500:
+            endpoint.record_failure(latency)
+            raise ProviderError(f"{endpoint.url}: HTTP {response.status_code}")
+        if response.status_code != 200:
+            # Caller error (bad input, auth) - every endpoint would answer the same
+            endpoint.record_success(latency)
+            raise ProviderRequestError(f"{self.capability} API error: {response.status_code}")
+        endpoint.record_success(latency)
+        return parse(response), endpoint
+
+    async def request(self, request_kwargs: Dict, parse: Callable[[httpx.Response], Any]) -> Tuple[Any, ProviderEndpoint]:
+        """
+        POST to the best endpoint, hedging and failing over as needed
+
+        Args:
+            request_kwargs (Dict): httpx.post keyword arguments (json=..., content=...)
+            parse (Callable): Turns a 200 response into the result
+
+        Returns:
+            Tuple[Any, ProviderEndpoint]: Parsed result and the endpoint that produced it
+        """
+        candidates = self._candidates()[:self.max_attempts]
+        pending: Dict[asyncio.Task, ProviderEndpoint] = {}
+        errors = []
+        next_index = 0
+
+        def launch():
+            nonlocal next_index
+            endpoint = candidates[next_index]
+            next_index += 1
+            endpoint.start_attempt()
+            pending[asyncio.ensure_future(self._attempt(endpoint, request_kwargs, parse))] = endpoint
+            return endpoint
+
+        primary = launch()
+        try:
+            while pending:
+                can_hedge = next_index < len(candidates)
+                timeout = self._hedge_delay(primary) if can_hedge else None
+                if can_hedge and primary.state == CIRCUIT_HALF_OPEN:
+                    # A probe's own latency history is that of a failing endpoint - hedge when the next would answer
+                    timeout = min(timeout, self._hedge_delay(candidates[next_index]))
+                done, _ = await asyncio.wait(list(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Primary is slower than its p95 - race a duplicate on the next endpoint
+                    self.hedges += 1
+                    logger.info("%s: hedging to %s", self.capability, launch().url)
+                    continue
+
+                for task in done:
+                    endpoint = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except ProviderRequestError:
+                        raise
+                    except ProviderError as e:
+                        errors.append(str(e))
+                        continue
+                    if endpoint is not primary:
+                        self.hedge_wins += 1
+                    return result
+
+                if not pending and next_index < len(candidates):
+                    self.failovers += 1
+                    primary = launch()
+        except asyncio.CancelledError:
+            # Caller gone (client disconnected): the in-flight attempts are closed below
+            self.cancelled += 1
+            raise
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise ProviderError(f"All {self.capability} endpoints failed: {'; '.join(errors)}")
+
+    def get_stats(self) -> Dict:
+        return {
+            "endpoints": [endpoint.get_stats() for endpoint in self.endpoints],
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "cancelled": self.cancelled
+        }
+
+
+_routers: List[ProviderRouter] = []
+
+
+def endpoints_from_env(variable: str, default: str) -> List[str]:
+    """Comma-separated endpoint list from the environment"""
+    urls = [url.strip() for url in os.getenv(variable, '').split(',') if url.strip()]
+    return urls or [default]
+
+
+async def close_provider_clients():
+    """Close every provider router's connection pool (from the application lifespan)"""
+    for router in _routers:
+        await router.aclose()
+
+
+def provider_router_stats() -> Dict:
+    """Stats of every provider router, keyed by capability"""
+    return {router.capability: router.get_stats() for router in _routers}
@@ -0,0 +1,242 @@
+"""
+Text-chat response cache
+
+Text chat is dominated by the same few questions in slightly different words,
+and every one of them used to cost a model call. Generated answers are cached
+per (company, KB version, normalized message) with a TTL and an LRU bound, and
+a near-duplicate tier matches rewordings: each message gets a 64-bit SimHash of
+its content words (contractions expanded, function words dropped), signatures
+are indexed in RESPONSE_CACHE_NEAR_BITS + 1 bands so any signature within that
+Hamming distance shares at least one band, and a candidate is only served when
+its content words also overlap (Jaccard) and carry the same numbers - so
+"what's your pricing?" and "what is the pricing" share an entry while
+"plan 2" and "plan 3" do not. Keys and content words keep combining marks, so
+Devanagari words stay whole ('साल' and 'सेल' are different words).
+"""
+import os
+import re
+import math
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from services.kb_cache import normalize_question
+from services.memory_monitor import memory_monitor
+
+logger = logging.getLogger(__name__)
+
+_CONTRACTIONS = [
+    (re.compile(r"\b(can)'t\b"), r"\1 not"),
+    (re.compile(r"\bwon't\b"), "will not"),
+    (re.compile(r"n't\b"), " not"),
+    (re.compile(r"'s\b"), " is"),
+    (re.compile(r"'re\b"), " are"),
+    (re.compile(r"'m\b"), " am"),
+    (re.compile(r"'ll\b"), " will"),
+    (re.compile(r"'ve\b"), " have"),
+    (re.compile(r"'d\b"), " would"),
+]
+# Function words that do not change what is being asked (negations are kept on purpose)
+_STOP_WORDS = {
+    'a', 'an', 'the', 'is', 'are', 'am', 'was', 'were', 'be', 'do', 'does', 'did', 'what', 'whats', 'which',
+    'your', 'you', 'yours', 'our', 'my', 'me', 'i', 'we', 'us', 'it', 'its', 'this', 'that', 'these', 'those',
+    'of', 'for', 'to', 'in', 'on', 'at', 'with', 'about', 'please', 'tell', 'know', 'can', 'could', 'would',
+    'will', 'hi', 'hello', 'hey', 'ok', 'okay', 'so', 'just', 'and', 'or', 'there', 'any', 'some',
+    'kya', 'hai', 'hain', 'ka', 'ki', 'ke', 'aap', 'aapka', 'aapki', 'mujhe', 'batao', 'bataiye', 'ji',
+    'क्या', 'है', 'हैं', 'का', 'की', 'के', 'आप', 'आपका', 'आपकी', 'मुझे', 'बताओ', 'बताइए', 'जी'
+}
+
+
+def expand_contractions(text: str) -> str:
+    text = text.lower().replace('’', "'")
+    for pattern, replacement in _CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def content_tokens(message: str) -> FrozenSet[str]:
+    """Content words of a message (contractions expanded, function words dropped, plural -s stripped)"""
+    tokens = set()
+    # Split like the exact key, so Devanagari words keep their vowel signs instead of breaking into consonants
+    for word in normalize_question(expand_contractions(message)).split():
+        if word in _STOP_WORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        tokens.add(word)
+    return frozenset(tokens)
+
+
+def _numbers(tokens: FrozenSet[str]) -> Set[str]:
+    """Tokens carrying a number ('2', '9.99', '4g') - a near-duplicate must carry the same ones"""
+    return {token for token in tokens if any(char.isdigit() for char in token)}
+
+
+@lru_cache(maxsize=16384)
+def _token_bits(token: str) -> Tuple[int, ...]:
+    """+1/-1 per bit of the token's 64-bit hash"""
+    value = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+    return tuple(1 if value >> bit & 1 else -1 for bit in range(64))
+
+
+def simhash(tokens) -> int:
+    """64-bit SimHash of a set of tokens (equal weights)"""
+    signature = 0
+    for bit, column in enumerate(zip(*map(_token_bits, tokens))):
+        if sum(column) > 0:
+            signature |= 1 << bit
+    return signature
+
+
+class ResponseCache:
+    """TTL + LRU cache of generated answers with a SimHash near-duplicate tier and hit/miss metrics"""
+
+    def __init__(self, max_entries: int = None, ttl_s: float = None, near_bits: int = None,
+                 near_min_jaccard: float = None):
+        self.max_entries = max_entries or int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 2048))
+        self.ttl_s = ttl_s if ttl_s is not None else float(os.getenv('RESPONSE_CACHE_TTL_S', 600))
+        # Largest Hamming distance between SimHash signatures of a near-duplicate (0 disables the tier)
+        self.near_bits = near_bits if near_bits is not None else int(os.getenv('RESPONSE_CACHE_NEAR_BITS', 3))
+        self.near_min_jaccard = (near_min_jaccard if near_min_jaccard is not None
+                                 else float(os.getenv('RESPONSE_CACHE_NEAR_MIN_JACCARD', 0.75)))
+        self.bands = self.near_bits + 1
+        self._band_width = 64 // self.bands
+        self._band_mask = (1 << self._band_width) - 1
+        self._entries: "OrderedDict[Tuple[str, str, str], Dict]" = OrderedDict()
+        # (company, kb version, band, band value) -> keys of entries whose signature has that band value
+        self._bands: Dict[Tuple[str, str, int, int], Set[Tuple[str, str, str]]] = {}
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def _band_keys(self, company: str, kb_version: str, signature: int) -> List[Tuple[str, str, int, int]]:
+        return [(company, kb_version, band, signature >> (band * self._band_width) & self._band_mask)
+                for band in range(self.bands)]
+
+    def _remove(self, key: Tuple[str, str, str]):
+        entry = self._entries.pop(key)
+        if entry['signature'] is None:
+            return
+        for band_key in self._band_keys(key[0], key[1], entry['signature']):
+            keys = self._bands.get(band_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._bands[band_key]
+
+    def get(self, company: str, kb_version: str, message: str) -> Tuple[Optional[Dict], Optional[str]]:
+        """
+        Look up a cached answer
+
+        Args:
+            company (str): Company the answer was generated for
+            kb_version (str): Fingerprint of the knowledge it was grounded in
+            message (str): The user's message
+
+        Returns:
+            Tuple[Optional[Dict], Optional[str]]: cached result and the tier that matched
+            ('exact' or 'near'), or (None, None)
+        """
+        now = time.monotonic()
+        key = (company, kb_version, normalize_question(message))
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry['expires'] > now:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry['result'], 'exact'
+            self._remove(key)
+            self.expired += 1
+
+        if self.near_bits:
+            tokens = content_tokens(message)
+            if tokens:
+                match = self._near(company, kb_version, tokens, now)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self.near_hits += 1
+                    return self._entries[match]['result'], 'near'
+        self.misses += 1
+        return None, None
+
+    def _near(self, company: str, kb_version: str, tokens: FrozenSet[str], now: float) -> Optional[Tuple[str, str, str]]:
+        signature = simhash(tokens)
+        numbers = _numbers(tokens)
+        best, best_distance = None, self.near_bits + 1
+        candidates = set()
+        for band_key in self._band_keys(company, kb_version, signature):
+            candidates.update(self._bands.get(band_key, ()))
+        for key in candidates:
+            entry = self._entries[key]
+            if entry['expires'] <= now:
+                self._remove(key)
+                self.expired += 1
+                continue
+            distance = (entry['signature'] ^ signature).bit_count()
+            if distance >= best_distance or entry['numbers'] != numbers:
+                continue
+            if len(tokens & entry['tokens']) / len(tokens | entry['tokens']) < self.near_min_jaccard:
+                continue
+            best, best_distance = key, distance
+        return best
+
+    def put(self, company: str, kb_version: str, message: str, result: Dict):
+        """Cache a generated answer for ttl_s"""
+        key = (company, kb_version, normalize_question(message))
+        if key in self._entries:
+            self._remove(key)
+        tokens = content_tokens(message) if self.near_bits else frozenset()
+        signature = simhash(tokens) if tokens else None
+        self._entries[key] = {
+            'result': result,
+            'expires': time.monotonic() + self.ttl_s,
+            'signature': signature,
+            'tokens': tokens,
+            'numbers': _numbers(tokens)
+        }
+        if signature is not None:
+            for band_key in self._band_keys(company, kb_version, signature):
+                self._bands.setdefault(band_key, set()).add(key)
+        self.stores += 1
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._bands.clear()
+
+    def shrink(self, fraction: float) -> int:
+        """Evict the least recently used share of entries (memory guard)"""
+        count = math.ceil(len(self._entries) * fraction)
+        for _ in range(count):
+            self._remove(next(iter(self._entries)))
+        self.evictions += count
+        return count
+
+    def get_stats(self) -> Dict:
+        hits = self.exact_hits + self.near_hits
+        lookups = hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "near_bits": self.near_bits,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate_percent": round(hits / lookups * 100, 2) if lookups else 0.0,
+            "stores": self.stores,
+            "expired": self.expired,
+            "evictions": self.evictions
+        }
+
+# Create global instance
+response_cache = ResponseCache()
+memory_monitor.register('response_cache', lambda: response_cache._entries, response_cache.shrink)
@@ -0,0 +1,95 @@
+"""
+Single-flight request coalescing
+
+When a campaign starts, many calls reach the same stage at once and ask a
+provider for exactly the same thing (same TTS text and voice, same audio, same
+KB question). A SingleFlight group lets the first caller start the work and
+every concurrent caller with the same key await that one in-flight task.
+Results are shared objects - callers must treat them as read-only. The task
+is cancelled once every caller waiting on it has been cancelled (clients
+disconnected), so nobody pays for a provider call whose answer nobody wants.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key onto one task"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.abandoned = 0
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        _groups.append(self)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() once for all concurrent callers of `key`
+
+        Args:
+            key (Hashable): Identity of the request (e.g. (voice, text))
+            fn (Callable): Coroutine factory that performs the actual provider call
+
+        Returns:
+            Any: fn()'s result, shared with every coalesced caller
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            # A separate task, so one caller being cancelled doesn't cancel the work for the others
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+            logger.debug("%s: coalesced onto in-flight request", self.name)
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            waiters = self._waiters[task] - 1
+            if waiters:
+                self._waiters[task] = waiters
+            else:
+                del self._waiters[task]
+                if not task.done():
+                    # The last waiter was cancelled - nobody wants this result any more
+                    task.cancel()
+                    self.abandoned += 1
+                    if self._inflight.get(key) is task:
+                        del self._inflight[key]
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.failed += 1
+
+    def get_stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "coalesced_percent": round(self.coalesced / self.calls * 100, 2) if self.calls else 0.0,
+            "failed": self.failed,
+            "abandoned": self.abandoned,
+            "in_flight": len(self._inflight)
+        }
+
+
+_groups: List[SingleFlight] = []
+
+
+def single_flight_stats() -> Dict:
+    """Stats of every SingleFlight group, keyed by name"""
+    return {group.name: group.get_stats() for group in _groups}
@@ -1,7 +1,11 @@
 import os
+import hashlib
 from typing import Dict
 import requests
 
+from services.single_flight import SingleFlight
+from services.provider_router import ProviderRouter, endpoints_from_env
+
 class STTService:
     """
     Speech-to-Text service using Hugging Face Whisper API
@@ -10,6 +14,14 @@ class STTService:
     def __init__(self):
         self.hf_token = os.getenv('HUGGINGFACE_TOKEN')
         self.stt_model = "openai/whisper-large-v3"
+        # Identical audio (same recording forwarded twice, retries) is transcribed once
+        self.single_flight = SingleFlight("stt")
+        # STT_ENDPOINTS: comma-separated model URLs (mirrors / alternative models), best latency first
+        self.router = ProviderRouter(
+            "stt",
+            endpoints_from_env('STT_ENDPOINTS', f"https://api-inference.huggingface.co/models/{self.stt_model}"),
+            headers={"Authorization": f"Bearer {self.hf_token}"} if self.hf_token else None
+        )
     
     async def transcribe_audio(self, audio_data: bytes, audio_format: str = "wav") -> Dict:
         """
@@ -20,38 +32,34 @@ class STTService:
             audio_format (str): Audio format (wav, mp3, etc.)
             
         Returns:
-            Dict: Transcription result
+            Dict: Transcription result (shared with concurrent identical requests - read-only)
         """
+        key = (hashlib.sha256(audio_data).hexdigest(), audio_format)
+        return await self.single_flight.do(key, lambda: self._transcribe(audio_data, audio_format))
+    
+    async def _transcribe(self, audio_data: bytes, audio_format: str) -> Dict:
         try:
             if not self.hf_token:
                 raise Exception("Hugging Face token not configured")
             
-            # Call Hugging Face Whisper API
-            api_url = f"https://api-inference.huggingface.co/models/{self.stt_model}"
-            headers = {"Authorization": f"Bearer {self.hf_token}"}
-            
-            response = requests.post(
-                api_url,
-                headers=headers,
-                data=audio_data
+            # Call Hugging Face Whisper API (hedged across STT_ENDPOINTS)
+            result, endpoint = await self.router.request(
+                {"content": audio_data},
+                lambda response: response.json()
             )
+            transcript = result.get('text', '').strip()
             
-            if response.status_code == 200:
-                result = response.json()
-                transcript = result.get('text', '').strip()
-                
-                return {
-                    "transcript": transcript,
-                    "confidence": 0.95,  # Whisper doesn't return confidence scores
-                    "language": "en-US",
-                    "audio_format": audio_format,
-                    "audio_size_bytes": len(audio_data),
-                    "model_used": self.stt_model,
-                    "provider": "huggingface",
-                    "success": True
-                }
-            else:
-                raise Exception(f"Hugging Face STT API error: {response.status_code}")
+            return {
+                "transcript": transcript,
+                "confidence": 0.95,  # Whisper doesn't return confidence scores
+                "language": "en-US",
+                "audio_format": audio_format,
+                "audio_size_bytes": len(audio_data),
+                "model_used": self.stt_model,
+                "endpoint": endpoint.url,
+                "provider": "huggingface",
+                "success": True
+            }
                 
         except Exception as e:
             return {
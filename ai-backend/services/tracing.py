@@ -0,0 +1,328 @@
+"""
+Per-call tracing of voice turns
+
+Every voice turn is a root span ("voice_turn") with a child span per engine
+stage (the turn_stage() blocks: parse, language, sentiment, abuse, intent,
+kb_search, extraction, response, memory). The trace id is derived from the
+call_sid, so all turns of one call form a single trace and a slow turn 7 can
+be compared with the greeting.
+
+Finished turns are kept in memory per call (GET /admin/traces/{call_sid}) and,
+when TRACE_EXPORTER is set, handed to a background thread that writes them in
+batches as OTLP/JSON - to a JSON-lines file (readable by the OpenTelemetry
+collector's otlpjsonfile receiver) or to an OTLP/HTTP endpoint. Calls are
+sampled by call_sid (TRACE_SAMPLE_RATE), so a sampled call keeps every turn.
+"""
+import os
+import math
+import time
+import zlib
+import queue
+import atexit
+import random
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from services import json_codec
+from services.memory_monitor import memory_monitor
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'talkai-ai-backend')
+_SPAN_KIND_INTERNAL = 1
+_SPAN_KIND_SERVER = 2
+_STATUS_OK = 1
+_STATUS_ERROR = 2
+
+current_span_var: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+
+class Span:
+    """One timed operation; a root span also collects its finished descendants"""
+
+    __slots__ = ('name', 'span_id', 'parent_id', 'root', 'start_ns', 'end_ns', 'attributes', 'error',
+                 'call_sid', 'trace_id', 'spans')
+
+    def __init__(self, name: str, parent: 'Span' = None, attributes: Dict[str, Any] = None):
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent is not None else None
+        self.root = parent.root if parent is not None else self
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+        # Root only
+        self.call_sid: Optional[str] = None
+        self.trace_id: Optional[str] = None
+        self.spans: List['Span'] = []
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+    def to_otlp(self, trace_id: str) -> Dict:
+        return {
+            "traceId": trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": _SPAN_KIND_SERVER if self.parent_id is None else _SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": _STATUS_ERROR, "message": self.error} if self.error else {"code": _STATUS_OK}
+        }
+
+
+def _otlp_value(value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+def trace_id_for_call(call_sid: Optional[str]) -> str:
+    """128-bit trace id shared by every turn of a call (random without a call_sid)"""
+    if not call_sid:
+        return f"{random.getrandbits(128):032x}"
+    return hashlib.sha256(call_sid.encode('utf-8', 'replace')).hexdigest()[:32]
+
+
+def otlp_request(turns: List[Span]) -> Dict:
+    """ExportTraceServiceRequest (OTLP/JSON) for finished root spans"""
+    spans = []
+    for root in turns:
+        spans.append(root.to_otlp(root.trace_id))
+        spans.extend(span.to_otlp(root.trace_id) for span in root.spans)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "services.tracing"}, "spans": spans}]
+        }]
+    }
+
+
+class TraceExporter:
+    """Background thread writing finished turns in batches (file or OTLP/HTTP)"""
+
+    def __init__(self, kind: str, batch_size: int, interval: float, queue_size: int):
+        self.kind = kind
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.path = os.getenv('TRACE_EXPORT_FILE', 'traces.jsonl')
+        self.endpoint = os.getenv('TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+        self.exported_turns = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        self._client = None
+        self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+        self._thread.start()
+
+    def submit(self, root: Span):
+        try:
+            self.queue.put_nowait(root)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                item = self.queue.get(timeout=self.interval)
+            except queue.Empty:
+                continue
+            if item is None:
+                return
+            batch.append(item)
+            flush_at = time.monotonic() + self.interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(0.0, flush_at - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._export(batch)
+            if stop:
+                return
+
+    def _export(self, batch: List[Span]):
+        payload = json_codec.dumps(otlp_request(batch))
+        try:
+            if self.kind == 'file':
+                with open(self.path, 'ab') as output:
+                    output.write(payload + b'\n')
+            else:
+                if self._client is None:
+                    import httpx
+                    self._client = httpx.Client(timeout=5.0)
+                response = self._client.post(self.endpoint, content=payload, headers={'Content-Type': 'application/json'})
+                response.raise_for_status()
+            self.exported_turns += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Trace export of %d turns failed: %s", len(batch), e)
+
+    def shutdown(self):
+        """Export what is queued and stop the thread"""
+        try:
+            self.queue.put(None, timeout=1.0)
+        except queue.Full:
+            return
+        self._thread.join(timeout=5.0)
+
+    def get_stats(self) -> Dict:
+        return {
+            "exporter": self.kind,
+            "exported_turns": self.exported_turns,
+            "batches": self.batches,
+            "queue_depth": self.queue.qsize(),
+            "dropped_queue_full": self.dropped,
+            "errors": self.errors
+        }
+
+
+class Tracer:
+    """Span creation, per-call sampling and the in-memory trace store"""
+
+    def __init__(self):
+        self.enabled = os.getenv('TRACING_ENABLED', 'true').lower() == 'true'
+        self.sample_rate = float(os.getenv('TRACE_SAMPLE_RATE', 1.0))
+        self.max_calls = int(os.getenv('TRACE_MAX_CALLS', 500))
+        self.max_turns_per_call = int(os.getenv('TRACE_MAX_TURNS_PER_CALL', 100))
+        self._threshold = int(self.sample_rate * 0xFFFFFFFF)
+        self._calls: 'OrderedDict[str, deque]' = OrderedDict()
+        self._turn_counts: Dict[str, int] = {}
+        self.turns = 0
+        self.sampled_out = 0
+        self.exporter: Optional[TraceExporter] = None
+        kind = os.getenv('TRACE_EXPORTER', 'none').lower()
+        if self.enabled and kind in ('file', 'otlp'):
+            self.exporter = TraceExporter(
+                kind,
+                batch_size=int(os.getenv('TRACE_EXPORT_BATCH_SIZE', 64)),
+                interval=float(os.getenv('TRACE_EXPORT_INTERVAL_MS', 2000)) / 1000,
+                queue_size=int(os.getenv('TRACE_QUEUE_SIZE', 2048))
+            )
+            atexit.register(self.exporter.shutdown)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Time a block as a span; a root span (no span open) is a voice turn
+
+        Yields:
+            Span: the new span (None while tracing is disabled)
+        """
+        if not self.enabled:
+            yield None
+            return
+        parent = current_span_var.get()
+        span = Span(name, parent, attributes)
+        token = current_span_var.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            current_span_var.reset(token)
+            span.end_ns = time.time_ns()
+            if parent is None:
+                self._finish_turn(span)
+            else:
+                span.root.spans.append(span)
+
+    def annotate(self, call_sid: str = None, **attributes):
+        """Attach attributes (and the call_sid) to the current turn's root span"""
+        span = current_span_var.get()
+        if span is None:
+            return
+        root = span.root
+        if call_sid:
+            root.call_sid = call_sid
+        root.attributes.update(attributes)
+
+    def _sampled(self, call_sid: Optional[str]) -> bool:
+        if self.sample_rate >= 1.0:
+            return True
+        key = (call_sid or '').encode('utf-8', 'replace')
+        return bool(call_sid) and zlib.crc32(key) <= self._threshold
+
+    def _finish_turn(self, root: Span):
+        if not self._sampled(root.call_sid):
+            self.sampled_out += 1
+            return
+        self.turns += 1
+        root.trace_id = trace_id_for_call(root.call_sid)
+        call_sid = root.call_sid
+        if call_sid:
+            root.attributes['call_sid'] = call_sid
+            root.attributes['turn'] = self._turn_counts.get(call_sid, 0) + 1
+            turns = self._calls.get(call_sid)
+            if turns is None:
+                if len(self._calls) >= self.max_calls:
+                    oldest, _ = self._calls.popitem(last=False)
+                    self._turn_counts.pop(oldest, None)
+                turns = self._calls[call_sid] = deque(maxlen=self.max_turns_per_call)
+            else:
+                self._calls.move_to_end(call_sid)
+            turns.append(root)
+            self._turn_counts[call_sid] = root.attributes['turn']
+        if self.exporter is not None:
+            self.exporter.submit(root)
+
+    def shrink(self, fraction: float) -> int:
+        """Forget the least recently traced share of calls (memory guard)"""
+        count = math.ceil(len(self._calls) * fraction)
+        for _ in range(count):
+            call_sid, _ = self._calls.popitem(last=False)
+            self._turn_counts.pop(call_sid, None)
+        return count
+
+    def get_call_trace(self, call_sid: str) -> Optional[List[Span]]:
+        """Finished turns of a call, oldest first (None if unknown or evicted)"""
+        turns = self._calls.get(call_sid)
+        return list(turns) if turns is not None else None
+
+    def get_stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "turns": self.turns,
+            "sampled_out": self.sampled_out,
+            "calls_stored": len(self._calls),
+            "export": self.exporter.get_stats() if self.exporter is not None else {"exporter": "none"}
+        }
+
+# Global instance
+tracer = Tracer()
+memory_monitor.register('traces', lambda: tracer._calls, tracer.shrink)
@@ -0,0 +1,390 @@
+"""
+Offline transcript analytics over historical call logs
+
+Streams call logs from JSONL, a MongoDB export (mongoexport JSON lines or
+--jsonArray) or a live MongoDB collection, runs every user turn through the
+engine's language, sentiment, abuse and intent components in chunked batches
+across a process pool, and aggregates per-company and per-stage statistics.
+Input is never materialized: at most `workers * 2` chunks are in flight.
+
+Usage:
+    cd ai-backend
+    python -m services.transcript_analytics calllogs.jsonl --output stats.json
+    python -m services.transcript_analytics --mongo-uri "$MONGO_URI" --since 2025-01-01
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from functools import lru_cache
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_READ_SIZE = 1 << 16
+# Largest single record of a JSON array export; a longer undecodable run is a malformed file, not a big record
+_MAX_RECORD_CHARS = 16 << 20
+
+
+def iter_json_records(stream, skipped: Counter = None) -> Iterator[Dict]:
+    """
+    Yield records from a text stream holding JSON lines or a single JSON array
+
+    JSON lines are decoded one line at a time: a corrupt line is logged,
+    counted in skipped['invalid_json'] and skipped, so one bad record does not
+    abort the run. Arrays (mongoexport --jsonArray) are decoded element by
+    element from a rolling buffer, so memory stays bounded by the largest
+    single record (_MAX_RECORD_CHARS); a malformed array raises ValueError.
+    Records that are not JSON objects are counted in skipped['not_an_object'].
+    """
+    if skipped is None:
+        skipped = Counter()
+    buffer = stream.read(_READ_SIZE)
+    stripped = buffer.lstrip()
+    if stripped.startswith('['):
+        yield from _iter_json_array(stream, stripped[1:], skipped)
+        return
+
+    # Complete the line the first read ended in, then read line by line
+    lines = (buffer + stream.readline()).splitlines()
+    for number, line in enumerate(chain(lines, stream), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            skipped['invalid_json'] += 1
+            logger.warning("Skipping line %d: invalid JSON (%s)", number, e)
+            continue
+        if isinstance(record, dict):
+            yield record
+        else:
+            skipped['not_an_object'] += 1
+
+
+def _iter_json_array(stream, buffer: str, skipped: Counter) -> Iterator[Dict]:
+    decoder = json.JSONDecoder()
+    eof = False
+    index = 0
+
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,')
+        if buffer.startswith(']'):
+            return
+        if not buffer:
+            if eof:
+                return
+            chunk = stream.read(_READ_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError as e:
+            if eof or len(buffer) > _MAX_RECORD_CHARS:
+                raise ValueError(f"Malformed JSON array at element {index}: {e.msg}") from e
+            chunk = stream.read(_READ_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        index += 1
+        if isinstance(record, dict):
+            yield record
+        else:
+            skipped['not_an_object'] += 1
+
+
+def iter_file_records(path: str, skipped: Counter = None) -> Iterator[Dict]:
+    """Yield call log records from a JSONL / JSON export file ('-' for stdin); see iter_json_records"""
+    if path == '-':
+        yield from iter_json_records(sys.stdin, skipped)
+        return
+    with open(path, 'r', encoding='utf-8') as stream:
+        yield from iter_json_records(stream, skipped)
+
+
+def iter_mongo_records(mongo_uri: str, database: str = None, collection: str = 'calllogs',
+                       since: Optional[datetime] = None, batch_size: int = 500) -> Iterator[Dict]:
+    """Yield call log records straight from MongoDB with a server-side cursor"""
+    from pymongo import MongoClient
+
+    client = MongoClient(mongo_uri)
+    try:
+        db = client[database] if database else client.get_default_database()
+        query = {'transcript': {'$exists': True, '$ne': None}}
+        if since:
+            query['createdAt'] = {'$gte': since}
+        projection = {'companyId': 1, 'callId': 1, 'transcript': 1, 'createdAt': 1}
+        for record in db[collection].find(query, projection, batch_size=batch_size):
+            yield record
+    finally:
+        client.close()
+
+
+def _extended_json_value(value):
+    """Unwrap mongoexport extended JSON ({"$oid": ...}, {"$date": ...})"""
+    if isinstance(value, dict):
+        for key in ('$oid', '$date', '$numberLong'):
+            if key in value:
+                return _extended_json_value(value[key])
+    return value
+
+
+def extract_user_turns(record: Dict) -> List[str]:
+    """User utterances of a call log in order (transcript is a JSON string or list)"""
+    transcript = record.get('transcript')
+    if isinstance(transcript, str):
+        try:
+            transcript = json.loads(transcript)
+        except ValueError:
+            return [line for line in transcript.splitlines() if line.strip()]
+    if not isinstance(transcript, list):
+        return []
+    turns = []
+    for exchange in transcript:
+        if isinstance(exchange, dict):
+            message = exchange.get('userMessage') or exchange.get('user') or ''
+        else:
+            message = str(exchange)
+        if message.strip():
+            turns.append(message)
+    return turns
+
+
+def _company_bucket() -> Dict:
+    return {
+        'calls': 0, 'turns': 0, 'abusive_calls': 0, 'goodbye_calls': 0,
+        'languages': Counter(), 'sentiments': Counter(), 'intents': Counter()
+    }
+
+
+def _stage_bucket() -> Dict:
+    return {'turns': 0, 'languages': Counter(), 'sentiments': Counter(), 'intents': Counter()}
+
+
+class TranscriptStats:
+    """Mergeable per-company and per-stage aggregates (picklable for the process pool)"""
+
+    def __init__(self):
+        self.calls = 0
+        self.turns = 0
+        self.companies = defaultdict(_company_bucket)
+        self.stages = defaultdict(_stage_bucket)
+        # Input records that could not be analyzed, by reason (see iter_json_records)
+        self.skipped = Counter()
+
+    def add_call(self, company_id: str, turns: List[Dict]):
+        company = self.companies[company_id]
+        self.calls += 1
+        company['calls'] += 1
+        company['abusive_calls'] += any(turn['abusive'] for turn in turns)
+        company['goodbye_calls'] += any(turn['stage'] == 'closed' for turn in turns)
+
+        for turn in turns:
+            self.turns += 1
+            company['turns'] += 1
+            stage = self.stages[turn['stage']]
+            stage['turns'] += 1
+            for bucket in (company, stage):
+                bucket['languages'][turn['language']] += 1
+                bucket['sentiments'][turn['sentiment']] += 1
+                bucket['intents'][turn['intent']] += 1
+
+    def merge(self, other: "TranscriptStats"):
+        self.calls += other.calls
+        self.turns += other.turns
+        self.skipped.update(other.skipped)
+        for target, source in ((self.companies, other.companies), (self.stages, other.stages)):
+            for key, values in source.items():
+                bucket = target[key]
+                for field, value in values.items():
+                    bucket[field] += value
+
+    def to_dict(self) -> Dict:
+        def plain(buckets):
+            return {key: {field: dict(value) if isinstance(value, Counter) else value
+                          for field, value in values.items()}
+                    for key, values in buckets.items()}
+        return {
+            'calls': self.calls,
+            'turns': self.turns,
+            'skipped_records': dict(self.skipped),
+            'companies': plain(self.companies),
+            'stages': plain(self.stages)
+        }
+
+
+_components = None
+
+
+def _get_components():
+    """Engine components, built once per worker process"""
+    global _components
+    if _components is None:
+        # Per-turn engine logging (including abuse warnings) is noise in batch runs
+        logging.getLogger('services').setLevel(logging.ERROR)
+        from services.ai_engine import (
+            AdvancedLanguageDetector, LightweightSentimentAnalyzer, DynamicIntentClassifier
+        )
+        from services.intent_batch import NUMPY_AVAILABLE, VectorizedIntentClassifier
+
+        intent_classifier = DynamicIntentClassifier()
+        batch_classifier = VectorizedIntentClassifier(intent_classifier.intent_patterns) if NUMPY_AVAILABLE else None
+        _components = (AdvancedLanguageDetector(), LightweightSentimentAnalyzer(), intent_classifier, batch_classifier)
+    return _components
+
+
+@lru_cache(maxsize=65536)
+def _analyze_message(message: str) -> Tuple[str, str, bool]:
+    """Language, sentiment label and abuse flag of one utterance (memoized per worker -
+    campaign transcripts repeat the same short utterances constantly)"""
+    language_detector, sentiment_analyzer, _, _ = _get_components()
+    language, _ = language_detector.detect_language(message)
+    sentiment = sentiment_analyzer.analyze_sentiment(message)['label']
+    abusive = sentiment_analyzer.detect_abusive_content(message)['is_abusive']
+    return language, sentiment, abusive
+
+
+def analyze_calls(calls: List[Dict]) -> TranscriptStats:
+    """
+    Analyze one chunk of calls (runs inside a worker process)
+
+    Args:
+        calls (List[Dict]): [{'company_id': str, 'turns': [user messages]}]
+
+    Returns:
+        TranscriptStats: Aggregates for this chunk only
+    """
+    _, _, intent_classifier, batch_classifier = _get_components()
+    from services.ai_engine import ConversationStateManager
+
+    stats = TranscriptStats()
+
+    # One matrix product for every turn in the chunk; scalar loop only without numpy
+    if batch_classifier is not None:
+        intents_per_call = batch_classifier.classify_conversations([call['turns'] for call in calls])
+    else:
+        intents_per_call = []
+        for call in calls:
+            intent_classifier.recent_intents = []
+            intents_per_call.append([intent_classifier.classify_intent(m)[:2] for m in call['turns']])
+
+    for call, intents in zip(calls, intents_per_call):
+        state = ConversationStateManager()
+        analyzed = []
+        for message, (intent, intent_confidence) in zip(call['turns'], intents):
+            language, sentiment, abusive = _analyze_message(message)
+
+            if abusive:
+                stage = 'abusive_warning'
+                intent = 'abusive'
+            elif intent == 'goodbye' and intent_confidence >= 0.45:
+                stage = 'closed'
+            else:
+                stage = state.get_current_stage('offline')
+                state.advance_stage('offline')
+
+            analyzed.append({
+                'language': language, 'sentiment': sentiment, 'intent': intent,
+                'abusive': abusive, 'stage': stage
+            })
+        stats.add_call(call['company_id'], analyzed)
+
+    return stats
+
+
+def _chunks(records: Iterable[Dict], chunk_size: int) -> Iterator[List[Dict]]:
+    calls = ({'company_id': str(_extended_json_value(record.get('companyId')) or 'unknown'),
+              'turns': extract_user_turns(record)} for record in records)
+    calls = (call for call in calls if call['turns'])
+    while True:
+        chunk = list(islice(calls, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_pipeline(records: Iterable[Dict], workers: int = None, chunk_size: int = 200) -> TranscriptStats:
+    """
+    Analyze a stream of call log records
+
+    Args:
+        records (Iterable[Dict]): Call logs (any iterator - consumed lazily)
+        workers (int): Worker processes (default: CPU count, 0 = run in-process)
+        chunk_size (int): Calls per batch sent to a worker
+
+    Returns:
+        TranscriptStats: Aggregated statistics
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    total = TranscriptStats()
+    started = time.perf_counter()
+
+    if workers <= 0:
+        for chunk in _chunks(records, chunk_size):
+            total.merge(analyze_calls(chunk))
+    else:
+        max_in_flight = workers * 2
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            for chunk in _chunks(records, chunk_size):
+                pending.add(pool.submit(analyze_calls, chunk))
+                if len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        total.merge(future.result())
+            for future in pending:
+                total.merge(future.result())
+
+    elapsed = time.perf_counter() - started
+    logger.info("Analyzed %d calls / %d turns in %.1fs", total.calls, total.turns, elapsed)
+    return total
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Offline analytics over historical call transcripts")
+    parser.add_argument('input', nargs='?', help="JSONL or mongoexport file ('-' for stdin)")
+    parser.add_argument('--mongo-uri', help="Read call logs directly from MongoDB instead of a file")
+    parser.add_argument('--database', help="MongoDB database (default: from URI)")
+    parser.add_argument('--collection', default='calllogs')
+    parser.add_argument('--since', help="Only calls created on/after this ISO date (MongoDB source)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (0 = in-process)")
+    parser.add_argument('--chunk-size', type=int, default=200, help="Calls per batch")
+    parser.add_argument('--output', help="Write JSON statistics here instead of stdout")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    skipped = Counter()
+    if args.mongo_uri:
+        since = datetime.fromisoformat(args.since) if args.since else None
+        records = iter_mongo_records(args.mongo_uri, args.database, args.collection, since)
+    elif args.input:
+        records = iter_file_records(args.input, skipped)
+    else:
+        parser.error("either an input file or --mongo-uri is required")
+
+    stats = run_pipeline(records, workers=args.workers, chunk_size=args.chunk_size)
+    stats.skipped.update(skipped)
+    if skipped:
+        logger.warning("Skipped %d input records: %s", sum(skipped.values()), dict(skipped))
+    output = json.dumps(stats.to_dict(), indent=2, ensure_ascii=False, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            handle.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 import os
 from typing import Dict
-import requests
 import uuid
 
+from services.single_flight import SingleFlight
+from services.provider_router import ProviderRouter, endpoints_from_env
+
 class TTSService:
     """
     Text-to-Speech service using Hugging Face API
@@ -17,6 +19,14 @@ class TTSService:
             "anuj": {"gender": "male", "language": "en-IN"},
             "priyanshu": {"gender": "male", "language": "en-IN"}
         }
+        # Campaign calls in the same stage synthesize identical prompts concurrently
+        self.single_flight = SingleFlight("tts")
+        # TTS_ENDPOINTS: comma-separated model URLs (mirrors / alternative models), best latency first
+        self.router = ProviderRouter(
+            "tts",
+            endpoints_from_env('TTS_ENDPOINTS', f"https://api-inference.huggingface.co/models/{self.tts_model}"),
+            headers={"Authorization": f"Bearer {self.hf_token}"} if self.hf_token else None
+        )
     
     async def synthesize_speech(self, text: str, voice: str = "ekta") -> Dict:
         """
@@ -27,39 +37,36 @@ class TTSService:
             voice (str): Voice to use for synthesis
             
         Returns:
-            Dict: Audio synthesis result
+            Dict: Audio synthesis result (shared with concurrent identical requests - read-only)
         """
+        return await self.single_flight.do((voice, text), lambda: self._synthesize(text, voice))
+    
+    async def _synthesize(self, text: str, voice: str) -> Dict:
         try:
             if not self.hf_token:
                 raise Exception("Hugging Face token not configured")
             
-            # Call Hugging Face TTS API
-            api_url = f"https://api-inference.huggingface.co/models/{self.tts_model}"
-            headers = {"Authorization": f"Bearer {self.hf_token}"}
-            
-            response = requests.post(
-                api_url,
-                headers=headers,
-                json={"inputs": text}
+            # Call Hugging Face TTS API (hedged across TTS_ENDPOINTS)
+            audio_data, endpoint = await self.router.request(
+                {"json": {"inputs": text}},
+                lambda response: response.content
             )
             
-            if response.status_code == 200:
-                audio_id = str(uuid.uuid4())[:8]
-                audio_filename = f"hf_audio_{audio_id}.wav"
-                
-                return {
-                    "audio_data": response.content,
-                    "audio_filename": audio_filename,
-                    "text_length": len(text),
-                    "voice_used": voice,
-                    "voice_info": self.available_voices.get(voice, self.available_voices["ekta"]),
-                    "provider": "huggingface",
-                    "model_used": self.tts_model,
-                    "audio_format": "wav",
-                    "success": True
-                }
-            else:
-                raise Exception(f"Hugging Face TTS API error: {response.status_code}")
+            audio_id = str(uuid.uuid4())[:8]
+            audio_filename = f"hf_audio_{audio_id}.wav"
+            
+            return {
+                "audio_data": audio_data,
+                "audio_filename": audio_filename,
+                "text_length": len(text),
+                "voice_used": voice,
+                "voice_info": self.available_voices.get(voice, self.available_voices["ekta"]),
+                "provider": "huggingface",
+                "model_used": self.tts_model,
+                "endpoint": endpoint.url,
+                "audio_format": "wav",
+                "success": True
+            }
                 
         except Exception as e:
             return {
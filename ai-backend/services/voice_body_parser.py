@@ -0,0 +1,394 @@
+"""
+Streaming parser for /voice/voice-response request bodies
+
+Large companies send hundreds of PDF chunks per turn, twice (`knowledge_base`
+and `call_data.knowledgeBase`). This parser consumes the body chunk by chunk,
+decodes `knowledge_base` one item at a time straight into the lexical KB
+scorer keeping only the top candidates, and skips the duplicate
+`call_data.knowledgeBase` copy by scanning its bytes without building objects.
+Peak memory is one KB item plus one network chunk plus the top-k candidates.
+"""
+import re
+import heapq
+import logging
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
+
+from services import json_codec
+from services.kb_cache import KBFingerprint
+from services.deadline import Deadline, STAGE_KB_PARTIAL_MATCH
+
+logger = logging.getLogger(__name__)
+
+_STRUCTURAL = re.compile(rb'["{}\[\]]')
+_STRING_SPECIAL = re.compile(rb'["\\]')
+_PRIMITIVE_END = re.compile(rb'[,}\]\s]')
+_NUMBER = rb'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?'
+_PRIMITIVE = re.compile(rb'true|false|null|' + _NUMBER)
+# What may sit between strings and brackets inside a container: separators and primitives
+_BETWEEN = re.compile(rb'(?:[ \t\r\n,:]+|(?:true|false|null|' + _NUMBER + rb')(?![0-9A-Za-z.+-]))*')
+_WHITESPACE = b' \t\r\n'
+_SEPARATORS = b' \t\r\n,:'
+
+
+class _ValueScanner:
+    """
+    Resumable scanner that finds where one JSON value ends without decoding it
+
+    Literals and numbers are checked as they are passed (`tru` is rejected as
+    json.loads would); strings and the order of separators are not.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.primitive = False
+        self.in_string = False
+        self.depth = 0
+        self.pos = 0
+
+    def scan(self, buf: bytearray, final: bool) -> Optional[int]:
+        """Return the end offset (exclusive) of the value, or None if more data is needed"""
+        pos = self.pos
+        if not self.started:
+            self.started = True
+            first = buf[pos]
+            if first == 0x22:
+                self.in_string = True
+                pos += 1
+            elif first in (0x7b, 0x5b):
+                self.depth = 1
+                pos += 1
+            else:
+                self.primitive = True
+
+        if self.primitive:
+            # self.pos stays on the literal's first byte until the whole literal has arrived
+            match = _PRIMITIVE_END.search(buf, pos)
+            if match is None and not final:
+                return None
+            end = match.start() if match else len(buf)
+            if not _PRIMITIVE.fullmatch(buf, pos, end):
+                raise json_codec.JSONDecodeError("Invalid literal", "", pos)
+            return end
+
+        while True:
+            if self.in_string:
+                match = _STRING_SPECIAL.search(buf, pos)
+                if match is None:
+                    self.pos = len(buf)
+                    return None
+                if buf[match.start()] == 0x5c:
+                    if match.start() + 1 >= len(buf):
+                        self.pos = match.start()
+                        return None
+                    pos = match.start() + 2
+                    continue
+                pos = match.end()
+                self.in_string = False
+                if self.depth == 0:
+                    return pos
+            else:
+                match = _STRUCTURAL.search(buf, pos)
+                if match is None:
+                    # Resume at the start of this stretch: a literal may continue in the next chunk
+                    self.pos = pos
+                    return None
+                start = match.start()
+                # Most gaps are just ':', ',' and spaces; only ones with a literal in them need the regex
+                if start != pos and buf[pos:start].strip(_SEPARATORS):
+                    between = _BETWEEN.match(buf, pos, start)
+                    if between.end() != start:
+                        raise json_codec.JSONDecodeError("Invalid literal", "", between.end())
+                pos = match.end()
+                char = buf[match.start()]
+                if char == 0x22:
+                    self.in_string = True
+                elif char in (0x7b, 0x5b):
+                    self.depth += 1
+                else:
+                    self.depth -= 1
+                    if self.depth == 0:
+                        return pos
+
+
+class StreamingKBSelector:
+    """
+    Keeps the top-k KB items by lexical score while items stream in
+
+    With a deadline, items are scored without the partial-match pass once it
+    has expired; the kept candidates are rescored the same way so every item
+    competes on the same scale.
+    """
+
+    def __init__(self, score_item: Callable[[set, Dict, bool], float], query_terms: Callable[[str], set],
+                 top_k: int, keep_all: bool = False, deadline: Deadline = None):
+        self.score_item = score_item
+        self.query_terms = query_terms
+        self.top_k = top_k
+        self.keep_all = keep_all
+        self.deadline = deadline
+        self.partial = True
+        self.fingerprint = KBFingerprint()
+        self.item_count = 0
+        self._terms: Optional[set] = None
+        self._heap: List[Tuple[float, int, Dict]] = []
+        self._pending: List[Dict] = []
+
+    def set_query(self, user_message: str):
+        # The caller's own words, exactly as the full-body path scores them
+        self._terms = self.query_terms(user_message)
+        pending, self._pending = self._pending, []
+        for index, item in enumerate(pending):
+            self._offer(index, item)
+
+    def add(self, item: Any):
+        if not isinstance(item, dict):
+            return
+        self.fingerprint.update(item)
+        index = self.item_count
+        self.item_count += 1
+        if self.keep_all or self._terms is None:
+            # No question yet (or semantic retrieval needs every chunk): keep the item
+            self._pending.append(item)
+        else:
+            self._offer(index, item)
+
+    def _offer(self, index: int, item: Dict):
+        if self.partial and self.deadline is not None and self.deadline.expired():
+            self._drop_partial_match()
+        score = self.score_item(self._terms, item, self.partial)
+        if score <= 0:
+            return
+        # Equal scores prefer the earlier item, matching heapq.nlargest over the full list
+        entry = (score, -index, item)
+        if len(self._heap) < self.top_k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def _drop_partial_match(self):
+        self.partial = False
+        self.deadline.degrade(STAGE_KB_PARTIAL_MATCH)
+        rescored = [(self.score_item(self._terms, item, False), negative_index, item)
+                    for _, negative_index, item in self._heap]
+        self._heap = [entry for entry in rescored if entry[0] > 0]
+        heapq.heapify(self._heap)
+
+    def candidates(self) -> List[Dict]:
+        """Selected items in original KB order"""
+        if self.keep_all or self._terms is None:
+            return self._pending
+        return [item for _, _, item in sorted(self._heap, key=lambda entry: -entry[1])]
+
+
+class VoiceBodyParser:
+    """
+    Incremental parser for a VoiceRequest JSON object
+
+    Feed raw body chunks with feed() and call close() at the end; the result is
+    the request dict with `knowledge_base` replaced by the selected candidates.
+    """
+
+    def __init__(self, selector: StreamingKBSelector):
+        self.selector = selector
+        self.fields: Dict[str, Any] = {}
+        self.result: Any = self.fields
+        self._buf = bytearray()
+        self._pos = 0
+        # Body bytes already dropped from the front of _buf (errors report absolute offsets)
+        self._offset = 0
+        self._final = False
+        self._done = False
+        self._parser = self._parse()
+        next(self._parser)
+
+    def feed(self, data: bytes):
+        if self._done or not data:
+            return
+        self._buf += data
+        self._resume()
+
+    def close(self) -> Any:
+        if not self._done:
+            self._final = True
+            self._resume()
+        if not self._done:
+            raise self._error("Unexpected end of request body", len(self._buf))
+        return self.result
+
+    def _resume(self):
+        try:
+            self._parser.send(None)
+        except StopIteration:
+            self._done = True
+
+    # -- parsing primitives (generators yield when they need more data) --
+
+    def _error(self, message: str, pos: int = None) -> json_codec.JSONDecodeError:
+        """Decode error at a buffer position (default: the current one), reported as a body offset"""
+        return json_codec.JSONDecodeError(message, "", self._offset + (self._pos if pos is None else pos))
+
+    def _drop(self, count: int):
+        del self._buf[:count]
+        self._offset += count
+
+    def _compact(self):
+        if self._pos:
+            self._drop(self._pos)
+            self._pos = 0
+
+    def _need_more(self) -> Generator:
+        if self._final:
+            raise self._error("Unexpected end of request body", len(self._buf))
+        yield
+
+    def _peek(self) -> Generator:
+        while True:
+            buf = self._buf
+            while self._pos < len(buf) and buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(buf):
+                return chr(buf[self._pos])
+            self._compact()
+            yield from self._need_more()
+
+    def _expect(self, char: str) -> Generator:
+        found = yield from self._peek()
+        if found != char:
+            raise self._error(f"Expected '{char}'")
+        self._pos += 1
+
+    def _value(self, skip: bool = False) -> Generator:
+        """Read one complete value; decode it unless skip=True (then bytes are dropped as scanned)"""
+        yield from self._peek()
+        self._compact()
+        scanner = _ValueScanner()
+        while True:
+            try:
+                end = scanner.scan(self._buf, self._final)
+            except json_codec.JSONDecodeError as e:
+                raise self._error(e.msg, e.pos) from None
+            if end is not None:
+                break
+            if skip:
+                self._drop(scanner.pos)
+                scanner.pos = 0
+            yield from self._need_more()
+        if skip:
+            self._pos = end
+            self._compact()
+            return None
+        try:
+            value = json_codec.loads(bytes(self._buf[:end]))
+        except json_codec.JSONDecodeError as e:
+            raise self._error(e.msg, e.pos) from None
+        self._pos = end
+        self._compact()
+        return value
+
+    def _members(self) -> Generator:
+        """Iterate over object keys; the caller consumes each value before the next step"""
+        first = True
+        while True:
+            char = yield from self._peek()
+            if char == '}':
+                self._pos += 1
+                return
+            if not first:
+                if char != ',':
+                    raise self._error("Expected ',' or '}'")
+                self._pos += 1
+            first = False
+            key = yield from self._value()
+            yield from self._expect(':')
+            yield key
+
+    # -- VoiceRequest structure --
+
+    def _parse(self) -> Generator:
+        yield
+        char = yield from self._peek()
+        if char != '{':
+            # Not an object - decode as-is and let request validation report it
+            self.result = yield from self._value()
+            yield from self._end()
+            return
+        self._pos += 1
+        members = self._members()
+        while True:
+            key = yield from self._next_key(members)
+            if key is None:
+                break
+            if key == 'knowledge_base':
+                yield from self._knowledge_base()
+            elif key == 'call_data':
+                yield from self._call_data()
+            else:
+                value = yield from self._value()
+                self.fields[key] = value
+                if key == 'user_message' and isinstance(value, str):
+                    self.selector.set_query(value)
+        self.fields['knowledge_base'] = self.selector.candidates()
+        yield from self._end()
+
+    def _end(self) -> Generator:
+        """Only whitespace may follow the top-level value (as with json.loads)"""
+        while True:
+            buf = self._buf
+            while self._pos < len(buf) and buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(buf):
+                raise self._error("Extra data")
+            self._compact()
+            if self._final:
+                return
+            yield
+
+    def _next_key(self, members: Generator) -> Generator:
+        """Advance a _members() generator, forwarding its 'need more data' pauses"""
+        while True:
+            try:
+                key = next(members)
+            except StopIteration:
+                return None
+            if key is not None:
+                return key
+            yield
+
+    def _knowledge_base(self) -> Generator:
+        char = yield from self._peek()
+        if char != '[':
+            yield from self._value(skip=True)
+            return
+        self._pos += 1
+        first = True
+        while True:
+            char = yield from self._peek()
+            if char == ']':
+                self._pos += 1
+                return
+            if not first:
+                if char != ',':
+                    raise self._error("Expected ',' or ']'")
+                self._pos += 1
+            first = False
+            item = yield from self._value()
+            self.selector.add(item)
+
+    def _call_data(self) -> Generator:
+        char = yield from self._peek()
+        if char != '{':
+            self.fields['call_data'] = yield from self._value()
+            return
+        self._pos += 1
+        call_data = {}
+        members = self._members()
+        while True:
+            key = yield from self._next_key(members)
+            if key is None:
+                break
+            if key == 'knowledgeBase':
+                # Duplicate of knowledge_base - scanned and dropped without materializing
+                yield from self._value(skip=True)
+            else:
+                call_data[key] = yield from self._value()
+        self.fields['call_data'] = call_data
@@ -0,0 +1,27 @@
+"""In-process uvicorn servers for tests against the bundled fakes (tools/fake_*.py)"""
+import asyncio
+import socket
+
+import uvicorn
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def serve(app):
+    """Start app on a free port of the running loop; returns (server, base URL)"""
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error"))
+    asyncio.ensure_future(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def stop(*servers):
+    for server in servers:
+        server.should_exit = True
+    await asyncio.sleep(0.1)
@@ -0,0 +1,130 @@
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import FastAPI
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocketDisconnect
+from fastapi.testclient import TestClient
+
+from middleware import admission
+from middleware.admission import AdmissionController, AdmissionMiddleware, WS_CLOSE_TRY_AGAIN_LATER
+from routers import voice_router
+from services.loop_monitor import LoopMonitor
+
+
+async def chat(request):
+    return JSONResponse({"response": "ok"})
+
+
+async def echo(websocket):
+    await websocket.accept()
+    await websocket.send_text(await websocket.receive_text())
+    await websocket.close()
+
+
+def make_client(monkeypatch, **env):
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    monitor = LoopMonitor()
+    monkeypatch.setattr(admission, 'loop_monitor', monitor)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        # As in app.py: the monitor starts once at startup, not per request
+        monitor.start()
+        yield
+
+    app = Starlette(routes=[Route('/ai/chat', chat, methods=['POST']), WebSocketRoute('/voice/ws', echo)],
+                    lifespan=lifespan)
+    return TestClient(AdmissionMiddleware(app, controller=AdmissionController())), monitor
+
+
+def overload(monitor):
+    for _ in range(20):
+        monitor.record_lag(1.0)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # The probe is not started: the tests feed lag samples directly
+    return make_client(monkeypatch, LOOP_MONITOR_ENABLED='false', LOOP_MONITOR_WARMUP_S='0')
+
+
+def test_single_stall_does_not_shed_chat(client):
+    client, monitor = client
+    for _ in range(40):
+        monitor.record_lag(0.002)
+    monitor.record_lag(0.5)
+
+    response = client.post('/ai/chat', json={"message": "hi"})
+
+    assert response.status_code == 200
+    assert monitor.max_lag == 0.5
+
+
+def test_sustained_lag_sheds_chat(client):
+    client, monitor = client
+    for _ in range(20):
+        monitor.record_lag(0.3)
+
+    response = client.post('/ai/chat', json={"message": "hi"})
+
+    assert response.status_code == 503
+    assert response.headers['X-Admission'] == 'shed'
+
+
+def test_lag_during_warmup_is_ignored(monkeypatch):
+    client, monitor = make_client(monkeypatch, LOOP_MONITOR_WARMUP_S='60')
+    with client:
+        # Startup started the monitor and its warm-up window
+        assert client.post('/ai/chat', json={"message": "hi"}).status_code == 200
+        for _ in range(20):
+            monitor.record_lag(0.5)
+
+        assert client.post('/ai/chat', json={"message": "hi"}).status_code == 200
+        assert monitor.sustained_lag == 0.0
+
+
+def test_overloaded_websocket_handshake_is_refused(client):
+    client, monitor = client
+    with client.websocket_connect('/voice/ws') as websocket:
+        websocket.send_text('hello')
+        assert websocket.receive_text() == 'hello'
+
+    overload(monitor)
+    with pytest.raises(WebSocketDisconnect) as refused:
+        with client.websocket_connect('/voice/ws'):
+            pass
+    assert refused.value.code == WS_CLOSE_TRY_AGAIN_LATER
+
+
+def test_overloaded_utterance_gets_fallback_turn(monkeypatch):
+    monkeypatch.setenv('LOOP_MONITOR_ENABLED', 'false')
+    monkeypatch.setenv('LOOP_MONITOR_WARMUP_S', '0')
+    monitor = LoopMonitor()
+    monkeypatch.setattr(admission, 'loop_monitor', monitor)
+    controller = AdmissionController()
+    monkeypatch.setattr(voice_router, 'admission_controller', controller)
+
+    async def refuse(*args, **kwargs):
+        raise AssertionError("an overloaded turn must not reach the engine")
+
+    monkeypatch.setattr(voice_router, '_process_voice_request', refuse)
+    app = FastAPI()
+    app.include_router(voice_router.router, prefix='/voice')
+
+    with TestClient(AdmissionMiddleware(app, controller=controller)).websocket_connect('/voice/ws') as websocket:
+        websocket.send_json({"type": "start", "call_sid": "CA-shed", "knowledge_base": []})
+        assert websocket.receive_json()['type'] == 'ready'
+        # Load rises mid-call, after the handshake was admitted
+        overload(monitor)
+        websocket.send_json({"type": "utterance", "user_message": "hello", "turn_id": 1})
+        response = websocket.receive_json()
+
+    assert response['type'] == 'response'
+    assert response['turn_id'] == 1
+    assert response['degraded_stages'] == ['admission']
+    assert controller.shed['voice'] == 1
+    assert controller.in_flight == 0
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from starlette.requests import Request
+
+from routers import voice_router
+from services import cancellation
+from services.ai_engine import ai_engine
+from services.cancellation import CLIENT_CLOSED_REQUEST, CancellationStats, run_until_disconnect
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    stats = CancellationStats()
+    monkeypatch.setattr(cancellation, 'cancellation_stats', stats)
+    return stats
+
+
+class Client:
+    """ASGI receive channel: the request body, then a disconnect once the test hangs up"""
+
+    def __init__(self, body: bytes = b''):
+        self.body = body
+        self.hung_up = asyncio.Event()
+
+    async def receive(self):
+        if self.body is not None:
+            body, self.body = self.body, None
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await self.hung_up.wait()
+        return {'type': 'http.disconnect'}
+
+
+class Work:
+    """Engine work that runs until cancelled (or until released)"""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.cancelled = False
+
+    async def run(self, *args, **kwargs):
+        self.started.set()
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return {"ai_response": "done"}
+
+
+def http_scope(path: str = '/', headers=()):
+    return {'type': 'http', 'method': 'POST', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+            'scheme': 'http', 'query_string': b'', 'headers': list(headers), 'server': ('test', 80),
+            'client': ('127.0.0.1', 5000), 'http_version': '1.1'}
+
+
+def test_disconnect_cancels_work_and_returns_499(stats):
+    async def scenario():
+        client, work = Client(), Work()
+        request = Request(http_scope(), client.receive)
+        await request.body()
+        handler = asyncio.ensure_future(run_until_disconnect(request, work.run(), 'test'))
+        await work.started.wait()
+
+        client.hung_up.set()
+        response = await asyncio.wait_for(handler, 1)
+
+        assert response.status_code == CLIENT_CLOSED_REQUEST
+        assert work.cancelled
+        assert stats.get_stats()['test']['cancelled'] == 1
+        assert stats.get_stats()['test']['completed'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_finished_work_returns_its_result(stats):
+    async def scenario():
+        client, work = Client(), Work()
+        request = Request(http_scope(), client.receive)
+        await request.body()
+        work.release.set()
+
+        assert await run_until_disconnect(request, work.run(), 'test') == {"ai_response": "done"}
+        assert not work.cancelled
+        assert stats.get_stats()['test'] == {"completed": 1, "cancelled": 0, "cancelled_ms_total": 0.0}
+
+    asyncio.run(scenario())
+
+
+def test_voice_response_engine_task_is_cancelled_on_hang_up(stats, monkeypatch):
+    work = Work()
+    monkeypatch.setattr(ai_engine, 'generate_response', work.run)
+    app = FastAPI()
+    app.include_router(voice_router.router, prefix='/voice')
+
+    async def scenario():
+        client = Client(b'{"user_message": "What does the basic plan cost?", "call_sid": "CA-hang-up"}')
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = http_scope('/voice/voice-response', [(b'content-type', b'application/json')])
+        handler = asyncio.ensure_future(app(scope, client.receive, send))
+        await asyncio.wait_for(work.started.wait(), 1)
+
+        client.hung_up.set()
+        await asyncio.wait_for(handler, 1)
+
+        assert work.cancelled
+        assert sent[0]['status'] == CLIENT_CLOSED_REQUEST
+        assert stats.get_stats()['voice_response']['cancelled'] == 1
+
+    asyncio.run(scenario())
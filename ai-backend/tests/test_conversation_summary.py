@@ -0,0 +1,24 @@
+from services.ai_engine import ConversationMemory
+from services.call_session import CallSessionStore, MEMORY_EXCHANGES
+from services.conversation_summary import FOLD_BATCH
+
+
+def test_evicted_exchanges_stay_in_context_until_their_batch_is_folded():
+    memory = ConversationMemory(CallSessionStore())
+    memory.add_message("CA1", "My account number is 4471.", "Thank you, I have found account 4471.", "english")
+    for turn in range(MEMORY_EXCHANGES):
+        memory.add_message("CA1", f"Question {turn} about the evening drops?", "Let me check that.", "english")
+
+    summary, recent = memory.get_prompt_context("CA1")
+    assert summary is None
+    assert recent[0]['user'] == "My account number is 4471."
+
+    for turn in range(FOLD_BATCH - 1):
+        memory.add_message("CA1", "Is a technician visit available?", "Yes, on Thursday.", "english")
+
+    summary, recent = memory.get_prompt_context("CA1")
+    call_summary = memory.sessions.peek("CA1").summary
+    assert call_summary.pending == []
+    assert all(len(note) == 3 for note in call_summary.notes)
+    assert "4471" in summary
+    assert len(recent) == MEMORY_EXCHANGES
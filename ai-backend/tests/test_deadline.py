@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import voice_router
+from services.ai_engine import ai_engine
+from services.deadline import (
+    DEFAULT_DEADLINE_MS, STAGE_EXTRACT_PARTIAL_MATCH, STAGE_KB_PARTIAL_MATCH, STAGE_SENTIMENT,
+    Deadline, deadline_from_request
+)
+from services.kb_cache import kb_query_cache
+
+QUESTION = "How much does the basic plan cost?"
+KNOWLEDGE_BASE = [
+    {"title": f"Plan {index}", "chunk_id": str(index),
+     "content": "Our basic plan costs 500 rupees per month. Premium plans cost more and include support."}
+    for index in range(30)
+]
+
+
+@pytest.fixture(autouse=True)
+def fresh_kb_cache():
+    # A cached KB lookup would hide which stages this request had to skip
+    kb_query_cache.clear()
+    yield
+    kb_query_cache.clear()
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(voice_router.router, prefix='/voice')
+    return TestClient(app)
+
+
+def generate(deadline: Deadline, call_sid: str):
+    return asyncio.run(ai_engine.generate_response(
+        user_message=QUESTION,
+        call_data={"companyName": "Acme"},
+        voice_settings={},
+        call_sid=call_sid,
+        knowledge_base=KNOWLEDGE_BASE,
+        deadline=deadline
+    ))
+
+
+def test_header_takes_precedence_over_field():
+    started = time.monotonic()
+    assert deadline_from_request('250', 5000, started).budget == 0.25
+    assert deadline_from_request(None, 5000, started).budget == 5.0
+    # An unusable header falls back to the field, then to the default
+    assert deadline_from_request('soon', 5000, started).budget == 5.0
+    assert deadline_from_request('-1', None, started).budget == DEFAULT_DEADLINE_MS / 1000
+
+
+def test_expired_deadline_skips_optional_stages():
+    result = generate(Deadline(0), 'CA-deadline-expired')
+
+    assert {STAGE_SENTIMENT, STAGE_KB_PARTIAL_MATCH, STAGE_EXTRACT_PARTIAL_MATCH} <= set(result['degraded_stages'])
+    # Still a KB answer, just without the optional passes
+    assert '500 rupees' in result['ai_response']
+    assert result['sentiment']['label'] == 'neutral'
+
+
+def test_generous_deadline_runs_every_stage():
+    result = generate(Deadline(60000), 'CA-deadline-generous')
+
+    assert result['degraded_stages'] == []
+    assert '500 rupees' in result['ai_response']
+
+
+def test_deadline_header_overrides_body_field(client):
+    def turn(headers, deadline_ms):
+        kb_query_cache.clear()
+        response = client.post('/voice/voice-response', headers=headers, json={
+            "user_message": QUESTION,
+            "call_sid": "CA-deadline-http",
+            "knowledge_base": KNOWLEDGE_BASE,
+            "deadline_ms": deadline_ms
+        })
+        assert response.status_code == 200
+        return response.json()['degraded_stages']
+
+    # A 1 ms header beats a generous body budget...
+    assert STAGE_SENTIMENT in turn({'X-Deadline-Ms': '1'}, 60000)
+    # ...and a generous header beats a 1 ms body budget
+    assert turn({'X-Deadline-Ms': '60000'}, 1) == []
+    # Without the header the body field applies
+    assert STAGE_SENTIMENT in turn({}, 1)
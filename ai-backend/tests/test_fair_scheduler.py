@@ -0,0 +1,138 @@
+import asyncio
+
+from services.fair_scheduler import FairScheduler, LANE_BATCH, LANE_LIVE_VOICE, LANE_TEXT_CHAT
+
+WEIGHTS = {LANE_LIVE_VOICE: 3.0, LANE_TEXT_CHAT: 2.0, LANE_BATCH: 1.0}
+
+
+async def hold(scheduler: FairScheduler, tenant: str, lane: str, granted: list, release: asyncio.Event):
+    async with scheduler.slot(tenant, lane):
+        granted.append((tenant, lane))
+        await release.wait()
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_tenant_cap_leaves_slots_for_other_tenants():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=4, tenant_max_concurrency=2, lane_weights=WEIGHTS)
+        granted, release = [], asyncio.Event()
+        campaign = [asyncio.ensure_future(hold(scheduler, 'bulk', LANE_LIVE_VOICE, granted, release)) for _ in range(6)]
+        await settle()
+        assert scheduler.running_by_tenant == {'bulk': 2}
+        assert scheduler.get_stats()['tenants']['bulk']['queued'] == 4
+
+        # Free slots exist, but the capped tenant cannot take them; another tenant can
+        others = [asyncio.ensure_future(hold(scheduler, 'acme', LANE_LIVE_VOICE, granted, release)) for _ in range(2)]
+        await settle()
+        assert scheduler.running_by_tenant == {'bulk': 2, 'acme': 2}
+
+        release.set()
+        await asyncio.gather(*campaign, *others)
+        assert granted.count(('bulk', LANE_LIVE_VOICE)) == 6
+        assert scheduler.running == 0
+
+    asyncio.run(scenario())
+
+
+def test_lanes_share_slots_by_weight():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, tenant_max_concurrency=1, lane_weights=WEIGHTS)
+        granted, blocker_release, release = [], asyncio.Event(), asyncio.Event()
+        release.set()
+        blocker = asyncio.ensure_future(hold(scheduler, 'blocker', LANE_BATCH, [], blocker_release))
+        await settle()
+
+        jobs = []
+        for _ in range(12):
+            jobs.append(asyncio.ensure_future(hold(scheduler, 'acme', LANE_BATCH, granted, release)))
+            jobs.append(asyncio.ensure_future(hold(scheduler, 'globex', LANE_LIVE_VOICE, granted, release)))
+        await settle()
+        blocker_release.set()
+        await asyncio.gather(blocker, *jobs)
+
+        # While both lanes are backlogged, live voice gets 3 slots for every batch slot
+        first = [lane for _, lane in granted[:12]]
+        assert first.count(LANE_LIVE_VOICE) == 9
+        assert first.count(LANE_BATCH) == 3
+        # Once live voice has drained, batch is not starved
+        assert len(granted) == 24
+
+    asyncio.run(scenario())
+
+
+def test_tenants_share_a_lane_equally():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, tenant_max_concurrency=1, lane_weights=WEIGHTS)
+        granted, blocker_release, release = [], asyncio.Event(), asyncio.Event()
+        release.set()
+        blocker = asyncio.ensure_future(hold(scheduler, 'blocker', LANE_LIVE_VOICE, [], blocker_release))
+        await settle()
+
+        # A big campaign queued first, then a small tenant's calls
+        jobs = [asyncio.ensure_future(hold(scheduler, 'bulk', LANE_LIVE_VOICE, granted, release)) for _ in range(10)]
+        await settle()
+        jobs += [asyncio.ensure_future(hold(scheduler, 'acme', LANE_LIVE_VOICE, granted, release)) for _ in range(3)]
+        await settle()
+        blocker_release.set()
+        await asyncio.gather(blocker, *jobs)
+
+        # The small tenant is not queued behind the whole campaign
+        tenants = [tenant for tenant, _ in granted]
+        assert tenants[:6].count('acme') == 3
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_is_skipped_and_cleaned_up():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, tenant_max_concurrency=1, lane_weights=WEIGHTS)
+        granted, release = [], asyncio.Event()
+        running = asyncio.ensure_future(hold(scheduler, 'acme', LANE_LIVE_VOICE, granted, release))
+        gone = asyncio.ensure_future(hold(scheduler, 'acme', LANE_LIVE_VOICE, granted, release))
+        waiting = asyncio.ensure_future(hold(scheduler, 'acme', LANE_LIVE_VOICE, granted, release))
+        await settle()
+
+        gone.cancel()
+        await settle()
+        assert scheduler.cancelled_while_queued == 1
+        assert scheduler.get_stats()['queued'] == 1
+
+        release.set()
+        await asyncio.gather(running, waiting)
+        assert gone.cancelled()
+        assert len(granted) == 2
+        # Nothing left behind: no slots held, no queued flows, no stale virtual-time tags
+        assert scheduler.running == 0
+        assert scheduler.running_by_tenant == {}
+        assert scheduler._flows == {}
+        assert scheduler._flow_finish == {}
+
+    asyncio.run(scenario())
+
+
+def test_waiter_cancelled_as_it_is_granted_hands_the_slot_on():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, tenant_max_concurrency=1, lane_weights=WEIGHTS)
+        granted, first_release, release = [], asyncio.Event(), asyncio.Event()
+        release.set()
+        first = asyncio.ensure_future(hold(scheduler, 'acme', LANE_LIVE_VOICE, granted, first_release))
+        unlucky = asyncio.ensure_future(hold(scheduler, 'acme', LANE_LIVE_VOICE, granted, release))
+        last = asyncio.ensure_future(hold(scheduler, 'acme', LANE_LIVE_VOICE, granted, release))
+        await settle()
+
+        # The slot is granted to the next waiter and, in the same tick, its caller goes away
+        first_release.set()
+        await asyncio.sleep(0)
+        assert first.done() and scheduler.running_by_tenant == {'acme': 1}
+        unlucky.cancel()
+        await asyncio.gather(unlucky, last, return_exceptions=True)
+
+        assert unlucky.cancelled()
+        assert len(granted) == 2
+        assert scheduler.running == 0
+
+    asyncio.run(scenario())
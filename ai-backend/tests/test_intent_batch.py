@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from services.ai_engine import DynamicIntentClassifier
+
+pytest.importorskip("numpy")
+
+FILLER = "hello sir the i am calling about my account today please ok so".split()
+
+
+def sequential(messages, recent_intents=None):
+    """The scalar path: classify_intent on each message in order, carrying the call's continuity state"""
+    classifier = DynamicIntentClassifier()
+    state = list(recent_intents or [])
+    return [classifier.classify_intent(message, state)[:2] for message in messages]
+
+
+def conversations(count: int, turns: int, seed: int = 7):
+    patterns = DynamicIntentClassifier().intent_patterns
+    vocabulary = [term for p in patterns.values()
+                  for term in p['keywords'] + p.get('phrases', []) + p.get('negative_context', [])]
+    rng = random.Random(seed)
+    result = []
+    for _ in range(count):
+        conversation = []
+        for _ in range(turns):
+            words = rng.sample(FILLER, 3) + rng.sample(vocabulary, rng.randint(0, 4))
+            rng.shuffle(words)
+            conversation.append(" ".join(words).capitalize() + rng.choice(["?", ".", ""]))
+        result.append(conversation)
+    return result
+
+
+def test_batch_matches_sequential_classify_intent():
+    classifier = DynamicIntentClassifier()
+    for conversation in conversations(300, 8):
+        assert classifier.classify_batch(conversation) == sequential(conversation)
+    # The batch path never touches the instance's own continuity state
+    assert classifier.recent_intents == []
+
+
+def test_continuity_bonus_changes_results_and_still_matches():
+    changed = 0
+    for conversation in conversations(300, 8, seed=3):
+        without_continuity = [DynamicIntentClassifier().classify_intent(message)[:2] for message in conversation]
+        with_continuity = sequential(conversation)
+        changed += with_continuity != without_continuity
+        assert DynamicIntentClassifier().classify_batch(conversation) == with_continuity
+    # Otherwise the parity above would not cover the bonus at all
+    assert changed > 0
+
+
+def test_bonus_lifts_a_weak_follow_up_over_the_threshold():
+    # Two goodbye keywords score 6 / 15 = 0.4, under the 0.45 threshold;
+    # right after a goodbye turn the bonus adds 1.5 / 15
+    follow_up = "bye, that's enough"
+    assert sequential([follow_up]) == [('question', 0.5)]
+    assert sequential([follow_up], ['goodbye']) == [('goodbye', 0.5)]
+
+    classifier = DynamicIntentClassifier()
+    assert classifier.classify_batch([follow_up]) == [('question', 0.5)]
+    assert classifier.classify_batch([follow_up], ['goodbye']) == [('goodbye', 0.5)]
+    assert classifier.classify_batch(["ok goodbye, talk later", follow_up]) == \
+        sequential(["ok goodbye, talk later", follow_up])
+
+
+def test_starting_state_and_empty_messages():
+    messages = ["", "I want to buy this", "", "ok thanks"]
+    for state in (None, ['pricing'], ['complaint', 'purchase']):
+        assert DynamicIntentClassifier().classify_batch(messages, state) == sequential(messages, state)
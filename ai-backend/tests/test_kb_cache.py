@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from services.ai_engine import ai_engine
+from services.kb_cache import kb_query_cache, normalize_question
+
+KNOWLEDGE_BASE = [
+    {"title": "Pricing", "chunk_id": "p1", "content": "Our e-commerce plan costs 999 rupees per month."},
+    {"title": "Delivery", "chunk_id": "d1", "content": "डिलीवरी में तीन दिन लगेंगे और शिपिंग मुफ्त है।"},
+    {"title": "Plans", "chunk_id": "h1", "content": "सालाना प्लान कितना लगेगा यह कंपनी तय करती है, अभी 9999 रुपये।"},
+    {"title": "Support", "chunk_id": "s1", "content": "Support is available from 9 AM to 6 PM on weekdays."},
+]
+
+
+@pytest.mark.parametrize('question, normalized', [
+    ('कितना लगेगा?', 'कितना लगेगा'),
+    ('e-commerce pricing?', 'e-commerce pricing'),
+    ("  What's the PRICE?! ", "what's the price"),
+    ('डिलीवरी कब होगी।', 'डिलीवरी कब होगी'),
+])
+def test_normalize_question_keeps_marks_and_joiners(question, normalized):
+    assert normalize_question(question) == normalized
+
+
+@pytest.mark.parametrize('question', ['सालाना प्लान कितना लगेगा?', 'डिलीवरी में कितने दिन लगेंगे?', 'e-commerce plan?'])
+def test_cached_lookup_matches_uncached_retrieval(question):
+    kb_query_cache.clear()
+    baseline = ai_engine._retrieve_knowledge_chunks(question, KNOWLEDGE_BASE)
+    assert baseline, "the uncached retrieval finds the chunk"
+
+    first = asyncio.run(ai_engine._lookup_knowledge_base(question, KNOWLEDGE_BASE))
+    cached = asyncio.run(ai_engine._lookup_knowledge_base(question, KNOWLEDGE_BASE))
+
+    assert cached is first
+    assert first['question'] == question
+    assert [chunk['chunk_ids'] for chunk in first['chunks']] == [chunk['chunk_ids'] for chunk in baseline]
@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+import pytest
+
+from services.deadline import Deadline, STAGE_LLM, stage_costs
+from services.llm_service import LLMService, SentenceSplitter
+from tests.local_server import free_port, serve, stop
+from tools.fake_openai import create_app
+
+
+@pytest.fixture
+def llm_env(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+    monkeypatch.setenv("LLM_TIMEOUT_S", "2")
+    monkeypatch.setenv("MAX_TOKENS", "200")
+
+
+async def stub_service(monkeypatch, **timing):
+    server, base_url = await serve(create_app(seed=1, **timing))
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{base_url}/v1")
+    return server, LLMService()
+
+
+def messages(question: str):
+    return [{"role": "system", "content": "You are a helpful agent."}, {"role": "user", "content": question}]
+
+
+def test_splitter_keeps_abbreviations_and_splits_on_danda():
+    text = "Dr. Sharma will call, e.g. at 5 PM. नमस्ते। आप कैसे हैं? Thanks"
+    expected = ["Dr. Sharma will call, e.g. at 5 PM.", "नमस्ते।", "आप कैसे हैं?"]
+
+    whole = SentenceSplitter()
+    assert whole.feed(text) == expected
+    assert whole.flush() == "Thanks"
+
+    streamed = SentenceSplitter()
+    pieces = [sentence for char in text for sentence in streamed.feed(char)]
+    assert pieces == expected
+    assert streamed.flush() == "Thanks"
+
+
+def test_first_sentence_arrives_before_the_stream_ends(llm_env, monkeypatch):
+    async def scenario():
+        server, llm = await stub_service(monkeypatch, first_token_ms=20, token_ms=20)
+        arrivals = []
+
+        async def on_sentence(sentence):
+            arrivals.append((time.perf_counter(), sentence))
+
+        try:
+            result = await llm.generate_streaming(messages("What is your pricing?"), on_sentence=on_sentence)
+            finished = time.perf_counter()
+        finally:
+            await stop(server)
+
+        assert result is not None and not result["truncated"]
+        assert [sentence for _, sentence in arrivals] == result["sentences"]
+        assert len(result["sentences"]) == 3
+        assert result["sentences"][0] == "Thanks for asking about What is your pricing."
+        # The rest of the reply is still ~15 tokens (20 ms each) away when the first sentence is handed over
+        assert finished - arrivals[0][0] > 0.15
+
+    asyncio.run(scenario())
+
+
+def test_stub_stream_is_split_on_the_danda(llm_env, monkeypatch):
+    async def scenario():
+        server, llm = await stub_service(monkeypatch, first_token_ms=5, token_ms=1)
+        try:
+            result = await llm.generate_streaming(messages("नमस्ते। डिलीवरी कब होगी?"))
+        finally:
+            await stop(server)
+
+        assert result["sentences"][:2] == ["Thanks for asking about नमस्ते।", "डिलीवरी कब होगी."]
+
+    asyncio.run(scenario())
+
+
+def test_stream_is_truncated_when_the_deadline_expires(llm_env, monkeypatch):
+    # The LLM stage must look affordable up front, or generation is skipped before it starts
+    monkeypatch.setitem(stage_costs.costs, STAGE_LLM, 0.1)
+
+    async def scenario():
+        server, llm = await stub_service(monkeypatch, first_token_ms=10, token_ms=40)
+        deadline = Deadline(budget_ms=600)
+        deadline.reserve = 0.0
+        try:
+            started = time.perf_counter()
+            result = await llm.generate_streaming(messages("What is your pricing?"), deadline=deadline)
+            elapsed = time.perf_counter() - started
+        finally:
+            await stop(server)
+
+        # The full reply is ~20 tokens x 40 ms; what was streamed before the deadline stands
+        assert elapsed < 0.75
+        assert result["truncated"]
+        assert 1 <= len(result["sentences"]) < 3
+        assert STAGE_LLM in deadline.degraded
+        assert llm.truncated == 1
+
+    asyncio.run(scenario())
+
+
+def test_connect_error_falls_back_to_templates(llm_env, monkeypatch):
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{free_port()}/v1")
+    llm = LLMService()
+
+    answer = asyncio.run(llm.generate_response_with_knowledge("Tell me about machine learning", check_cache=False))
+
+    assert answer["success"] and answer["provider"] == "comprehensive_ai"
+    assert answer["response"].startswith("Machine Learning (ML)")
+    assert llm.errors == 1 and llm.fallbacks == 1
+
+
+def test_timeout_falls_back_to_templates(llm_env, monkeypatch):
+    monkeypatch.setenv("LLM_TIMEOUT_S", "0.3")
+
+    async def scenario():
+        server, llm = await stub_service(monkeypatch, first_token_ms=2000, token_ms=10)
+        try:
+            started = time.perf_counter()
+            answer = await llm.generate_response_with_knowledge("Tell me about machine learning", check_cache=False)
+            elapsed = time.perf_counter() - started
+        finally:
+            await stop(server)
+        assert elapsed < 1.0
+        assert answer["provider"] == "comprehensive_ai"
+        assert llm.fallbacks == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from services import memory_monitor as memory_module
+from services.memory_monitor import (
+    PRIORITY_CACHE, PRIORITY_CONVERSATION, PRIORITY_INDEX, MemoryMonitor
+)
+
+MB = 1024 * 1024
+
+
+class FakeProcess:
+    """RSS made of a fixed base plus what each registered subsystem still holds"""
+
+    def __init__(self, base_mb: float, **held_mb: float):
+        self.base = base_mb
+        self.held = dict(held_mb)
+        self.evictions = []
+
+    def rss(self) -> int:
+        return int((self.base + sum(self.held.values())) * MB)
+
+    def evictor(self, name: str):
+        def evict(fraction: float) -> int:
+            self.evictions.append(name)
+            freed = self.held[name] * fraction
+            self.held[name] -= freed
+            return int(freed)
+        return evict
+
+
+@pytest.fixture
+def monitor(monkeypatch):
+    # 100 MB limit, evict at 85 MB, halve a subsystem per eviction
+    monkeypatch.setenv('MEMORY_RSS_LIMIT_MB', '100')
+    monkeypatch.setenv('MEMORY_EVICT_AT', '0.85')
+    monkeypatch.setenv('MEMORY_EVICT_FRACTION', '0.5')
+    monkeypatch.setenv('MEMORY_CHECK_INTERVAL_S', '0.01')
+    return MemoryMonitor()
+
+
+def register(monitor: MemoryMonitor, process: FakeProcess, monkeypatch):
+    monkeypatch.setattr(memory_module, 'current_rss', process.rss)
+    # Registered out of priority order on purpose
+    monitor.register('conversations', dict, process.evictor('conversations'), PRIORITY_CONVERSATION)
+    monitor.register('semantic_index', dict, process.evictor('semantic_index'), PRIORITY_INDEX)
+    monitor.register('kb_cache', dict, process.evictor('kb_cache'), PRIORITY_CACHE)
+    monitor.register('settings', dict)
+
+
+def test_caches_go_first_and_eviction_stops_under_the_mark(monitor, monkeypatch):
+    process = FakeProcess(58, kb_cache=20, semantic_index=10, conversations=10)
+    register(monitor, process, monkeypatch)
+
+    report = monitor.evict(0.5, reason='rss')
+
+    # 98 MB -> 88 MB after the cache is still over 85, so the index goes too; 83 MB spares conversations
+    assert process.evictions == ['kb_cache', 'semantic_index']
+    assert process.held['conversations'] == 10
+    assert report['evicted'] == {'kb_cache': 10, 'semantic_index': 5}
+    assert report['rss_mb_before'] == 98.0
+    assert report['rss_mb_after'] == 83.0
+
+
+def test_one_tier_is_enough_when_it_frees_enough(monitor, monkeypatch):
+    process = FakeProcess(30, kb_cache=40, semantic_index=10, conversations=10)
+    register(monitor, process, monkeypatch)
+
+    monitor.evict(0.5, reason='rss')
+
+    # 90 MB -> 70 MB after the cache alone
+    assert process.evictions == ['kb_cache']
+
+
+def test_manual_eviction_shrinks_every_tier_in_order(monitor, monkeypatch):
+    process = FakeProcess(10, kb_cache=4, semantic_index=4, conversations=4)
+    register(monitor, process, monkeypatch)
+
+    monitor.evict(0.25)
+
+    assert process.evictions == ['kb_cache', 'semantic_index', 'conversations']
+    assert monitor.evicted == {'kb_cache': 1, 'semantic_index': 1, 'conversations': 1}
+
+
+def test_guard_evicts_when_rss_crosses_the_mark(monitor, monkeypatch):
+    process = FakeProcess(40, kb_cache=20, semantic_index=10, conversations=10)
+    register(monitor, process, monkeypatch)
+
+    async def scenario():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        # Under the mark: the guard only records the peak
+        assert process.evictions == []
+
+        process.held['conversations'] = 40
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            if process.evictions:
+                break
+        monitor._guard.cancel()
+
+    asyncio.run(scenario())
+
+    assert monitor.guard_runs >= 1
+    assert process.evictions[0] == 'kb_cache'
+    assert monitor.peak_rss == 110 * MB
+    assert monitor.last_eviction['reason'] == 'rss'
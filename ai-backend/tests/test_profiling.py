@@ -0,0 +1,61 @@
+import re
+
+import pytest
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+
+from routers import admin_router, voice_router
+
+TOKEN = 'test-admin-token'
+TURN = {
+    "user_message": "How much does the basic plan cost?",
+    "call_sid": "CA-profile",
+    "knowledge_base": [{"title": "Pricing", "content": "Our basic plan costs 500 rupees per month."}]
+}
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(voice_router.router, prefix='/voice')
+    app.include_router(admin_router.router)
+    return TestClient(app)
+
+
+def admin_routes():
+    return [(method, route.path.replace('{call_sid}', 'CA-profile'))
+            for route in admin_router.router.routes if isinstance(route, APIRoute)
+            for method in route.methods]
+
+
+def test_server_timing_on_profiled_turns_only(client):
+    response = client.post('/voice/voice-response', json=TURN, headers={'X-Profile-Turn': '1'})
+    assert response.status_code == 200
+    entries = dict(re.fullmatch(r'(\w+);dur=([\d.]+)', entry).groups()
+                   for entry in response.headers['Server-Timing'].split(', '))
+    assert {'parse', 'language', 'intent', 'kb_search', 'total'} <= set(entries)
+    assert float(entries['total']) >= float(entries['parse'])
+
+    assert 'Server-Timing' not in client.post('/voice/voice-response', json=TURN).headers
+
+
+@pytest.mark.parametrize('method,path', admin_routes())
+def test_admin_endpoints_need_the_token(client, monkeypatch, method, path):
+    monkeypatch.delenv('ADMIN_TOKEN', raising=False)
+    # No token configured: the admin API does not exist
+    assert client.request(method, path).status_code == 404
+
+    monkeypatch.setenv('ADMIN_TOKEN', TOKEN)
+    assert client.request(method, path).status_code == 401
+    assert client.request(method, path, headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.request(method, path, headers={'Authorization': TOKEN}).status_code == 401
+
+
+def test_profile_with_the_token(client, monkeypatch):
+    monkeypatch.setenv('ADMIN_TOKEN', TOKEN)
+    response = client.get('/admin/profile', params={'seconds': 0.1, 'hz': 200, 'format': 'json'},
+                          headers={'Authorization': f'Bearer {TOKEN}'})
+
+    assert response.status_code == 200
+    assert response.json()['samples'] > 0
@@ -0,0 +1,110 @@
+import asyncio
+
+from services import json_codec, llm_service as llm_module
+from services.kb_cache import kb_fingerprint
+from services.llm_service import LLMService
+from services.prompt_builder import PromptBuilder, estimate_tokens
+from tests.local_server import serve, stop
+from tools.fake_openai import create_app
+
+COMPANY = {"name": "Acme Telecom", "business_hours": "9-6 IST"}
+KNOWLEDGE_BASE = [
+    {"title": "Pricing", "content": "The basic plan costs 500 rupees per month."},
+    {"title": "Support", "content": "Support is available on WhatsApp and by phone."}
+]
+RETRIEVED = [KNOWLEDGE_BASE[0]]
+
+
+def turns(builder: PromptBuilder, knowledge_base=KNOWLEDGE_BASE, kb_version=None):
+    """Messages of three different turns of the same company"""
+    kb_version = kb_version or kb_fingerprint(knowledge_base)
+    return [
+        builder.build_messages("Hello", COMPANY, language='english',
+                               knowledge_base=knowledge_base, kb_version=kb_version),
+        builder.build_messages("How much is the basic plan?", COMPANY, RETRIEVED, language='hinglish',
+                               history=[{"user": "Hello", "ai": "Hi, how can I help?"}],
+                               knowledge_base=knowledge_base, kb_version=kb_version),
+        # A streamed turn only carries the selected candidates, but the same KB version
+        builder.build_messages("Is support on WhatsApp?", COMPANY, RETRIEVED, summary="Asked about pricing.",
+                               knowledge_base=RETRIEVED, kb_version=kb_version)
+    ]
+
+
+def request_prefix(messages) -> bytes:
+    """Serialized request bytes up to the end of the first message (what a prefix cache matches)"""
+    return json_codec.dumps(messages[:1])[:-1]
+
+
+def test_compiled_prefix_is_byte_identical_across_turns():
+    builder = PromptBuilder()
+    first, second, third = turns(builder)
+
+    assert request_prefix(first) == request_prefix(second) == request_prefix(third)
+    assert json_codec.dumps(second).startswith(request_prefix(first))
+    assert "The basic plan costs 500 rupees" in first[0]['content']
+    assert "Support is available on WhatsApp" in third[0]['content']
+    # Compiled once; the other turns reuse it
+    assert builder.compiled == 1
+    assert builder.hits == 2
+    # Per-turn parts come after the prefix, the utterance last
+    assert [message['role'] for message in second] == ['system', 'user', 'assistant', 'system', 'user']
+    assert third[1] == {"role": "system", "content": "EARLIER IN THIS CALL:\nAsked about pricing."}
+
+
+def test_kb_change_invalidates_the_prefix():
+    builder = PromptBuilder()
+    before = turns(builder)[0][0]['content']
+    updated = [KNOWLEDGE_BASE[0], {"title": "Support", "content": "Support is now available around the clock."}]
+
+    after = turns(builder, updated)[0][0]['content']
+
+    assert after != before
+    assert "around the clock" in after and "WhatsApp" not in after
+    assert builder.compiled == 2
+    # Turns still on the old version keep their own prefix
+    assert turns(builder)[1][0]['content'] == before
+
+
+def test_company_change_invalidates_the_prefix():
+    builder = PromptBuilder()
+    acme = builder.build_messages("Hi", COMPANY)[0]['content']
+    other = builder.build_messages("Hi", {"name": "Globex", "business_hours": "9-6 IST"})[0]['content']
+
+    assert acme != other and "Globex" in other
+    assert builder.build_messages("Hello again", COMPANY)[0]['content'] == acme
+
+
+def test_kb_too_large_for_the_prefix_goes_per_turn(monkeypatch):
+    monkeypatch.setenv('PROMPT_PREFIX_KB_CHARS', '50')
+    builder = PromptBuilder()
+    first, second, _ = turns(builder)
+
+    assert request_prefix(first) == request_prefix(second)
+    assert "500 rupees" not in first[0]['content']
+    assert second[-2]['content'].startswith("RELEVANT KNOWLEDGE")
+    assert builder.compiled == 1
+
+
+def test_provider_reports_the_prefix_as_cached(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+    monkeypatch.setenv("LLM_TIMEOUT_S", "2")
+    builder = PromptBuilder()
+    monkeypatch.setattr(llm_module, 'prompt_builder', builder)
+    requests = turns(builder)
+
+    async def scenario():
+        server, base_url = await serve(create_app(first_token_ms=5, token_ms=1, seed=1, cache_min_tokens=256))
+        monkeypatch.setenv("OPENAI_BASE_URL", f"{base_url}/v1")
+        llm = LLMService()
+        try:
+            for messages in requests:
+                assert await llm.generate_streaming(messages) is not None
+        finally:
+            await stop(server)
+
+    asyncio.run(scenario())
+
+    stats = builder.get_stats()
+    # Only the first turn pays for the prefix; the later ones hit the stub's prefix cache
+    assert stats['provider_usage_reports'] == 3
+    assert stats['provider_cached_tokens'] >= 2 * estimate_tokens(requests[0][0]['content'])
@@ -0,0 +1,204 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services import provider_router
+from services.provider_router import (
+    CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN, ProviderEndpoint, ProviderRouter, close_provider_clients
+)
+from tests.local_server import serve as serve_app, stop
+from tools.fake_provider import create_app
+
+OPEN_SECONDS = 0.3
+
+
+async def serve(app):
+    server, base_url = await serve_app(app)
+    return server, f"{base_url}/models/tts"
+
+
+@pytest.fixture
+def router_env(monkeypatch):
+    monkeypatch.setenv("PROVIDER_CIRCUIT_FAILURES", "1")
+    monkeypatch.setenv("PROVIDER_CIRCUIT_OPEN_SECONDS", str(OPEN_SECONDS))
+    monkeypatch.setenv("PROVIDER_HEDGE_DEFAULT_MS", "100")
+    monkeypatch.setenv("PROVIDER_MAX_ATTEMPTS", "2")
+
+
+async def tts(router):
+    return await router.request({"json": {"inputs": "hello"}}, lambda response: response.content)
+
+
+def eject(endpoint: ProviderEndpoint, seconds_ago: float):
+    endpoint.state = CIRCUIT_OPEN
+    endpoint.opened_at = time.monotonic() - seconds_ago
+
+
+def test_available_does_not_change_state():
+    endpoint = ProviderEndpoint("http://x", 0.2, 1, OPEN_SECONDS)
+    eject(endpoint, OPEN_SECONDS * 2)
+
+    assert endpoint.available(time.monotonic())
+    assert endpoint.available(time.monotonic())
+    assert endpoint.state == CIRCUIT_OPEN
+
+
+def test_open_half_open_closed(router_env):
+    async def scenario():
+        # The first endpoint is cold (503) for a while, then healthy
+        cold, cold_url = await serve(create_app(latency_ms=20, jitter_ms=0, cold_start_s=OPEN_SECONDS))
+        healthy, healthy_url = await serve(create_app(latency_ms=20, jitter_ms=0))
+        router = ProviderRouter("test_tts", [cold_url, healthy_url])
+        endpoint = router.endpoints[0]
+        try:
+            await tts(router)
+            assert endpoint.state == CIRCUIT_OPEN
+
+            await asyncio.sleep(OPEN_SECONDS + 0.05)
+            probe = asyncio.ensure_future(tts(router))
+            await asyncio.sleep(0.01)
+            assert endpoint.state == CIRCUIT_HALF_OPEN
+            await probe
+            assert endpoint.state == CIRCUIT_CLOSED
+        finally:
+            await stop(cold, healthy)
+
+    asyncio.run(scenario())
+
+
+def test_open_half_open_open(router_env):
+    async def scenario():
+        broken, broken_url = await serve(create_app(latency_ms=20, jitter_ms=0, fail_rate=1.0))
+        healthy, healthy_url = await serve(create_app(latency_ms=20, jitter_ms=0))
+        router = ProviderRouter("test_tts", [broken_url, healthy_url])
+        endpoint = router.endpoints[0]
+        try:
+            await tts(router)
+            assert endpoint.state == CIRCUIT_OPEN
+            first_opened_at = endpoint.opened_at
+
+            await asyncio.sleep(OPEN_SECONDS + 0.05)
+            probe = asyncio.ensure_future(tts(router))
+            await asyncio.sleep(0.01)
+            assert endpoint.state == CIRCUIT_HALF_OPEN
+            # The failed probe fails over, so the request still succeeds
+            assert await probe
+            assert endpoint.state == CIRCUIT_OPEN
+            assert endpoint.opened_at > first_opened_at
+            # One probe per open interval
+            assert not endpoint.available(time.monotonic())
+        finally:
+            await stop(broken, healthy)
+
+    asyncio.run(scenario())
+
+
+def test_due_endpoint_behind_a_faster_one_is_probed_not_stranded(router_env):
+    async def scenario():
+        fast, fast_url = await serve(create_app(latency_ms=5, jitter_ms=0))
+        second, second_url = await serve(create_app(latency_ms=10, jitter_ms=0))
+        recovered, recovered_url = await serve(create_app(latency_ms=30, jitter_ms=0))
+        # max_attempts is 2, so a slow-ranked third endpoint falls outside the candidate cut
+        router = ProviderRouter("test_tts", [fast_url, second_url, recovered_url])
+        endpoint = router.endpoints[2]
+        for _ in range(5):
+            await tts(router)
+        endpoint.ewma_latency = 1.0
+        eject(endpoint, OPEN_SECONDS * 2)
+        try:
+            for _ in range(50):
+                await tts(router)
+                assert endpoint.state != CIRCUIT_HALF_OPEN
+            assert endpoint.state == CIRCUIT_CLOSED
+        finally:
+            await stop(fast, second, recovered)
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_probe_reopens(router_env):
+    async def scenario():
+        slow, slow_url = await serve(create_app(latency_ms=1000, jitter_ms=0))
+        fast, fast_url = await serve(create_app(latency_ms=5, jitter_ms=0))
+        router = ProviderRouter("test_tts", [slow_url, fast_url])
+        endpoint = router.endpoints[0]
+        eject(endpoint, OPEN_SECONDS * 2)
+        first_opened_at = endpoint.opened_at
+        try:
+            started = time.perf_counter()
+            await tts(router)
+            # Hedged to the fast endpoint well before the slow probe would have answered
+            assert time.perf_counter() - started < 0.5
+            # The losing attempt is cancelled, which records it on the next loop iteration
+            await asyncio.sleep(0.01)
+            assert endpoint.state == CIRCUIT_OPEN
+            assert endpoint.opened_at > first_opened_at
+        finally:
+            await stop(slow, fast)
+
+    asyncio.run(scenario())
+
+
+def test_shutdown_closes_the_connection_pools(router_env, monkeypatch):
+    monkeypatch.setattr(provider_router, '_routers', [])
+
+    async def scenario():
+        server, url = await serve(create_app(latency_ms=5, jitter_ms=0))
+        routers = [ProviderRouter("test_tts", [url]), ProviderRouter("test_stt", [url])]
+        try:
+            for router in routers:
+                await tts(router)
+            clients = [router._client for router in routers]
+
+            await close_provider_clients()
+            assert all(client.is_closed for client in clients)
+            # A request after shutdown (e.g. a late background task) gets a fresh pool
+            assert await tts(routers[0])
+            assert routers[0]._client is not clients[0]
+            await close_provider_clients()
+        finally:
+            await stop(server)
+
+    asyncio.run(scenario())
+
+
+def test_loop_change_closes_the_old_pool_on_its_own_loop(router_env):
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever, daemon=True)
+    thread.start()
+
+    def on_other_loop(coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, other_loop).result(timeout=5)
+
+    async def shut_down(server):
+        # What asyncio.run does on exit: stop the server and finish its remaining tasks
+        await stop(server)
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    server, url = on_other_loop(serve(create_app(latency_ms=5, jitter_ms=0)))
+    router = ProviderRouter("test_tts", [url])
+    try:
+        assert on_other_loop(tts(router))
+        old_client = router._client
+
+        async def scenario():
+            assert await tts(router)
+            assert router._client is not old_client
+            for _ in range(100):
+                if old_client.is_closed:
+                    break
+                await asyncio.sleep(0.01)
+            await router.aclose()
+
+        asyncio.run(scenario())
+        assert old_client.is_closed
+    finally:
+        on_other_loop(shut_down(server))
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join(timeout=5)
+        other_loop.close()
@@ -0,0 +1,66 @@
+import pytest
+
+from services import response_cache as response_cache_module
+from services.response_cache import ResponseCache
+
+ANSWER = {"response": "The Pro plan costs 999 rupees per month."}
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(max_entries=64, ttl_s=600, near_bits=3, near_min_jaccard=0.75)
+
+
+def test_exact_hit_ignores_case_punctuation_and_spacing(cache):
+    cache.put("acme", "v1", "What's your pricing?", ANSWER)
+
+    assert cache.get("acme", "v1", "  what's YOUR pricing ") == (ANSWER, 'exact')
+
+
+def test_rewording_is_a_near_hit(cache):
+    cache.put("acme", "v1", "What's your pricing?", ANSWER)
+
+    assert cache.get("acme", "v1", "what is the pricing") == (ANSWER, 'near')
+
+
+def test_different_numbers_never_match(cache):
+    cache.put("acme", "v1", "What does plan 2 cost?", ANSWER)
+
+    assert cache.get("acme", "v1", "What does plan 3 cost?") == (None, None)
+    assert cache.get("acme", "v1", "what does Plan 2 cost") == (ANSWER, 'exact')
+
+
+def test_entries_expire_after_ttl(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache_module.time, 'monotonic', lambda: now[0])
+    cache.put("acme", "v1", "Do you offer a free trial?", ANSWER)
+    now[0] += cache.ttl_s + 1
+
+    assert cache.get("acme", "v1", "Do you offer a free trial?") == (None, None)
+    assert cache.get("acme", "v1", "do you offer free trial") == (None, None)
+    assert cache.expired == 1
+
+
+def test_entries_are_scoped_to_company_and_kb_version(cache):
+    cache.put("acme", "v1", "What's your pricing?", ANSWER)
+
+    assert cache.get("acme", "v2", "What's your pricing?") == (None, None)
+    assert cache.get("globex", "v1", "What's your pricing?") == (None, None)
+    assert cache.get("acme", "v2", "what is the pricing") == (None, None)
+
+
+@pytest.mark.parametrize('stored, asked', [
+    ('एक साल का प्लान?', 'एक सेल का प्लान?'),
+    ('दिन कितने लगेंगे', 'दान कितने लगेंगे'),
+])
+def test_different_hindi_words_do_not_collide(cache, stored, asked):
+    cache.put("acme", "v1", stored, ANSWER)
+
+    assert cache.get("acme", "v1", asked) == (None, None)
+    assert cache.get("acme", "v1", stored.rstrip('?') + '।') == (ANSWER, 'exact')
+
+
+def test_hindi_rewording_is_a_near_hit(cache):
+    cache.put("acme", "v1", "सालाना प्लान की कीमत क्या है?", ANSWER)
+
+    assert cache.get("acme", "v1", "सालाना प्लान की कीमत?") == (ANSWER, 'near')
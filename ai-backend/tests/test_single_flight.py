@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from services import single_flight
+from services.single_flight import SingleFlight
+
+
+@pytest.fixture
+def group(monkeypatch):
+    # Keep test groups out of the process-wide /metrics registry
+    monkeypatch.setattr(single_flight, '_groups', [])
+    return SingleFlight('test')
+
+
+class Provider:
+    """A provider call that finishes when the test releases it"""
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.calls = 0
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.cancelled = False
+
+    async def __call__(self):
+        self.calls += 1
+        self.started.set()
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return {"audio": b"hello"}
+
+
+def test_cancelled_leader_does_not_cancel_followers(group):
+    async def scenario():
+        provider = Provider()
+        leader = asyncio.ensure_future(group.do('key', provider))
+        await provider.started.wait()
+        followers = [asyncio.ensure_future(group.do('key', provider)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        provider.release.set()
+        results = await asyncio.gather(*followers)
+
+        assert leader.cancelled()
+        assert not provider.cancelled
+        assert provider.calls == 1
+        assert results[0] is results[1] == {"audio": b"hello"}
+        assert group.get_stats()['coalesced'] == 2
+        assert group.get_stats()['abandoned'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_work_is_cancelled_once_every_caller_is(group):
+    async def scenario():
+        provider = Provider()
+        callers = [asyncio.ensure_future(group.do('key', provider)) for _ in range(3)]
+        await provider.started.wait()
+
+        for caller in callers[:2]:
+            caller.cancel()
+        await asyncio.sleep(0)
+        assert not provider.cancelled
+
+        callers[2].cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+
+        assert provider.cancelled
+        assert group.get_stats()['abandoned'] == 1
+        assert group.get_stats()['in_flight'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_leader_exception_reaches_followers(group):
+    async def scenario():
+        provider = Provider(error=RuntimeError("provider down"))
+        callers = [asyncio.ensure_future(group.do('key', provider)) for _ in range(3)]
+        await provider.started.wait()
+        provider.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+
+        assert provider.calls == 1
+        assert all(isinstance(result, RuntimeError) and str(result) == "provider down" for result in results)
+        assert group.get_stats()['failed'] == 1
+
+        # Failures are not cached: the next call runs the work again
+        retry = Provider()
+        retry.release.set()
+        assert await group.do('key', retry) == {"audio": b"hello"}
+        assert retry.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_different_keys_are_not_coalesced(group):
+    async def scenario():
+        first, second = Provider(), Provider()
+        first.release.set()
+        second.release.set()
+        await asyncio.gather(group.do('a', first), group.do('b', second))
+
+        assert first.calls == second.calls == 1
+        assert group.get_stats()['coalesced'] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,132 @@
+import json
+import re
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import voice_router
+from services.tracing import Tracer, otlp_request, trace_id_for_call, tracer
+
+KNOWLEDGE_BASE = [{"title": "Pricing", "content": "Our basic plan costs 500 rupees per month."}]
+HEX_32 = re.compile(r'[0-9a-f]{32}')
+HEX_16 = re.compile(r'[0-9a-f]{16}')
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(voice_router.router, prefix='/voice')
+    return TestClient(app)
+
+
+def test_stage_spans_nest_under_their_turn():
+    local = Tracer()
+    with local.span('voice_turn') as turn:
+        local.annotate(call_sid='CA-nesting')
+        with local.span('kb_search') as kb_search:
+            with local.span('kb_scan') as scan:
+                pass
+        with local.span('response') as response:
+            pass
+
+    assert turn.parent_id is None
+    assert kb_search.parent_id == response.parent_id == turn.span_id
+    assert scan.parent_id == kb_search.span_id
+    # Children finish first and are collected on the root
+    assert [span.name for span in turn.spans] == ['kb_scan', 'kb_search', 'response']
+    assert local.get_call_trace('CA-nesting') == [turn]
+
+
+def test_failed_stage_marks_its_span():
+    local = Tracer()
+    with pytest.raises(ValueError):
+        with local.span('voice_turn'):
+            local.annotate(call_sid='CA-error')
+            with local.span('intent'):
+                raise ValueError("boom")
+
+    turn = local.get_call_trace('CA-error')[0]
+    assert turn.error == turn.spans[0].error == 'ValueError'
+
+
+def test_every_turn_of_a_call_shares_one_trace(client):
+    call_sid = 'CA-trace-shared'
+    for message in ("Hello", "How much does the basic plan cost?"):
+        response = client.post('/voice/voice-response', json={
+            "user_message": message, "call_sid": call_sid, "knowledge_base": KNOWLEDGE_BASE
+        })
+        assert response.status_code == 200
+    # A third turn of the same call over the turn channel
+    with client.websocket_connect('/voice/ws') as websocket:
+        websocket.send_json({"type": "start", "call_sid": call_sid, "knowledge_base": KNOWLEDGE_BASE})
+        websocket.receive_json()
+        websocket.send_json({"type": "utterance", "user_message": "Thanks, bye", "turn_id": 3})
+        while websocket.receive_json()['type'] != 'response':
+            pass
+
+    turns = tracer.get_call_trace(call_sid)
+    assert [turn.attributes['turn'] for turn in turns] == [1, 2, 3]
+    assert [turn.attributes['transport'] for turn in turns] == ['http', 'http', 'websocket']
+    assert {turn.trace_id for turn in turns} == {trace_id_for_call(call_sid)}
+    for turn in turns:
+        assert turn.parent_id is None
+        assert {'language', 'intent', 'response'} <= {span.name for span in turn.spans}
+        ids = {turn.span_id} | {span.span_id for span in turn.spans}
+        assert len(ids) == len(turn.spans) + 1
+        # Every stage hangs off this turn (directly or through another stage of it)
+        assert all(span.parent_id in ids and span.root is turn for span in turn.spans)
+
+
+def test_exported_payload_has_otlp_shape(monkeypatch, tmp_path):
+    export_file = tmp_path / 'traces.jsonl'
+    monkeypatch.setenv('TRACE_EXPORTER', 'file')
+    monkeypatch.setenv('TRACE_EXPORT_FILE', str(export_file))
+    monkeypatch.setenv('TRACE_EXPORT_INTERVAL_MS', '10')
+    local = Tracer()
+    for turn in range(2):
+        with local.span('voice_turn', transport='http'):
+            local.annotate(call_sid='CA-otlp', intent='pricing', degraded_stages=['sentiment'])
+            with local.span('kb_search'):
+                pass
+    local.exporter.shutdown()
+
+    batches = [json.loads(line) for line in export_file.read_text().splitlines()]
+    spans = [span for batch in batches
+             for resource in batch['resourceSpans']
+             for scope in resource['scopeSpans']
+             for span in scope['spans']]
+    resource = batches[0]['resourceSpans'][0]
+    assert resource['resource']['attributes'][0]['key'] == 'service.name'
+    assert resource['scopeSpans'][0]['scope'] == {"name": "services.tracing"}
+    assert local.exporter.exported_turns == 2
+    assert len(spans) == 4
+
+    roots = [span for span in spans if span['parentSpanId'] == ""]
+    children = [span for span in spans if span['parentSpanId']]
+    assert len(roots) == len(children) == 2
+    assert {span['traceId'] for span in spans} == {trace_id_for_call('CA-otlp')}
+    assert {child['parentSpanId'] for child in children} == {root['spanId'] for root in roots}
+    for span in spans:
+        assert HEX_32.fullmatch(span['traceId']) and HEX_16.fullmatch(span['spanId'])
+        # OTLP/JSON carries 64-bit integers as strings
+        assert int(span['endTimeUnixNano']) >= int(span['startTimeUnixNano']) > 0
+        assert span['status'] == {"code": 1}
+    assert {root['kind'] for root in roots} == {2}
+    assert {child['kind'] for child in children} == {1}
+
+    attributes = {item['key']: item['value'] for item in roots[0]['attributes']}
+    assert attributes['intent'] == {"stringValue": "pricing"}
+    assert attributes['turn'] == {"intValue": "1"}
+    assert attributes['degraded_stages'] == {"arrayValue": {"values": [{"stringValue": "sentiment"}]}}
+
+
+def test_admin_otlp_format_matches_export():
+    local = Tracer()
+    with local.span('voice_turn'):
+        local.annotate(call_sid='CA-admin-otlp')
+    payload = otlp_request(local.get_call_trace('CA-admin-otlp'))
+
+    span = payload['resourceSpans'][0]['scopeSpans'][0]['spans'][0]
+    assert span['name'] == 'voice_turn'
+    assert span['traceId'] == trace_id_for_call('CA-admin-otlp')
@@ -0,0 +1,53 @@
+import io
+import json
+import os
+from collections import Counter
+
+import pytest
+
+from services.transcript_analytics import iter_file_records, iter_json_records, run_pipeline
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def test_corrupt_jsonl_line_is_skipped_and_counted():
+    skipped = Counter()
+    records = list(iter_file_records(os.path.join(FIXTURES, 'calllogs_one_corrupt_line.jsonl'), skipped))
+
+    assert [record['callId'] for record in records] == ['CA1', 'CA3']
+    assert skipped == {'invalid_json': 1}
+
+
+def test_pipeline_keeps_aggregates_and_reports_skipped_records():
+    skipped = Counter()
+    stats = run_pipeline(iter_file_records(os.path.join(FIXTURES, 'calllogs_one_corrupt_line.jsonl'), skipped),
+                         workers=0)
+    stats.skipped.update(skipped)
+
+    result = stats.to_dict()
+    assert result['calls'] == 2
+    assert result['turns'] == 3
+    assert set(result['companies']) == {'c1', 'c2'}
+    assert result['skipped_records'] == {'invalid_json': 1}
+
+
+def test_corrupt_line_does_not_buffer_the_rest_of_the_file():
+    good = json.dumps({'companyId': 'c1', 'transcript': [{'userMessage': 'x' * 100}]})
+    # The corrupt line comes first and the rest spans many read chunks
+    stream = io.StringIO('{"companyId": \n' + '\n'.join([good] * 5000) + '\n')
+    skipped = Counter()
+
+    assert sum(1 for _ in iter_json_records(stream, skipped)) == 5000
+    assert skipped == {'invalid_json': 1}
+
+
+def test_json_array_export_is_decoded_element_by_element():
+    records = [{'companyId': f'c{i}', 'transcript': []} for i in range(3)]
+    stream = io.StringIO(json.dumps(records) + '\n')
+
+    assert list(iter_json_records(stream)) == records
+
+
+def test_malformed_json_array_raises():
+    with pytest.raises(ValueError):
+        list(iter_json_records(io.StringIO('[{"companyId": "c1"}, {"companyId": ')))
@@ -0,0 +1,91 @@
+import pytest
+
+from services import json_codec
+from services.voice_body_parser import StreamingKBSelector, VoiceBodyParser
+
+
+def parse(chunks):
+    selector = StreamingKBSelector(lambda terms, item, partial: 1.0, lambda question: set(question.split()), 3)
+    parser = VoiceBodyParser(selector)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
+
+
+def test_trailing_whitespace_is_accepted():
+    assert parse([b'{"user_message": "hi"} \r\n\t'])['user_message'] == 'hi'
+
+
+@pytest.mark.parametrize('chunks', [
+    [b'{"user_message": "hi"}garbage'],
+    [b'{"user_message": "hi"} ', b' x'],
+    [b'{"user_message": "hi"}', b'{"user_message": "again"}'],
+    [b'"hi" 1'],
+])
+def test_data_after_the_top_level_value_is_rejected(chunks):
+    with pytest.raises(json_codec.JSONDecodeError):
+        parse(chunks)
+
+
+def test_voice_response_rejects_trailing_garbage_like_json_loads():
+    from fastapi.testclient import TestClient
+    import app
+
+    response = TestClient(app.app).post(
+        "/voice/voice-response", content=b'{"user_message": "What are your prices?"}garbage',
+        headers={"content-type": "application/json"}
+    )
+
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "json_invalid"
+
+
+def bytewise(body: bytes):
+    return [body[index:index + 1] for index in range(len(body))]
+
+
+@pytest.mark.parametrize('body', [
+    b'{"user_message": "hi", "language": "en" "call_sid": "CA1"}',
+    b'{"user_message": "hi", "knowledge_base": [{"title": "a"} {"title": "b"}]}',
+    b'{"user_message": "hi", "call_sid" "CA1"}',
+    b'{"user_message": "hi"} x',
+])
+def test_errors_report_the_body_offset_like_json_loads(body):
+    import json
+    with pytest.raises(json.JSONDecodeError) as expected:
+        json.loads(body)
+
+    for chunks in ([body], bytewise(body)):
+        with pytest.raises(json_codec.JSONDecodeError) as error:
+            parse(chunks)
+        assert error.value.pos == expected.value.pos
+
+
+@pytest.mark.parametrize('knowledge_base', [b'tru', b'[1, tru]', b'[{"a": nul}]', b'01', b'[1.]'])
+def test_invalid_literals_in_the_skipped_copy_are_rejected(knowledge_base):
+    body = b'{"user_message": "hi", "call_data": {"knowledgeBase": ' + knowledge_base + b', "companyId": "c"}}'
+    for chunks in ([body], bytewise(body)):
+        with pytest.raises(json_codec.JSONDecodeError):
+            parse(chunks)
+
+
+def test_valid_literals_in_the_skipped_copy_are_accepted():
+    body = (b'{"user_message": "hi", "call_data": {"knowledgeBase": [true, null, -1.5e3, 0, {"a": false}], '
+            b'"flag": true, "companyId": "c"}}')
+    for chunks in ([body], bytewise(body)):
+        assert parse(chunks)['call_data'] == {"flag": True, "companyId": "c"}
+
+
+def test_kb_preselection_scores_the_raw_user_message():
+    seen = []
+
+    def query_terms(question):
+        seen.append(question)
+        return set(question.split())
+
+    selector = StreamingKBSelector(lambda terms, item, partial: 1.0, query_terms, 3)
+    parser = VoiceBodyParser(selector)
+    parser.feed('{"user_message": "e-commerce कितना लगेगा?", "knowledge_base": [{"title": "a"}]}'.encode())
+    parser.close()
+
+    assert seen == ["e-commerce कितना लगेगा?"]
@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import voice_router
+from services.ai_engine import ai_engine
+
+KNOWLEDGE_BASE = [{"title": "Pricing", "content": "Our basic plan costs 500 rupees per month."}]
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(voice_router.router, prefix='/voice')
+    return TestClient(app)
+
+
+def start(websocket, call_sid: str):
+    websocket.send_json({
+        "type": "start",
+        "call_sid": call_sid,
+        "call_data": {"companyName": "Acme", "knowledgeBase": KNOWLEDGE_BASE},
+        "voice_settings": {"personality": "priyanshu"},
+        "knowledge_base": KNOWLEDGE_BASE
+    })
+    return websocket.receive_json()
+
+
+def receive_turn(websocket, turn_id):
+    """Frames of one turn up to and including its response (state-change events follow separately)"""
+    frames = []
+    while True:
+        frame = websocket.receive_json()
+        assert frame.get('turn_id') == turn_id
+        frames.append(frame)
+        if frame['type'] == 'response':
+            return frames
+
+
+def test_turn(client):
+    with client.websocket_connect('/voice/ws') as websocket:
+        ready = start(websocket, 'CA-ws-turn')
+        assert ready['type'] == 'ready'
+        # call_data.knowledgeBase is a duplicate and is not counted or kept
+        assert ready['kb_items'] == 1
+        websocket.send_json({"type": "utterance", "user_message": "How much does the basic plan cost?", "turn_id": "t1"})
+        response = receive_turn(websocket, 't1')[-1]
+        stage = websocket.receive_json()
+
+        assert '500 rupees' in response['ai_response']
+        assert response['intent'] == 'pricing'
+        assert response['kb_used'] is True
+        assert stage == {"type": "stage", "turn_id": "t1", "stage": response['conversation_stage'], "previous_stage": None}
+        assert [exchange['user'] for exchange in ai_engine.memory.get_context('CA-ws-turn')] == \
+            ["How much does the basic plan cost?"]
+
+        websocket.send_json({"type": "end"})
+        assert websocket.receive()['type'] == 'websocket.close'
+    # Ending the channel drops the call's state
+    assert not ai_engine.memory.has_context('CA-ws-turn')
+
+
+def test_malformed_frames_keep_the_channel_open(client):
+    with client.websocket_connect('/voice/ws') as websocket:
+        websocket.send_json({"type": "utterance", "user_message": "hello"})
+        assert websocket.receive_json() == {"type": "error", "detail": "Send a 'start' message first"}
+
+        websocket.send_text('{"type": "start",')
+        error = websocket.receive_json()
+        assert error['type'] == 'error' and error['detail'].startswith('Invalid JSON')
+
+        websocket.send_text('["start"]')
+        assert websocket.receive_json() == {"type": "error", "detail": "Messages must be JSON objects"}
+
+        assert start(websocket, 'CA-ws-malformed')['type'] == 'ready'
+
+        websocket.send_json({"type": "dance"})
+        assert websocket.receive_json() == {"type": "error", "detail": "Unknown message type: dance"}
+
+        websocket.send_json({"type": "utterance", "user_message": "   ", "turn_id": 7})
+        error = websocket.receive_json()
+        assert error['type'] == 'error' and error['turn_id'] == 7
+
+        websocket.send_json({"type": "utterance", "turn_id": 8})
+        error = websocket.receive_json()
+        assert error['type'] == 'error' and error['turn_id'] == 8
+
+        # Still usable after every error above
+        websocket.send_json({"type": "utterance", "user_message": "What does the basic plan cost?", "turn_id": 9})
+        assert receive_turn(websocket, 9)[-1]['type'] == 'response'
+
+
+def test_concurrent_utterances_on_one_call_run_in_order(client, monkeypatch):
+    active = 0
+    max_active = 0
+    processed = []
+
+    async def slow_turn(request, kb_version, kb_item_count, on_sentence=None):
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.05)
+        await on_sentence(f"Answer to {request.user_message}.")
+        processed.append(request.user_message)
+        active -= 1
+        return {"ai_response": f"Answer to {request.user_message}.", "conversation_stage": "introduction"}
+
+    monkeypatch.setattr(voice_router, '_process_voice_request', slow_turn)
+
+    with client.websocket_connect('/voice/ws') as websocket:
+        start(websocket, 'CA-ws-concurrent')
+        # The telephony side sends the next utterance without waiting for the previous answer
+        for turn in range(3):
+            websocket.send_json({"type": "utterance", "user_message": f"question {turn}", "turn_id": turn})
+
+        turns = [receive_turn(websocket, 0)]
+        assert websocket.receive_json()['type'] == 'stage'
+        turns += [receive_turn(websocket, 1), receive_turn(websocket, 2)]
+
+    # One turn of a call at a time, answered in the order they were sent
+    assert max_active == 1
+    assert processed == ["question 0", "question 1", "question 2"]
+    for turn, frames in enumerate(turns):
+        assert [frame['type'] for frame in frames] == ['sentence', 'response']
+        assert frames[0]['text'] == frames[1]['ai_response'] == f"Answer to question {turn}."
+
+
+def test_concurrent_utterances_update_call_memory_in_order(client):
+    with client.websocket_connect('/voice/ws') as websocket:
+        start(websocket, 'CA-ws-memory')
+        messages = ["How much does the basic plan cost?", "Is it billed monthly?"]
+        for turn, message in enumerate(messages):
+            websocket.send_json({"type": "utterance", "user_message": message, "turn_id": turn})
+        receive_turn(websocket, 0)
+        assert websocket.receive_json()['type'] == 'stage'
+        receive_turn(websocket, 1)
+
+        history = ai_engine.memory.get_context('CA-ws-memory')
+        assert [exchange['user'] for exchange in history] == messages
@@ -0,0 +1,190 @@
+"""
+Fake OpenAI-compatible chat completions server with controllable token timing
+
+Serves POST /v1/chat/completions (streamed as server-sent events when
+"stream": true) and GET /v1/models. The reply is built from the request: it
+echoes the question and quotes the knowledge-base entry (from the system
+messages) sharing most words with it, so grounding can be checked. Tokens (words) are emitted after
+--first-token-ms and then every --token-ms. Like hosted providers it caches
+prompt prefixes: the longest run of leading messages seen before (at least
+--cache-min-tokens) counts as cached, only the rest pays --prefill-ms-per-1k
+before the first token, and stream_options.include_usage reports both. Used
+to run services.llm_service locally and in benchmarks without an API key.
+
+Usage:
+    cd ai-backend
+    python tools/fake_openai.py --port 9100 --first-token-ms 300 --token-ms 25
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:9100/v1 python app.py
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from collections import OrderedDict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_KB_ENTRY = re.compile(r'^\d+\. [^:\n]*: (.+?)(?:\.\.\.)?$', re.MULTILINE)
+_WORD = re.compile(r'\w+')
+
+
+def build_reply(messages) -> str:
+    """Deterministic reply: acknowledge the question, quote the best-matching KB entry, offer more help"""
+    question = next((m.get('content', '') for m in reversed(messages) if m.get('role') == 'user'), '')
+    question_words = set(_WORD.findall(question.lower()))
+    entries = [entry for m in messages if m.get('role') == 'system' for entry in _KB_ENTRY.findall(m.get('content', ''))]
+    sentences = [f"Thanks for asking about {question.rstrip('?.! ')}."]
+    if entries:
+        best = max(entries, key=lambda entry: len(question_words & set(_WORD.findall(entry.lower()))))
+        fact = best.strip().split('. ')[0].rstrip('.')
+        sentences.append(f"According to our records, {fact}.")
+    else:
+        sentences.append("I can help you with our plans, pricing and support options.")
+    sentences.append("Is there anything else I can help you with?")
+    return ' '.join(sentences)
+
+
+def count_tokens(text: str) -> int:
+    return (len(text.encode('utf-8')) + 3) // 4
+
+
+class PrefixCache:
+    """Prompt prefix cache keyed by the hash of each run of leading messages"""
+
+    def __init__(self, min_tokens: int, max_entries: int = 4096):
+        self.min_tokens = min_tokens
+        self.max_entries = max_entries
+        self.entries: 'OrderedDict[str, int]' = OrderedDict()
+
+    def lookup(self, messages) -> tuple:
+        """(prompt tokens, cached tokens) of a request; remembers its prefixes"""
+        digest = hashlib.sha256()
+        total = cached = 0
+        for message in messages:
+            digest.update(json.dumps(message, sort_keys=True).encode())
+            total += count_tokens(message.get('content') or '') + 4
+            key = digest.hexdigest()
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                cached = total
+            elif total >= self.min_tokens:
+                self.entries[key] = total
+                if len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return total, cached if cached >= self.min_tokens else 0
+
+
+def create_app(first_token_ms: float = 300, token_ms: float = 25, jitter_ms: float = 0.0,
+               fail_rate: float = 0.0, seed: int = None, prefill_ms_per_1k: float = 0.0,
+               cache_min_tokens: int = 1024) -> FastAPI:
+    """
+    Build a fake OpenAI-compatible app
+
+    Args:
+        first_token_ms: time to the first streamed token (queueing + decoding start)
+        token_ms / jitter_ms: time between tokens (gaussian)
+        fail_rate: fraction of requests answered with 503
+        prefill_ms_per_1k: extra time to first token per 1000 uncached prompt tokens
+        cache_min_tokens: shortest prompt prefix that is cached
+    """
+    app = FastAPI()
+    rng = random.Random(seed)
+    cache = PrefixCache(cache_min_tokens)
+    app.state.requests = 0
+
+    def chunk(completion_id: str, model: str, content: str = None, finish_reason: str = None, usage: dict = None) -> bytes:
+        delta = {"content": content} if content is not None else {}
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        if usage:
+            payload["usage"] = usage
+        return f"data: {json.dumps(payload)}\n\n".encode()
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "fake-gpt", "object": "model", "owned_by": "fake_openai"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        app.state.requests += 1
+        body = json.loads(await request.body())
+        model = body.get("model", "fake-gpt")
+        if rng.random() < fail_rate:
+            return JSONResponse({"error": {"message": "Service unavailable", "type": "server_error"}}, status_code=503)
+
+        messages = body.get("messages", [])
+        prompt_tokens, cached_tokens = cache.lookup(messages)
+        prefill = (prompt_tokens - cached_tokens) * prefill_ms_per_1k / 1000
+        words = build_reply(messages).split(' ')
+        max_tokens = body.get("max_tokens")
+        if max_tokens:
+            words = words[:max_tokens]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+        def token_delay() -> float:
+            return max(0.0, rng.gauss(token_ms, jitter_ms)) / 1000
+
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(words),
+            "total_tokens": prompt_tokens + len(words),
+            "prompt_tokens_details": {"cached_tokens": cached_tokens}
+        }
+
+        if not body.get("stream"):
+            await asyncio.sleep((first_token_ms + prefill) / 1000 + sum(token_delay() for _ in words[1:]))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": ' '.join(words)},
+                             "finish_reason": "stop"}],
+                "usage": usage
+            }
+
+        async def events():
+            await asyncio.sleep((first_token_ms + prefill) / 1000)
+            for index, word in enumerate(words):
+                if index:
+                    await asyncio.sleep(token_delay())
+                yield chunk(completion_id, model, word if index == 0 else ' ' + word)
+            yield chunk(completion_id, model, finish_reason="stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk(completion_id, model, usage=usage)
+            yield b"data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=25)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=0.0)
+    parser.add_argument("--cache-min-tokens", type=int, default=1024)
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(args.first_token_ms, args.token_ms, args.jitter_ms, args.fail_rate,
+                           prefill_ms_per_1k=args.prefill_ms_per_1k, cache_min_tokens=args.cache_min_tokens),
+                host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
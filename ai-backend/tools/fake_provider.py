@@ -0,0 +1,80 @@
+"""
+Fake Hugging Face inference endpoint with injectable latency and failures
+
+Serves POST /models/{model}: JSON bodies ({"inputs": text}) get WAV-ish bytes
+back like TTS, anything else is treated as audio and gets {"text": ...} like
+Whisper. Used to exercise services.provider_router locally.
+
+Usage:
+    cd ai-backend
+    python tools/fake_provider.py --port 9001 --latency-ms 80 --slow-rate 0.1 --slow-ms 2500
+    python tools/fake_provider.py --port 9002 --latency-ms 120 --fail-rate 0.2
+    TTS_ENDPOINTS=http://127.0.0.1:9001/models/tts,http://127.0.0.1:9002/models/tts HUGGINGFACE_TOKEN=x python app.py
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from starlette.requests import ClientDisconnect
+
+
+def create_app(latency_ms: float = 50, jitter_ms: float = 10, slow_rate: float = 0.0, slow_ms: float = 2000,
+               fail_rate: float = 0.0, cold_start_s: float = 0.0, seed: int = None) -> FastAPI:
+    """
+    Build a fake provider app
+
+    Args:
+        latency_ms / jitter_ms: normal response time (gaussian)
+        slow_rate / slow_ms: fraction of requests that stall (cold model, GC pause)
+        fail_rate: fraction of requests answered with 503 "model loading"
+        cold_start_s: every request fails with 503 for this long after startup
+    """
+    app = FastAPI()
+    rng = random.Random(seed)
+    started = time.monotonic()
+    app.state.requests = 0
+
+    @app.post("/models/{model:path}")
+    async def infer(model: str, request: Request):
+        app.state.requests += 1
+        try:
+            body = await request.body()
+        except ClientDisconnect:
+            # A hedged duplicate that lost the race - the router hung up
+            return Response(status_code=499)
+        if time.monotonic() - started < cold_start_s or rng.random() < fail_rate:
+            await asyncio.sleep(max(0.0, rng.gauss(latency_ms, jitter_ms)) / 1000)
+            return JSONResponse({"error": f"Model {model} is currently loading"}, status_code=503)
+
+        delay = slow_ms if rng.random() < slow_rate else max(0.0, rng.gauss(latency_ms, jitter_ms))
+        await asyncio.sleep(delay / 1000)
+
+        if request.headers.get("content-type", "").startswith("application/json"):
+            return Response(b"RIFF" + bytes(64) + body[:64], media_type="audio/wav")
+        return JSONResponse({"text": f" fake transcript of {len(body)} bytes "})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=2000)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--cold-start-s", type=float, default=0.0)
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(args.latency_ms, args.jitter_ms, args.slow_rate, args.slow_ms,
+                           args.fail_rate, args.cold_start_s),
+                host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()